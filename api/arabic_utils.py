@@ -3,6 +3,8 @@ Arabic text processing utilities for search and matching
 """
 import re
 import unicodedata
+from collections import deque
+from functools import lru_cache
 
 # Common Arabic transliterations and their variations
 TRANSLITERATION_MAP = {
@@ -46,6 +48,138 @@ TRANSLITERATION_MAP = {
 # Arabic diacritics that can be removed for matching
 ARABIC_DIACRITICS = re.compile(r'[\u0610-\u061A\u064B-\u065F\u0670\u06D6-\u06DC\u06DF-\u06E4\u06E7\u06E8\u06EA-\u06ED]')
 
+# Fold different forms of the same letter to one canonical letter
+# Applied with str.replace, which is faster than str.translate for non-ASCII text in CPython
+LETTER_FOLDING = {
+    # Alif variations
+    'أ': 'ا', 'إ': 'ا', 'آ': 'ا', 'ٱ': 'ا',
+    # Ta marbouta variations
+    'ة': 'ه',
+    # Yaa variations
+    'ي': 'ى', 'ئ': 'ى',
+}
+
+ARABIC_PATTERN = re.compile(r'[\u0600-\u06FF\u0750-\u077F\u08A0-\u08FF\uFB50-\uFDFF\uFE70-\uFEFF]')
+
+# Common typos and variants
+ARABIC_TYPO_FIXES = {
+    'وَهْدَهُ': 'وَحْدَهُ',  # Fix wahdahu typo
+    'وهده': 'وحده',        # Without diacritics
+    'الهه': 'الله',         # Allah typo
+}
+ARABIC_TYPO_PATTERN = re.compile('|'.join(re.escape(typo) for typo in ARABIC_TYPO_FIXES))
+
+# Size of the memoization caches for repeated queries
+QUERY_CACHE_SIZE = 4096
+
+# Latin letters for root letters after normalize_arabic_text, as in "SLM" for س ل م
+# Several Arabic letters share one Latin letter (ح/ه -> H, س/ش/ص -> S) so keys stay three letters
+# long - a key can stand for more than one root (HMD: حمد and همد), see RootIndex.lookup
+ROOT_LETTER_TO_LATIN = {
+    'ا': 'A', 'ء': 'A', 'ؤ': 'A', 'ع': 'A',
+    'ب': 'B', 'ت': 'T', 'ث': 'T', 'ط': 'T', 'ج': 'J',
+    'ح': 'H', 'ه': 'H', 'خ': 'K', 'ك': 'K',
+    'د': 'D', 'ض': 'D', 'ذ': 'Z', 'ز': 'Z', 'ظ': 'Z',
+    'ر': 'R', 'س': 'S', 'ش': 'S', 'ص': 'S',
+    'غ': 'G', 'ف': 'F', 'ق': 'Q', 'ل': 'L', 'م': 'M', 'ن': 'N',
+    'و': 'W', 'ى': 'Y',
+}
+
+# Letters folded together when comparing transliterations ("qul"/"kul", "raheem"/"rahim")
+TRANSLITERATION_FOLDING = str.maketrans({'q': 'k', 'o': 'u', 'e': 'i'})
+NON_LATIN_LETTERS = re.compile(r'[^a-z]+')
+REPEATED_LETTERS = re.compile(r'(.)\1+')
+
+class PatternAutomaton:
+    """
+    Aho-Corasick automaton that finds every pattern occurring in a text in one pass,
+    including patterns that overlap or contain each other (e.g. 'allah' inside 'allahu')
+    """
+    
+    def __init__(self, patterns):
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [set()]
+        
+        for pattern in patterns:
+            if pattern:
+                self._add(pattern)
+        self._build_failure_links()
+    
+    def _add(self, pattern):
+        state = 0
+        for char in pattern:
+            next_state = self.goto[state].get(char)
+            if next_state is None:
+                next_state = len(self.goto)
+                self.goto[state][char] = next_state
+                self.goto.append({})
+                self.fail.append(0)
+                self.output.append(set())
+            state = next_state
+        self.output[state].add(pattern)
+    
+    def _build_failure_links(self):
+        # Breadth-first so each state's failure target is finished before its children
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self.goto[state].items():
+                queue.append(next_state)
+                fallback = self.fail[state]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                target = self.goto[fallback].get(char, 0)
+                self.fail[next_state] = target if target != next_state else 0
+                self.output[next_state] |= self.output[self.fail[next_state]]
+    
+    def find_all(self, text):
+        """Return the set of patterns that occur anywhere in text"""
+        found = set()
+        state = 0
+        for char in text:
+            while state and char not in self.goto[state]:
+                state = self.fail[state]
+            state = self.goto[state].get(char, 0)
+            if self.output[state]:
+                found |= self.output[state]
+        return found
+
+# Compiled form of TRANSLITERATION_MAP, rebuilt by compile_transliteration_map()
+TRANSLITERATION_KEYS = []
+TRANSLITERATION_PATTERN = None
+VARIATION_AUTOMATON = None
+PATTERN_TO_KEYS = {}
+
+def compile_transliteration_map():
+    """
+    Compile TRANSLITERATION_MAP into a regex for replacement and an automaton
+    for variation lookup. Call again after changing TRANSLITERATION_MAP.
+    """
+    global TRANSLITERATION_KEYS, TRANSLITERATION_PATTERN, VARIATION_AUTOMATON, PATTERN_TO_KEYS
+    
+    keys = list(TRANSLITERATION_MAP.keys())
+    
+    # Longest keys first so 'allahu' wins over 'allah' at the same position
+    pattern = re.compile('|'.join(re.escape(key) for key in sorted(keys, key=len, reverse=True)))
+    
+    # A key matches if the key itself or any of its Arabic forms appears in the query
+    pattern_to_keys = {}
+    for key in keys:
+        for form in [key] + TRANSLITERATION_MAP[key]:
+            pattern_to_keys.setdefault(form, set()).add(key)
+    
+    TRANSLITERATION_KEYS = keys
+    TRANSLITERATION_PATTERN = pattern
+    VARIATION_AUTOMATON = PatternAutomaton(pattern_to_keys)
+    PATTERN_TO_KEYS = pattern_to_keys
+    
+    # Results memoized against the old map are stale now
+    transliterate_to_arabic.cache_clear()
+    enhance_arabic_search_query.cache_clear()
+    _phonetic_variations.cache_clear()
+
+@lru_cache(maxsize=QUERY_CACHE_SIZE)
 def normalize_arabic_text(text):
     """
     Normalize Arabic text by removing diacritics and extra spaces
@@ -57,18 +191,16 @@ def normalize_arabic_text(text):
     text = unicodedata.normalize('NFKC', text)
     
     # Normalize different forms of the same letter
-    # Alif variations
-    text = text.replace('أ', 'ا').replace('إ', 'ا').replace('آ', 'ا').replace('ٱ', 'ا')
-    # Ta marbouta variations
-    text = text.replace('ة', 'ه')
-    # Yaa variations  
-    text = text.replace('ي', 'ى').replace('ئ', 'ى')
+    for variant, letter in LETTER_FOLDING.items():
+        if variant in text:
+            text = text.replace(variant, letter)
     
     # Remove extra spaces
     text = ' '.join(text.split())
     
     return text
 
+@lru_cache(maxsize=QUERY_CACHE_SIZE)
 def transliterate_to_arabic(text):
     """
     Convert common transliterations to Arabic text
@@ -79,43 +211,44 @@ def transliterate_to_arabic(text):
     if text_lower in TRANSLITERATION_MAP:
         return TRANSLITERATION_MAP[text_lower][0]
     
-    # Check if the text contains any transliterated phrases
-    result = text_lower
-    for translit, arabic_variations in TRANSLITERATION_MAP.items():
-        if translit in text_lower:
-            # Replace the transliteration with Arabic
-            result = result.replace(translit, arabic_variations[0])
-    
-    # If we made any replacements, return the result
-    if result != text_lower:
-        return result
-    
-    return text_lower
+    # Replace every transliterated phrase in a single pass
+    return TRANSLITERATION_PATTERN.sub(lambda match: TRANSLITERATION_MAP[match.group(0)][0], text_lower)
 
 def is_arabic_text(text):
     """
     Check if the text contains Arabic characters
     """
-    arabic_pattern = re.compile(r'[\u0600-\u06FF\u0750-\u077F\u08A0-\u08FF\uFB50-\uFDFF\uFE70-\uFEFF]')
-    return bool(arabic_pattern.search(text))
+    return bool(ARABIC_PATTERN.search(text))
+
+@lru_cache(maxsize=QUERY_CACHE_SIZE)
+def fold_transliteration(text):
+    """
+    Fold a Latin transliteration to a spelling-insensitive key
+    Strips accents, spaces and punctuation, folds q/k, o/u, e/i and collapses doubled letters,
+    so "Qul huwa Allāhu aḥad" and "qul huwallahu ahad" both become "kulhuwalahuahad"
+    """
+    text = unicodedata.normalize('NFKD', text.lower())
+    text = ''.join(char for char in text if not unicodedata.combining(char))
+    text = NON_LATIN_LETTERS.sub('', text).translate(TRANSLITERATION_FOLDING)
+    return REPEATED_LETTERS.sub(r'\1', text)
+
+def root_to_latin(root):
+    """
+    Latin key for an Arabic root ("س ل م" -> "SLM")
+    Returns an empty string if the root has letters without a Latin equivalent
+    """
+    letters = normalize_arabic_text(root).replace(' ', '')
+    if not all(letter in ROOT_LETTER_TO_LATIN for letter in letters):
+        return ''
+    return ''.join(ROOT_LETTER_TO_LATIN[letter] for letter in letters)
 
 def fix_common_arabic_typos(text):
     """
     Fix common Arabic typos and variants
     """
-    # Common typos
-    typo_fixes = {
-        'وَهْدَهُ': 'وَحْدَهُ',  # Fix wahdahu typo
-        'وهده': 'وحده',        # Without diacritics
-        'الهه': 'الله',         # Allah typo
-    }
-    
-    result = text
-    for typo, correct in typo_fixes.items():
-        result = result.replace(typo, correct)
-    
-    return result
+    return ARABIC_TYPO_PATTERN.sub(lambda match: ARABIC_TYPO_FIXES[match.group(0)], text)
 
+@lru_cache(maxsize=QUERY_CACHE_SIZE)
 def enhance_arabic_search_query(query):
     """
     Enhance search query to handle both Arabic and transliterated text
@@ -137,28 +270,30 @@ def enhance_arabic_search_query(query):
     
     return query
 
-def get_phonetic_variations(text):
-    """
-    Get phonetic variations of Arabic or transliterated text
-    """
+@lru_cache(maxsize=QUERY_CACHE_SIZE)
+def _phonetic_variations(text):
     variations = [text]
-    text_lower = text.lower().strip()
     
-    # Add transliteration variations
-    for translit, arabic_list in TRANSLITERATION_MAP.items():
-        if translit in text_lower or any(arabic in text for arabic in arabic_list):
-            variations.extend(arabic_list)
+    # Every transliteration whose key or Arabic forms occur in the text, in map order
+    matched_keys = set()
+    for pattern in VARIATION_AUTOMATON.find_all(text.lower().strip()):
+        matched_keys |= PATTERN_TO_KEYS[pattern]
+    
+    for translit in TRANSLITERATION_KEYS:
+        if translit in matched_keys:
+            variations.extend(TRANSLITERATION_MAP[translit])
             variations.append(translit)
     
     # Remove duplicates while preserving order
-    seen = set()
-    unique_variations = []
-    for v in variations:
-        if v not in seen:
-            seen.add(v)
-            unique_variations.append(v)
-    
-    return unique_variations
+    return tuple(dict.fromkeys(variations))
+
+def get_phonetic_variations(text):
+    """
+    Get phonetic variations of Arabic or transliterated text
+    """
+    return list(_phonetic_variations(text))
+
+compile_transliteration_map()
 
 def fuzzy_arabic_match(text1, text2, threshold=0.8):
     """
@@ -176,13 +311,6 @@ def fuzzy_arabic_match(text1, text2, threshold=0.8):
     if norm1 in norm2 or norm2 in norm1:
         return True
     
-    # Check phonetic variations
-    variations1 = get_phonetic_variations(text1)
-    variations2 = get_phonetic_variations(text2)
-    
-    for v1 in variations1:
-        for v2 in variations2:
-            if normalize_arabic_text(v1) == normalize_arabic_text(v2):
-                return True
-    
-    return False
\ No newline at end of file
+    # Check phonetic variations - any shared normalized form is a match
+    normalized_variations1 = {normalize_arabic_text(v) for v in _phonetic_variations(text1)}
+    return any(normalize_arabic_text(v) in normalized_variations1 for v in _phonetic_variations(text2))
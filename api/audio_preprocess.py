@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""
+Voice query preprocessing before Whisper
+Decodes the upload, downmixes to mono, resamples to 16kHz, trims leading and trailing
+silence with an energy VAD and re-encodes it. Whisper bills per second of audio and works
+at 16kHz mono anyway, so less is sent for the same transcript.
+
+WAV is decoded with scipy. Other containers (webm, mp4, ogg, ...) need ffmpeg on PATH;
+without it, or if decoding fails, the original upload is sent unchanged. With ffmpeg the
+result is encoded as Ogg/Opus (a few KB per second of speech, like the browser uploads),
+without it as 16-bit PCM WAV (32KB per second). Whichever is smaller of the result and the
+original upload is sent.
+"""
+
+import io
+import logging
+import os
+import shutil
+import subprocess
+from dataclasses import dataclass
+from math import gcd
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+TRANSCRIBE_PREPROCESS = os.getenv("TRANSCRIBE_PREPROCESS", "true").lower() == "true"
+TARGET_SAMPLE_RATE = 16000
+
+# Energy VAD
+FRAME_MS = 30
+# Frames quieter than this (dBFS), or this far below the loudest frame, are silence
+SILENCE_FLOOR_DB = -50.0
+SILENCE_RELATIVE_DB = 35.0
+# Kept around the speech so word onsets and tails aren't clipped
+PADDING_MS = 250
+# Quiet recordings are brought up to this peak
+NORMALIZE_PEAK = 0.9
+
+FFMPEG_TIMEOUT_SECONDS = 30
+# Opus bitrate for preprocessed speech
+TRANSCRIBE_OPUS_BITRATE = os.getenv("TRANSCRIBE_OPUS_BITRATE", "24k")
+WAV_MARKERS = ('wav', 'wave')
+
+@dataclass
+class PreprocessedAudio:
+    data: bytes
+    filename: str
+    content_type: str
+    original_bytes: int
+    original_seconds: float
+    seconds: float
+
+def ffmpeg_available():
+    return shutil.which("ffmpeg") is not None
+
+def is_wav(filename, content_type):
+    extension = os.path.splitext(filename or "")[1].lower().lstrip(".")
+    return extension in WAV_MARKERS or any(marker in (content_type or "") for marker in WAV_MARKERS)
+
+def can_decode(filename, content_type):
+    """Whether preprocessing can decode this upload (checked before reading it)"""
+    return is_wav(filename, content_type) or ffmpeg_available()
+
+def decode_wav(data):
+    """WAV bytes -> (float32 samples shaped (frames, channels) in [-1, 1], sample rate)"""
+    from scipy.io import wavfile
+    rate, samples = wavfile.read(io.BytesIO(data))
+    if samples.dtype == np.uint8:
+        samples = (samples.astype(np.float32) - 128) / 128
+    elif np.issubdtype(samples.dtype, np.integer):
+        samples = samples.astype(np.float32) / np.iinfo(samples.dtype).max
+    else:
+        samples = samples.astype(np.float32)
+    if samples.ndim == 1:
+        samples = samples[:, np.newaxis]
+    return samples, rate
+
+def decode_ffmpeg(data, rate=TARGET_SAMPLE_RATE):
+    """Any container ffmpeg reads -> mono samples at rate"""
+    result = subprocess.run(
+        ["ffmpeg", "-nostdin", "-hide_banner", "-loglevel", "error", "-i", "pipe:0",
+         "-f", "s16le", "-acodec", "pcm_s16le", "-ac", "1", "-ar", str(rate), "pipe:1"],
+        input=data, capture_output=True, timeout=FFMPEG_TIMEOUT_SECONDS, check=True
+    )
+    samples = np.frombuffer(result.stdout, dtype=np.int16).astype(np.float32) / 32767
+    return samples[:, np.newaxis], rate
+
+def to_mono(samples):
+    return samples.mean(axis=1) if samples.ndim > 1 else samples
+
+def resample(samples, rate, target=TARGET_SAMPLE_RATE):
+    if rate == target or len(samples) == 0:
+        return samples
+    from scipy.signal import resample_poly
+    divisor = gcd(int(rate), target)
+    return resample_poly(samples, target // divisor, int(rate) // divisor).astype(np.float32)
+
+def frame_levels(samples, rate, frame_ms=FRAME_MS):
+    """RMS level of each frame in dBFS"""
+    frame = max(1, int(rate * frame_ms / 1000))
+    count = len(samples) // frame
+    if count == 0:
+        return np.array([], dtype=np.float32), frame
+    frames = samples[:count * frame].reshape(count, frame)
+    rms = np.sqrt(np.mean(frames.astype(np.float64) ** 2, axis=1))
+    return 20 * np.log10(np.maximum(rms, 1e-10)), frame
+
+def speech_bounds(samples, rate, padding_ms=PADDING_MS):
+    """
+    (start, end) sample indices of the audio between the first and last voiced frame
+    Returns None when no frame is above the silence threshold.
+    """
+    levels, frame = frame_levels(samples, rate)
+    if len(levels) == 0:
+        return None
+    threshold = max(SILENCE_FLOOR_DB, float(levels.max()) - SILENCE_RELATIVE_DB)
+    voiced = np.flatnonzero(levels > threshold)
+    if len(voiced) == 0:
+        return None
+    padding = int(rate * padding_ms / 1000)
+    start = max(0, voiced[0] * frame - padding)
+    end = min(len(samples), (voiced[-1] + 1) * frame + padding)
+    return start, end
+
+def trim_silence(samples, rate, padding_ms=PADDING_MS):
+    bounds = speech_bounds(samples, rate, padding_ms)
+    if bounds is None:
+        return samples
+    start, end = bounds
+    return samples[start:end]
+
+def normalize(samples, peak=NORMALIZE_PEAK):
+    current = float(np.abs(samples).max()) if len(samples) else 0.0
+    if current == 0.0 or current >= peak:
+        return samples
+    return samples * (peak / current)
+
+def encode_wav(samples, rate=TARGET_SAMPLE_RATE):
+    """Mono float samples -> 16-bit PCM WAV bytes"""
+    from scipy.io import wavfile
+    pcm = (np.clip(samples, -1.0, 1.0) * 32767).astype(np.int16)
+    buffer = io.BytesIO()
+    wavfile.write(buffer, rate, pcm)
+    return buffer.getvalue()
+
+def encode_opus(samples, rate=TARGET_SAMPLE_RATE, bitrate=TRANSCRIBE_OPUS_BITRATE):
+    """Mono float samples -> Ogg/Opus bytes (needs ffmpeg)"""
+    pcm = (np.clip(samples, -1.0, 1.0) * 32767).astype(np.int16)
+    result = subprocess.run(
+        ["ffmpeg", "-nostdin", "-hide_banner", "-loglevel", "error",
+         "-f", "s16le", "-ac", "1", "-ar", str(rate), "-i", "pipe:0",
+         "-c:a", "libopus", "-b:a", bitrate, "-application", "voip", "-f", "ogg", "pipe:1"],
+        input=pcm.tobytes(), capture_output=True, timeout=FFMPEG_TIMEOUT_SECONDS, check=True
+    )
+    return result.stdout
+
+def encode_audio(samples, rate=TARGET_SAMPLE_RATE):
+    """Mono float samples -> (bytes, extension, content type): Ogg/Opus with ffmpeg, else WAV"""
+    if ffmpeg_available():
+        try:
+            return encode_opus(samples, rate), ".ogg", "audio/ogg"
+        except Exception as e:
+            logger.warning(f"⚠️ Opus encoding failed, sending WAV: {e}")
+    return encode_wav(samples, rate), ".wav", "audio/wav"
+
+def preprocess_audio(data, filename=None, content_type=None):
+    """
+    Decode, downmix, resample, trim and re-encode an upload
+    Returns a PreprocessedAudio, or None to send the original: it can't be decoded, or
+    the re-encoded audio would be larger.
+    """
+    if not data or not can_decode(filename, content_type):
+        return None
+    try:
+        if is_wav(filename, content_type):
+            samples, rate = decode_wav(data)
+        else:
+            samples, rate = decode_ffmpeg(data)
+    except Exception as e:
+        logger.warning(f"⚠️ Could not decode {filename or 'audio'} ({content_type}) for preprocessing: {e}")
+        return None
+
+    original_seconds = len(samples) / rate if rate else 0.0
+    samples = resample(to_mono(samples), rate)
+    samples = normalize(trim_silence(samples, TARGET_SAMPLE_RATE))
+    if len(samples) == 0:
+        return None
+
+    encoded, extension, encoded_type = encode_audio(samples)
+    if len(encoded) >= len(data):
+        logger.info(f"🎚️ Sending {filename or 'audio'} as uploaded - re-encoded it would be "
+                    f"{len(encoded)} bytes, not {len(data)}")
+        return None
+
+    base = os.path.splitext(filename or "audio")[0] or "audio"
+    return PreprocessedAudio(
+        data=encoded,
+        filename=f"{base}{extension}",
+        content_type=encoded_type,
+        original_bytes=len(data),
+        original_seconds=original_seconds,
+        seconds=len(samples) / TARGET_SAMPLE_RATE
+    )
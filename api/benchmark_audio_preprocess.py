@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Benchmark what /transcribe-audio sends to Whisper with and without preprocessing
+Reports bytes and seconds of audio before and after for synthetic voice queries
+(speech-like bursts padded with silence and background noise, recorded at typical
+browser/phone settings) as WAV and, when ffmpeg is installed, as the compressed formats
+browsers actually upload (webm/opus from Chrome and Firefox, mp4/aac from Safari), plus
+any clips passed with --files.
+
+Usage:
+    python benchmark_audio_preprocess.py [--files query1.wav query2.webm] [--json report.json]
+"""
+
+import argparse
+import io
+import json
+import mimetypes
+import os
+import subprocess
+import time
+
+import numpy as np
+from scipy.io import wavfile
+
+from audio_preprocess import FFMPEG_TIMEOUT_SECONDS, ffmpeg_available, preprocess_audio
+
+# (name, sample rate, channels, leading silence s, speech s, trailing silence s)
+SYNTHETIC_CLIPS = [
+    ("short query, 48kHz stereo", 48000, 2, 1.5, 2.0, 2.5),
+    ("long pause before speaking, 44.1kHz mono", 44100, 1, 4.0, 3.0, 1.0),
+    ("tap-to-stop late, 48kHz mono", 48000, 1, 0.8, 5.0, 6.0),
+    ("already tight, 16kHz mono", 16000, 1, 0.1, 4.0, 0.1),
+]
+
+# MediaRecorder output: (label, filename, content type, ffmpeg output arguments)
+BROWSER_FORMATS = [
+    ("webm/opus", "blob.webm", "audio/webm;codecs=opus", ["-c:a", "libopus", "-b:a", "32k", "-f", "webm"]),
+    ("mp4/aac", "blob.mp4", "audio/mp4", ["-c:a", "aac", "-b:a", "64k", "-movflags", "frag_keyframe+empty_moov", "-f", "mp4"]),
+]
+
+def synthetic_speech(rate, seconds, rng):
+    """Syllable-like bursts of a few harmonics with a wobbling pitch"""
+    t = np.arange(int(rate * seconds)) / rate
+    pitch = 140 + 30 * np.sin(2 * np.pi * 0.7 * t)
+    phase = 2 * np.pi * np.cumsum(pitch) / rate
+    voice = sum(np.sin(k * phase) / k for k in range(1, 6))
+    syllables = np.clip(np.sin(2 * np.pi * 4 * t + rng.uniform(0, np.pi)), 0, None)
+    return 0.3 * voice * syllables
+
+def synthetic_clip(rate, channels, lead, speech, trail, seed=0):
+    rng = np.random.default_rng(seed)
+    signal = np.concatenate([np.zeros(int(rate * lead)), synthetic_speech(rate, speech, rng), np.zeros(int(rate * trail))])
+    # Room noise around -60 dBFS
+    signal = signal + rng.normal(0, 0.001, len(signal))
+    samples = np.repeat(signal[:, np.newaxis], channels, axis=1) if channels > 1 else signal
+    buffer = io.BytesIO()
+    wavfile.write(buffer, rate, (np.clip(samples, -1, 1) * 32767).astype(np.int16))
+    return buffer.getvalue(), lead + speech + trail
+
+def browser_clip(wav_data, output_args):
+    """A WAV clip re-encoded the way a browser would upload it (needs ffmpeg)"""
+    result = subprocess.run(
+        ["ffmpeg", "-nostdin", "-hide_banner", "-loglevel", "error", "-i", "pipe:0", *output_args, "pipe:1"],
+        input=wav_data, capture_output=True, timeout=FFMPEG_TIMEOUT_SECONDS, check=True
+    )
+    return result.stdout
+
+def measure(name, data, filename, content_type, seconds=None):
+    started = time.perf_counter()
+    processed = preprocess_audio(data, filename, content_type)
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    if processed is None:
+        return {"clip": name, "bytes_before": len(data), "bytes_after": len(data),
+                "seconds_before": seconds, "seconds_after": seconds, "preprocess_ms": elapsed_ms, "passthrough": True}
+    return {
+        "clip": name,
+        "bytes_before": len(data),
+        "bytes_after": len(processed.data),
+        "seconds_before": processed.original_seconds,
+        "seconds_after": processed.seconds,
+        "preprocess_ms": elapsed_ms,
+        "passthrough": False
+    }
+
+def format_seconds(value):
+    return f"{value:.1f}s" if value is not None else "?"
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark voice query preprocessing")
+    parser.add_argument("--files", nargs="*", default=[], help="Recorded clips to include")
+    parser.add_argument("--json", help="Write the results to this file")
+    args = parser.parse_args()
+
+    results = []
+    for index, (name, rate, channels, lead, speech, trail) in enumerate(SYNTHETIC_CLIPS):
+        data, seconds = synthetic_clip(rate, channels, lead, speech, trail, seed=index)
+        results.append(measure(name, data, "query.wav", "audio/wav", seconds))
+        if not ffmpeg_available():
+            continue
+        for label, filename, content_type, output_args in BROWSER_FORMATS:
+            encoded = browser_clip(data, output_args)
+            results.append(measure(f"{name}, {label}", encoded, filename, content_type, seconds))
+    if not ffmpeg_available():
+        print("⚠️ ffmpeg not installed - webm/opus and mp4/aac clips skipped, output is WAV\n")
+    for path in args.files:
+        with open(path, "rb") as f:
+            data = f.read()
+        results.append(measure(os.path.basename(path), data, path, mimetypes.guess_type(path)[0]))
+
+    print(f"{'clip':45} {'bytes before':>12} {'after':>10} {'seconds before':>15} {'after':>7} {'ms':>6}")
+    for r in results:
+        note = "  (sent as is)" if r["passthrough"] else ""
+        print(f"{r['clip'][:45]:45} {r['bytes_before']:>12,} {r['bytes_after']:>10,} "
+              f"{format_seconds(r['seconds_before']):>15} {format_seconds(r['seconds_after']):>7} "
+              f"{r['preprocess_ms']:>6.1f}{note}")
+
+    timed = [r for r in results if r["seconds_before"] is not None]
+    bytes_before = sum(r["bytes_before"] for r in results)
+    bytes_after = sum(r["bytes_after"] for r in results)
+    seconds_before = sum(r["seconds_before"] for r in timed)
+    seconds_after = sum(r["seconds_after"] for r in timed)
+    print(f"\n📦 Bytes sent: {bytes_before:,} -> {bytes_after:,} ({100 * (1 - bytes_after / bytes_before):.0f}% less)")
+    if seconds_before:
+        print(f"⏱️ Audio seconds billed: {seconds_before:.1f} -> {seconds_after:.1f} "
+              f"({100 * (1 - seconds_after / seconds_before):.0f}% less)")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"💾 Wrote {args.json}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Benchmark prompt size and latency of /debate over a long synthetic conversation
+Compares sending the full history (no budget) with the token-budgeted context builder.
+The model is a stub whose latency grows with prompt tokens, so no API key is needed.
+
+Usage:
+    python benchmark_conversation_context.py [--turns 50] [--ms-per-1k-tokens 20] [--json report.json]
+"""
+
+import argparse
+import json
+import logging
+import os
+import time
+from types import SimpleNamespace
+
+os.environ.setdefault("USE_CLOUD_VECTORS", "false")
+logging.disable(logging.CRITICAL)
+
+from fastapi.testclient import TestClient
+import vector_search_api
+import conversation_context
+from conversation_context import count_message_tokens
+
+REPLY_WORDS = 180  # About the length of a 250-word-limited debate reply
+
+class StubModel:
+    """Chat completions that take time proportional to prompt tokens"""
+
+    def __init__(self, ms_per_1k_tokens):
+        self.ms_per_1k_tokens = ms_per_1k_tokens
+        self.prompt_tokens = []
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, messages, **kwargs):
+        tokens = count_message_tokens(messages)
+        self.prompt_tokens.append(tokens)
+        time.sleep(tokens * self.ms_per_1k_tokens / 1_000_000)
+        turn = len(self.prompt_tokens)
+        reply = " ".join(f"reply{turn}w{i}" for i in range(REPLY_WORDS))
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=f"<strong>Answer {turn}</strong><br>{reply} [2:255]"))])
+
+def run_conversation(turns, ms_per_1k_tokens, history_budget):
+    """Play a conversation of the given number of turns against /debate"""
+    model = StubModel(ms_per_1k_tokens)
+    builder = conversation_context.context_builder
+    original = vector_search_api.client, builder.history_budget
+    vector_search_api.client = model
+    builder.history_budget = history_budget
+    builder.summary_cache.clear()
+
+    history = []
+    latencies = []
+    try:
+        client = TestClient(vector_search_api.app)
+        for turn in range(turns):
+            message = f"Question {turn}: what does the Quran say about topic {turn}? " + "context " * 40
+            started = time.perf_counter()
+            response = client.post("/debate", json={"message": message, "conversationHistory": history})
+            latencies.append((time.perf_counter() - started) * 1000)
+            response.raise_for_status()
+
+            history.append({"role": "user", "content": message})
+            history.append({"role": "assistant", "content": response.json()["response"]})
+    finally:
+        vector_search_api.client, builder.history_budget = original
+
+    return {"prompt_tokens": model.prompt_tokens, "latency_ms": [round(ms, 2) for ms in latencies]}
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark debate prompt size over a long conversation")
+    parser.add_argument("--turns", type=int, default=50)
+    parser.add_argument("--ms-per-1k-tokens", type=float, default=20.0, help="Stub model latency per 1,000 prompt tokens")
+    parser.add_argument("--json", dest="json_path", help="Write the full report to this JSON file")
+    args = parser.parse_args()
+
+    report = {
+        "turns": args.turns,
+        "tokenizer": "tiktoken" if conversation_context.load_tokenizer() else "estimate (4 chars/token)",
+        "history_token_budget": conversation_context.HISTORY_TOKEN_BUDGET,
+        "unbounded": run_conversation(args.turns, args.ms_per_1k_tokens, history_budget=10**9),
+        "budgeted": run_conversation(args.turns, args.ms_per_1k_tokens, history_budget=conversation_context.HISTORY_TOKEN_BUDGET),
+    }
+
+    print(f"Tokenizer: {report['tokenizer']}, history budget: {report['history_token_budget']} tokens\n")
+    print(f"{'turn':>5} | {'full history':>22} | {'budgeted':>22}")
+    print(f"{'':>5} | {'tokens':>10} {'ms':>11} | {'tokens':>10} {'ms':>11}")
+    print("-" * 56)
+    unbounded, budgeted = report["unbounded"], report["budgeted"]
+    for turn in range(args.turns):
+        if turn in (0, args.turns - 1) or (turn + 1) % 10 == 0:
+            print(f"{turn + 1:>5} | {unbounded['prompt_tokens'][turn]:>10} {unbounded['latency_ms'][turn]:>11.1f} | "
+                  f"{budgeted['prompt_tokens'][turn]:>10} {budgeted['latency_ms'][turn]:>11.1f}")
+    print("-" * 56)
+    print(f"{'total':>5} | {sum(unbounded['prompt_tokens']):>10} {sum(unbounded['latency_ms']):>11.1f} | "
+          f"{sum(budgeted['prompt_tokens']):>10} {sum(budgeted['latency_ms']):>11.1f}")
+
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nReport written to {args.json_path}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Benchmark concurrent subscription status checks: synchronous client vs the async store
+The synchronous store makes the same PostgREST requests with a blocking httpx.Client from
+the async handlers, as the old supabase client did, so each query holds the event loop for
+its round trip. The async store is PostgRESTSubscriptionStore. Both talk to the same fake
+PostgREST (over httpx.MockTransport) with a fixed latency per request, so no database
+is needed.
+
+Usage:
+    python benchmark_subscription_store.py [--requests 50] [--latency-ms 20] [--json report.json]
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import time
+
+import httpx
+from fastapi import FastAPI
+
+from payment_endpoints import router, subscription_cache
+from subscription_store import TABLE, PostgRESTSubscriptionStore, SubscriptionStore, set_subscription_store
+
+logging.disable(logging.CRITICAL)
+
+BASE_URL = "https://example.supabase.co"
+
+class FakePostgREST:
+    """Answers find_by_email queries for the given rows after `latency` seconds"""
+
+    def __init__(self, rows, latency):
+        self.rows = rows
+        self.latency = latency
+        self.requests = 0
+
+    def response(self, request):
+        self.requests += 1
+        email = request.url.params.get("email", "")[3:]
+        return httpx.Response(200, json=[row for row in self.rows if row["email"] == email])
+
+    def handle_sync(self, request):
+        time.sleep(self.latency)
+        return self.response(request)
+
+    async def handle_async(self, request):
+        await asyncio.sleep(self.latency)
+        return self.response(request)
+
+class SyncPostgRESTStore(SubscriptionStore):
+    """The same PostgREST queries over a blocking client, called from async code"""
+
+    def __init__(self, transport):
+        self.client = httpx.Client(base_url=f"{BASE_URL}/rest/v1", transport=transport)
+
+    async def find_by_email(self, email):
+        response = self.client.get(f"/{TABLE}", params={"select": "*", "email": f"eq.{email}"})
+        return response.json()
+
+    async def insert(self, row):
+        raise NotImplementedError("not used by the benchmark")
+
+    async def upsert(self, row):
+        raise NotImplementedError("not used by the benchmark")
+
+    async def update_by_subscription_id(self, subscription_id, values):
+        raise NotImplementedError("not used by the benchmark")
+
+    async def record_webhook_event(self, event, status):
+        raise NotImplementedError("not used by the benchmark")
+
+    async def get_webhook_event(self, event_id):
+        raise NotImplementedError("not used by the benchmark")
+
+    async def update_webhook_event(self, event_id, values, status=None):
+        raise NotImplementedError("not used by the benchmark")
+
+    async def find_webhook_events(self, status):
+        raise NotImplementedError("not used by the benchmark")
+
+    async def close(self):
+        self.client.close()
+
+def make_rows(count):
+    return [{"email": f"user{i}@example.com", "status": "active", "tier": "premium",
+             "expires_at": "2999-01-01T00:00:00Z"} for i in range(count)]
+
+async def check_all(app, count):
+    """Status of every user at once (distinct emails, so every request reaches the store)"""
+    async with httpx.AsyncClient(app=app, base_url="http://test") as client:
+        started = time.perf_counter()
+        responses = await asyncio.gather(*[
+            client.get(f"/api/payment/user/subscription/user{i}@example.com") for i in range(count)
+        ])
+        elapsed = time.perf_counter() - started
+    if not all(response.json()["hasSubscription"] for response in responses):
+        raise RuntimeError("a status check failed")
+    return elapsed
+
+def run_with(store, count):
+    set_subscription_store(store)
+    subscription_cache.clear()
+    app = FastAPI()
+    app.include_router(router)
+
+    async def run():
+        try:
+            return await check_all(app, count)
+        finally:
+            await store.close()
+
+    try:
+        return asyncio.run(run())
+    finally:
+        set_subscription_store(None)
+        subscription_cache.clear()
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark concurrent subscription status checks")
+    parser.add_argument("--requests", type=int, default=50, help="Concurrent status checks")
+    parser.add_argument("--latency-ms", type=float, default=20, help="Database round trip per query")
+    parser.add_argument("--json", help="Write the results to this file")
+    args = parser.parse_args()
+
+    latency = args.latency_ms / 1000
+    rows = make_rows(args.requests)
+
+    sync_server = FakePostgREST(rows, latency)
+    blocking = run_with(SyncPostgRESTStore(httpx.MockTransport(sync_server.handle_sync)), args.requests)
+
+    async_server = FakePostgREST(rows, latency)
+    pooled = run_with(PostgRESTSubscriptionStore(BASE_URL, "service-key",
+                                                 transport=httpx.MockTransport(async_server.handle_async)),
+                      args.requests)
+
+    print(f"{args.requests} concurrent status checks, {args.latency_ms:.0f}ms per query")
+    print(f"🐢 Blocking client: {blocking:.2f}s ({sync_server.requests} queries)")
+    print(f"⚡ Async pooled store: {pooled:.2f}s ({async_server.requests} queries)")
+    print(f"📈 {blocking / pooled:.1f}x faster")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"requests": args.requests, "latency_ms": args.latency_ms,
+                       "blocking_seconds": blocking, "async_seconds": pooled}, f, indent=2)
+        print(f"💾 Wrote {args.json}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Verse citation resolution for debate responses
+Parses "2:255" and "2:1-7" style references, drops references to verses that don't exist,
+merges overlapping ranges, caps how many verses a range expands to and resolves the
+references against the verse index in one pass
+"""
+
+import json
+import logging
+import os
+import re
+from functools import lru_cache
+from verse_index import get_verse_index
+
+logger = logging.getLogger(__name__)
+
+VERSE_REFERENCE = re.compile(r'\b(\d{1,3}):(\d{1,3})(?:-(\d{1,3}))?\b')
+
+# Verses a single range expands to ("2:1-286" -> 2:1 to 2:10)
+MAX_RANGE_VERSES = 10
+# References kept per text
+MAX_REFERENCES = 50
+
+CHAPTER_VERSE_COUNTS_PATHS = [
+    os.path.join(os.path.dirname(__file__), '../public/chapter_verse_counts.json'),
+    os.path.join(os.path.dirname(__file__), '../../public/chapter_verse_counts.json'),
+]
+
+@lru_cache(maxsize=1)
+def load_chapter_verse_counts():
+    """Chapter -> verse count, or None if chapter_verse_counts.json can't be found"""
+    for path in CHAPTER_VERSE_COUNTS_PATHS:
+        if os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    counts = {entry["chapter"]: entry["verse_count"] for entry in json.load(f)}
+                logger.info(f"✅ Loaded verse counts for {len(counts)} chapters")
+                return counts
+            except Exception as e:
+                logger.error(f"❌ Error loading {path}: {e}")
+    logger.warning("⚠️ chapter_verse_counts.json not found, verse references are not validated")
+    return None
+
+def parse_verse_ranges(text, verse_counts=None, max_references=MAX_REFERENCES):
+    """
+    Valid references in text as (chapter, first_verse, last_verse), chapters in order of first mention
+    References past the end of a chapter are dropped, ranges are clipped to the chapter and
+    overlapping or adjacent ranges in a chapter are merged
+    """
+    if verse_counts is None:
+        verse_counts = load_chapter_verse_counts()
+
+    ranges = {}  # chapter -> [[first, last], ...]
+    order = []
+    found = 0
+    for match in VERSE_REFERENCE.finditer(text or ""):
+        chapter, first = int(match.group(1)), int(match.group(2))
+        last = int(match.group(3)) if match.group(3) else first
+        if last < first:
+            last = first
+
+        if verse_counts is not None:
+            verse_count = verse_counts.get(chapter)
+            if not verse_count or not 1 <= first <= verse_count:
+                continue
+            last = min(last, verse_count)
+        elif chapter < 1 or first < 1:
+            continue
+
+        if chapter not in ranges:
+            ranges[chapter] = []
+            order.append(chapter)
+        ranges[chapter].append([first, last])
+
+        found += 1
+        if found >= max_references:
+            break
+
+    result = []
+    for chapter in order:
+        merged = []
+        for first, last in sorted(ranges[chapter]):
+            if merged and first <= merged[-1][1] + 1:
+                merged[-1][1] = max(merged[-1][1], last)
+            else:
+                merged.append([first, last])
+        result.extend((chapter, first, last) for first, last in merged)
+    return result
+
+def expand_verse_ranges(ranges, max_range_verses=MAX_RANGE_VERSES, max_references=MAX_REFERENCES):
+    """Individual "chapter:verse" references, at most max_range_verses per range"""
+    refs = []
+    for chapter, first, last in ranges:
+        for verse in range(first, min(last, first + max_range_verses - 1) + 1):
+            refs.append(f"{chapter}:{verse}")
+            if len(refs) >= max_references:
+                return refs
+    return refs
+
+def extract_verse_references(text, max_range_verses=MAX_RANGE_VERSES, max_references=MAX_REFERENCES):
+    """Valid, de-duplicated verse references in text, chapters in order of first mention"""
+    return expand_verse_ranges(parse_verse_ranges(text, max_references=max_references),
+                               max_range_verses, max_references)
+
+def resolve_citations(text, verses_data, limit=5):
+    """
+    Verse citations for a generated response
+    Returns: (citations, verse_refs) - citations for the first `limit` references found in
+    the verses data, and all valid references (capped) for suggestions
+    """
+    verse_refs = extract_verse_references(text)
+    if not verses_data:
+        return [], verse_refs
+
+    index = get_verse_index(verses_data)
+    citations = []
+    for ref in verse_refs:
+        verse = index.get(ref)
+        if verse is None:
+            continue
+        citations.append({
+            "type": "verse",
+            "reference": ref,
+            "content": verse.get('english', '')[:100] + "...",
+            "arabic": verse.get('arabic', '')
+        })
+        if len(citations) >= limit:
+            break
+    return citations, verse_refs
@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+Token-budgeted chat context for the debate endpoints
+Keeps the most recent turns that fit the history budget and replaces older turns with
+a rolling summary, so prompt size stays flat however long a debate runs
+"""
+
+import hashlib
+import logging
+import math
+import os
+import re
+import threading
+from ttl_cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+# Tokens available for conversation history (recent turns plus the summary of older ones)
+HISTORY_TOKEN_BUDGET = int(os.getenv("DEBATE_HISTORY_TOKEN_BUDGET", "1500"))
+# Tokens reserved for the summary once older turns no longer fit
+SUMMARY_TOKEN_BUDGET = int(os.getenv("DEBATE_SUMMARY_TOKEN_BUDGET", "300"))
+# Per-message formatting overhead in the chat format
+MESSAGE_TOKEN_OVERHEAD = 4
+# Words of each older turn kept in the summary
+SUMMARY_WORDS_PER_TURN = 30
+
+TOKENIZER_ENCODING = "cl100k_base"
+SUMMARY_HEADER = "Summary of earlier turns in this conversation:"
+HTML_TAGS = re.compile(r'<[^>]+>')
+
+_encoding = None
+_tokenizer_loaded = False
+_tokenizer_lock = threading.Lock()
+
+def load_tokenizer():
+    """
+    Load the tiktoken encoding once (it may download the vocabulary on first use)
+    Run at startup off the request path - until it is loaded, tokens are estimated
+    """
+    global _encoding, _tokenizer_loaded
+    with _tokenizer_lock:
+        if _tokenizer_loaded:
+            return _encoding
+        try:
+            import tiktoken
+            _encoding = tiktoken.get_encoding(TOKENIZER_ENCODING)
+            logger.info(f"✅ Loaded {TOKENIZER_ENCODING} tokenizer")
+        except Exception as e:
+            logger.warning(f"⚠️ tiktoken unavailable, estimating tokens from length: {e}")
+            _encoding = None
+        _tokenizer_loaded = True
+        return _encoding
+
+def count_tokens(text):
+    """Tokens in text - exact with tiktoken, otherwise about four characters per token"""
+    if not text:
+        return 0
+    if _encoding is not None:
+        return len(_encoding.encode(text, disallowed_special=()))
+    return math.ceil(len(text) / 4)
+
+def count_message_tokens(messages):
+    """Tokens in a list of chat messages, including per-message overhead"""
+    return sum(MESSAGE_TOKEN_OVERHEAD + count_tokens(m.get("content", "")) for m in messages)
+
+def summarize_turns(previous_summary, turns, max_tokens=SUMMARY_TOKEN_BUDGET):
+    """
+    Extractive rolling summary: one line per turn with its first words
+    Extends previous_summary with the new turns. When over max_tokens the first line
+    (how the debate started) is kept and the oldest lines after it are dropped.
+    """
+    lines = previous_summary.splitlines()[1:] if previous_summary else []
+    for turn in turns:
+        words = HTML_TAGS.sub(' ', turn.get("content", "")).split()
+        if not words:
+            continue
+        snippet = ' '.join(words[:SUMMARY_WORDS_PER_TURN])
+        if len(words) > SUMMARY_WORDS_PER_TURN:
+            snippet += "..."
+        lines.append(f"- {turn.get('role', 'user')}: {snippet}")
+
+    if not lines:
+        return ""
+
+    used = count_tokens(SUMMARY_HEADER) + count_tokens(lines[0]) + 1
+    recent = []
+    for line in reversed(lines[1:]):
+        cost = count_tokens(line) + 1
+        if used + cost > max_tokens:
+            break
+        recent.append(line)
+        used += cost
+
+    return "\n".join([SUMMARY_HEADER, lines[0]] + recent[::-1])
+
+class ConversationContextBuilder:
+    """
+    Builds chat messages within a token budget
+    Summaries are cached by a hash of the summarized turns, so each request only
+    summarizes the turns that slid out of the window since the previous one
+    """
+
+    def __init__(self, history_budget=HISTORY_TOKEN_BUDGET, summary_budget=SUMMARY_TOKEN_BUDGET,
+                 summarizer=summarize_turns, cache=None):
+        self.history_budget = history_budget
+        self.summary_budget = summary_budget
+        self.summarizer = summarizer
+        self.summary_cache = cache if cache is not None else TTLCache(maxsize=2048, ttl=6 * 3600)
+
+    def build(self, system_content, history, current_message=None, state=None):
+        """
+        Messages for the chat completion: system prompt, summary of older turns (if any),
+        the most recent turns that fit the budget, then the current user message
+        state: optional per-conversation dict (e.g. from the conversation store) that keeps
+        the latest summary, so it is reused across workers and restarts
+        """
+        turns = [
+            {"role": msg.get("role", "user"), "content": msg.get("content", "")}
+            for msg in history or []
+        ]
+
+        window_start = self._window_start(turns)
+        messages = [{"role": "system", "content": system_content}]
+
+        if window_start > 0:
+            summary = self.summary_for(turns[:window_start], state)
+            if summary:
+                messages.append({"role": "system", "content": summary})
+
+        messages.extend(turns[window_start:])
+        if current_message:
+            messages.append({"role": "user", "content": current_message})
+        return messages
+
+    def _window_start(self, turns):
+        """Index of the oldest turn kept verbatim"""
+        costs = [MESSAGE_TOKEN_OVERHEAD + count_tokens(turn["content"]) for turn in turns]
+        if sum(costs) <= self.history_budget:
+            return 0
+
+        # Older turns get summarized, so the window gets what the summary doesn't use
+        budget = self.history_budget - self.summary_budget
+        used = 0
+        start = len(turns)
+        while start > 0 and used + costs[start - 1] <= budget:
+            start -= 1
+            used += costs[start]
+        # Always keep the latest turn, even if it alone exceeds the budget
+        return min(start, len(turns) - 1)
+
+    def summary_for(self, turns, state=None):
+        """Rolling summary of turns, reusing the longest previously summarized prefix"""
+        prefix_keys = []
+        digest = hashlib.sha256()
+        for turn in turns:
+            digest.update(f"{turn['role']}\x00{turn['content']}\x01".encode("utf-8"))
+            prefix_keys.append(digest.copy().hexdigest())
+
+        # Longest prefix already summarized
+        state = state if state is not None else {}
+        summarized, summary = 0, ""
+        for i in range(len(prefix_keys), 0, -1):
+            key = prefix_keys[i - 1]
+            cached = state.get("summary") if state.get("summary_key") == key else None
+            if cached is None:
+                cached = self.summary_cache.get(key, count=(i == len(prefix_keys)))
+            if cached is not None:
+                summarized, summary = i, cached
+                break
+
+        if summarized < len(turns):
+            summary = self.summarizer(summary, turns[summarized:], self.summary_budget)
+            self.summary_cache.set(prefix_keys[-1], summary)
+        state["summary_key"], state["summary"] = prefix_keys[-1], summary
+        return summary
+
+# Shared builder used by /debate and /debate/enhanced
+context_builder = ConversationContextBuilder()
+
+def build_chat_messages(system_content, history, current_message=None, state=None):
+    """Token-budgeted chat messages using the shared builder"""
+    return context_builder.build(system_content, history, current_message, state)
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+Server-side storage for debate conversations, keyed by conversation ID
+Clients send only the new message plus conversationId instead of the whole history.
+
+Backends (CONVERSATION_STORE):
+- memory (default): in-process LRU with TTL
+- sqlite: file-backed, shared by workers on one machine (CONVERSATION_DB_PATH)
+- redis: shared across machines (REDIS_URL), any client with redis-py's get/set/delete
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from ttl_cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+CONVERSATION_TTL_SECONDS = int(os.getenv("CONVERSATION_TTL_SECONDS", str(24 * 3600)))
+CONVERSATION_MAX_CONVERSATIONS = int(os.getenv("CONVERSATION_MAX_CONVERSATIONS", "5000"))
+# Older messages beyond this are dropped - the rolling summary already covers them
+CONVERSATION_MAX_MESSAGES = int(os.getenv("CONVERSATION_MAX_MESSAGES", "200"))
+
+def new_record(history=None):
+    """
+    A conversation record
+    history: chat messages ({"role", "content"}) in order
+    data: per-conversation cached state such as the rolling summary
+    """
+    return {"history": list(history or []), "data": {}}
+
+class MemoryConversationStore:
+    """In-process store - conversations are lost on restart and not shared between workers"""
+
+    def __init__(self, maxsize=CONVERSATION_MAX_CONVERSATIONS, ttl=CONVERSATION_TTL_SECONDS):
+        self.cache = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    def get(self, conversation_id):
+        record = self.cache.get(conversation_id)
+        # Copy so callers can't change the stored record without saving it
+        return json.loads(json.dumps(record)) if record is not None else None
+
+    def save(self, conversation_id, record):
+        self.cache.set(conversation_id, json.loads(json.dumps(record)))
+
+    def delete(self, conversation_id):
+        self.cache.pop(conversation_id)
+
+class SQLiteConversationStore:
+    """SQLite-backed store - survives restarts and is shared by processes using the same file"""
+
+    def __init__(self, path, ttl=CONVERSATION_TTL_SECONDS):
+        self.path = path
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS conversations ("
+                "id TEXT PRIMARY KEY, record TEXT NOT NULL, updated_at REAL NOT NULL)"
+            )
+
+    def get(self, conversation_id):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT record, updated_at FROM conversations WHERE id = ?", (conversation_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        record, updated_at = row
+        if self.ttl is not None and updated_at + self.ttl < time.time():
+            self.delete(conversation_id)
+            return None
+        return json.loads(record)
+
+    def save(self, conversation_id, record):
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO conversations (id, record, updated_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(id) DO UPDATE SET record = excluded.record, updated_at = excluded.updated_at",
+                (conversation_id, json.dumps(record, ensure_ascii=False), now)
+            )
+            if self.ttl is not None:
+                self._conn.execute("DELETE FROM conversations WHERE updated_at < ?", (now - self.ttl,))
+
+    def delete(self, conversation_id):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM conversations WHERE id = ?", (conversation_id,))
+
+class RedisConversationStore:
+    """Redis-backed store - works with any client exposing get, set(name, value, ex=) and delete"""
+
+    def __init__(self, client, ttl=CONVERSATION_TTL_SECONDS, prefix="debate:conversation:"):
+        self.client = client
+        self.ttl = ttl
+        self.prefix = prefix
+
+    def get(self, conversation_id):
+        value = self.client.get(self.prefix + conversation_id)
+        if value is None:
+            return None
+        if isinstance(value, bytes):
+            value = value.decode("utf-8")
+        return json.loads(value)
+
+    def save(self, conversation_id, record):
+        self.client.set(self.prefix + conversation_id, json.dumps(record, ensure_ascii=False), ex=self.ttl)
+
+    def delete(self, conversation_id):
+        self.client.delete(self.prefix + conversation_id)
+
+def create_conversation_store():
+    """Store configured by CONVERSATION_STORE, falling back to memory if the backend is unavailable"""
+    backend = os.getenv("CONVERSATION_STORE", "memory").lower()
+    try:
+        if backend == "sqlite":
+            path = os.getenv("CONVERSATION_DB_PATH", "conversations.db")
+            logger.info(f"✅ Using SQLite conversation store at {path}")
+            return SQLiteConversationStore(path)
+        if backend == "redis":
+            import redis
+            client = redis.Redis.from_url(os.getenv("REDIS_URL", "redis://localhost:6379/0"))
+            logger.info("✅ Using Redis conversation store")
+            return RedisConversationStore(client)
+    except Exception as e:
+        logger.error(f"❌ Could not create {backend} conversation store, using memory: {e}")
+    return MemoryConversationStore()
+
+_store = None
+_store_lock = threading.Lock()
+
+def get_conversation_store():
+    """The configured store, created on first use"""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = create_conversation_store()
+    return _store
+
+def set_conversation_store(store):
+    """Replace the store (tests, or wiring a custom backend)"""
+    global _store
+    _store = store
+
+def resolve_conversation(conversation_id, client_history=None):
+    """
+    Conversation ID and record for a request
+    A stored conversation wins over client-sent history. Unknown or missing IDs start a
+    new record seeded with the client's history, so older clients keep working. The new
+    record always gets a fresh ID - a client can't choose the ID it is stored under.
+    """
+    if conversation_id:
+        try:
+            record = get_conversation_store().get(conversation_id)
+        except Exception as e:
+            logger.error(f"❌ Could not load conversation {conversation_id}: {e}")
+            record = None
+        if record is not None:
+            return conversation_id, record
+    return uuid.uuid4().hex, new_record(client_history)
+
+def record_turn(conversation_id, record, user_message, reply):
+    """Append a user message and the reply, then save the conversation"""
+    if user_message:
+        record["history"].append({"role": "user", "content": user_message})
+    record["history"].append({"role": "assistant", "content": reply})
+    record["history"] = record["history"][-CONVERSATION_MAX_MESSAGES:]
+    try:
+        get_conversation_store().save(conversation_id, record)
+    except Exception as e:
+        logger.error(f"❌ Could not save conversation {conversation_id}: {e}")
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Server-sent events helpers for the debate endpoints
+Forwards chat completion tokens to the client as they arrive
+"""
+
+import json
+import logging
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
+
+logger = logging.getLogger(__name__)
+
+# Keep proxies (nginx, Render) from buffering the stream
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    "X-Accel-Buffering": "no",
+}
+
+def sse_event(event, data):
+    """Format one server-sent event with a JSON payload"""
+    payload = json.dumps(jsonable_encoder(data), ensure_ascii=False)
+    return f"event: {event}\ndata: {payload}\n\n"
+
+def stream_chat_completion(client, **completion_args):
+    """Yield the text of each chat completion delta as it arrives"""
+    stream = client.chat.completions.create(stream=True, **completion_args)
+    for chunk in stream:
+        if not chunk.choices:
+            continue
+        text = chunk.choices[0].delta.content
+        if text:
+            yield text
+
+def stream_debate_response(client, completion_args, before=(), after=None, done_extra=None):
+    """
+    Stream a debate reply as server-sent events
+    Events: the `before` events, one "token" event per text delta, the events returned
+    by after(full_response), then "done" with the full response (plus done_extra fields).
+    An "error" event ends the stream if the completion fails midway.
+    """
+    def event_stream():
+        for event, data in before:
+            yield sse_event(event, data)
+
+        chunks = []
+        try:
+            for text in stream_chat_completion(client, **completion_args):
+                chunks.append(text)
+                yield sse_event("token", {"text": text})
+        except Exception as e:
+            logger.error(f"Error while streaming debate response: {e}")
+            yield sse_event("error", {"detail": str(e)})
+            return
+
+        ai_response = "".join(chunks)
+        for event, data in (after(ai_response) if after else ()):
+            yield sse_event(event, data)
+        yield sse_event("done", {"response": ai_response, **(done_extra or {})})
+
+    # Sync generator - Starlette iterates it in a worker thread, off the event loop
+    return StreamingResponse(event_stream(), media_type="text/event-stream", headers=SSE_HEADERS)
+
+def stream_cached_response(ai_response, done_extra=None):
+    """Stream an already generated reply (e.g. from the answer cache) as one token event"""
+    def event_stream():
+        yield sse_event("token", {"text": ai_response})
+        yield sse_event("done", {"response": ai_response, **(done_extra or {})})
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream", headers=SSE_HEADERS)
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+Debater rules and system prompts
+Rules are read from data/debater/rules.json once and re-read only when the file changes,
+and the system prompt for each debate endpoint is compiled once per rules version
+"""
+
+import json
+import os
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+RULES_PATH = os.path.join(os.path.dirname(__file__), '..', 'data', 'debater', 'rules.json')
+
+# Rules always included in the prompt, ahead of the others
+PRIORITY_RULE_IDS = [3, 14, 15, 19, 43, 69, 70]
+
+# Personality for /debate
+DEBATE_PERSONALITY = """You ARE a submitter who follows Submission as clarified by the messenger of the covenant Rashad Khalifa.
+
+CRITICAL FORMATTING:
+- Use HTML: <br><br> between paragraphs, <br> for line breaks within lists
+- Bold with <strong>text</strong>
+- Lists: <br>• Point one<br>• Point two
+- Verses: [2:255] format (auto-linked)
+
+CRITICAL PERSONALITY:
+- NEVER say "as a submitter" or "according to Rashad" - you ARE a submitter
+- NEVER use "Islam/Muslim" - only "Submission/Submitter" 
+- Present beliefs as facts, not opinions
+- Be direct and concise"""
+
+# Personality for /debate/enhanced
+ENHANCED_PERSONALITY = """You ARE a submitter. Never say "as a submitter" - you speak from this perspective naturally.
+
+HTML FORMATTING (REQUIRED):
+• Use <br><br> between paragraphs
+• Lists: <br>• Point one<br>• Point two
+• Bold: <strong>text</strong>
+• Verses: [2:255] format
+
+PERSONALITY:
+• Never use "Islam/Muslim" - only "Submission/Submitter"
+• State facts directly without "according to" phrases
+• Maximum 250 words
+• Be direct and authoritative"""
+
+# Rules and the prompts compiled from them, replaced as a whole when the file changes
+# so a reader never pairs one version's rules with another version's prompts
+_snapshot = {"path": None, "mtime": None, "rules": [], "prompts": {}}
+_snapshot_lock = threading.Lock()
+
+def _file_mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+def _load_snapshot(path=None):
+    """Current {"path", "mtime", "rules", "prompts"} for path, re-reading the file if it changed"""
+    global _snapshot
+    path = path or RULES_PATH
+    mtime = _file_mtime(path)
+    snapshot = _snapshot
+    if snapshot["path"] == path and snapshot["mtime"] == mtime:
+        return snapshot
+
+    with _snapshot_lock:
+        snapshot = _snapshot
+        if snapshot["path"] == path and snapshot["mtime"] == mtime:
+            return snapshot
+
+        rules = []
+        if mtime is not None:
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                rules = [rule for rule in data.get('rules', []) if rule.get('active', True)]
+                logger.info(f"Loaded {len(rules)} active debater rules")
+            except Exception as e:
+                logger.warning(f"Could not load debater rules: {e}")
+                if snapshot["path"] == path and snapshot["rules"]:
+                    # Keep serving the last good rules while the file is being edited
+                    rules = snapshot["rules"]
+
+        _snapshot = {"path": path, "mtime": mtime, "rules": rules, "prompts": {}}
+        return _snapshot
+
+def load_debater_rules(path=None):
+    """
+    Active rules from rules.json
+    Cached until the file's modification time changes, so edits apply without a restart
+    """
+    return _load_snapshot(path)["rules"]
+
+def format_debater_rules(rules, with_categories=False, max_other_rules=8):
+    """Format rules for system prompt - priority rules first, then a limited number of others"""
+    if not rules:
+        return "No specific rules loaded."
+    
+    priority_rules = [r for r in rules if r.get('id') in PRIORITY_RULE_IDS]
+    other_rules = [r for r in rules if r.get('id') not in PRIORITY_RULE_IDS][:max_other_rules]
+    
+    formatted_rules = []
+    for rule in priority_rules + other_rules:
+        content = rule.get('content', '').strip()
+        if content and len(content) > 10:
+            if with_categories:
+                formatted_rules.append(f"[{rule.get('category', 'general').upper()}] {content}")
+            else:
+                formatted_rules.append(content)
+    
+    return "\n".join(formatted_rules)
+
+def _compile_debate_prompt(rules):
+    return f"""{DEBATE_PERSONALITY}
+
+KEY RULES TO FOLLOW:
+{format_debater_rules(rules, with_categories=True, max_other_rules=10)}
+
+CRITICAL INSTRUCTIONS:
+- Maximum 250 words per response
+- Use HTML formatting for clarity
+- Never explain you're following Rashad's teachings - just state facts
+- Include specific verse references [x:y] and video links from rules"""
+
+def _compile_enhanced_prompt(rules):
+    # The endpoint appends the per-request AVAILABLE DATA section
+    return f"""{ENHANCED_PERSONALITY}
+
+RULES TO FOLLOW:
+{format_debater_rules(rules)}"""
+
+PROMPT_COMPILERS = {
+    "debate": _compile_debate_prompt,
+    "enhanced": _compile_enhanced_prompt,
+}
+
+def get_system_prompt(variant, path=None):
+    """
+    Compiled system prompt for "debate" (/debate) or "enhanced" (/debate/enhanced)
+    Recompiled only when rules.json changes
+    """
+    # Rules and prompts come from the same snapshot, even if another thread reloads meanwhile
+    snapshot = _load_snapshot(path)
+    prompt = snapshot["prompts"].get(variant)
+    if prompt is None:
+        prompt = snapshot["prompts"].setdefault(variant, PROMPT_COMPILERS[variant](snapshot["rules"]))
+    return prompt
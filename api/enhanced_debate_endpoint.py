@@ -7,25 +7,39 @@ Integrates vector search, verse lookup, root analysis, and context awareness
 from fastapi import HTTPException
 from pydantic import BaseModel
 from typing import List, Dict, Optional, Any
-import json
-import os
 import logging
+import os
 import re
-from openai import OpenAI
+import heapq
+import asyncio
+from functools import cached_property
 import numpy as np
 from youtube_mapper import YouTubeMapper, youtube_mapper
+from debate_streaming import stream_debate_response
+from debater_rules import get_system_prompt
+from conversation_context import build_chat_messages
+from conversation_store import resolve_conversation, record_turn
+from verse_index import get_verse_index, get_root_index
+from citation_resolver import extract_verse_references, resolve_citations
+from ttl_cache import TTLCache
 
 logger = logging.getLogger("EnhancedDebateAPI")
 
+# Retrieval bundles (related verses, search results, root analysis) for repeated contexts
+RETRIEVAL_CACHE_TTL_SECONDS = int(os.getenv("RETRIEVAL_CACHE_TTL_SECONDS", "3600"))
+RETRIEVAL_CACHE_MAX_ENTRIES = int(os.getenv("RETRIEVAL_CACHE_MAX_ENTRIES", "512"))
+
 class EnhancedDebateRequest(BaseModel):
     topic: Optional[str] = None
     message: Optional[str] = None
     isNewTopic: bool = False
     conversationHistory: List[Dict[str, str]] = []
+    conversationId: Optional[str] = None  # Server-side history - send only the new message
     currentTab: Optional[str] = None
     currentVerses: Optional[List[str]] = None
     searchContext: Optional[str] = None
     userLanguage: Optional[str] = "en"
+    stream: bool = False  # Stream the reply as server-sent events
 
 class VectorSearchResult(BaseModel):
     collection: str
@@ -58,32 +72,33 @@ class EnhancedDebateResponse(BaseModel):
     rootAnalysis: List[RootInfo] = []
     suggestedTabs: List[Dict[str, Any]] = []
     citations: List[Dict[str, Any]] = []
+    conversationId: Optional[str] = None
 
 class DebateContextManager:
     """Manages context and search integration for debates"""
     
+    # Topic to keyword mapping for verse search
+    TOPIC_KEYWORDS = {
+        'messenger': ['messenger', 'prophet', 'rashad', 'covenant'],
+        'prayer': ['salat', 'pray', 'worship', 'prostrate'],
+        'charity': ['zakat', 'charity', 'give', 'poor'],
+        'submission': ['submit', 'surrender', 'devote', 'obey'],
+        'god': ['god', 'lord', 'worship', 'alone'],
+        'miracle': ['sign', 'proof', 'nineteen', 'mathematical'],
+        'leadership': ['leader', 'guide', 'righteous', 'example']
+    }
+    
     def __init__(self, vector_collections, verses_data, client):
         self.vector_collections = vector_collections
         self.verses_data = verses_data
         self.client = client
         # Use the global youtube_mapper instance that's already loaded
         self.youtube_mapper = youtube_mapper
+        self.retrieval_cache = TTLCache(maxsize=RETRIEVAL_CACHE_MAX_ENTRIES, ttl=RETRIEVAL_CACHE_TTL_SECONDS)
         
     def extract_verse_references(self, text: str) -> List[str]:
-        """Extract verse references from text"""
-        pattern = r'\b(\d{1,3}):(\d{1,3})(?:-(\d{1,3}))?\b'
-        matches = re.findall(pattern, text)
-        
-        verse_refs = []
-        for match in matches:
-            chapter, start_verse, end_verse = match
-            if end_verse:
-                for v in range(int(start_verse), int(end_verse) + 1):
-                    verse_refs.append(f"{chapter}:{v}")
-            else:
-                verse_refs.append(f"{chapter}:{start_verse}")
-        
-        return list(set(verse_refs))
+        """Extract valid verse references from text - ranges are merged and capped"""
+        return extract_verse_references(text)
     
     def extract_key_topics(self, text: str) -> List[str]:
         """Extract key theological topics from text"""
@@ -123,49 +138,107 @@ class DebateContextManager:
     
     def get_verse_info(self, verse_ref: str) -> Optional[VerseInfo]:
         """Get detailed verse information"""
-        for verse_data in self.verses_data:
-            if verse_data.get('sura_verse') == verse_ref:
-                return VerseInfo(
-                    sura_verse=verse_ref,
-                    english=verse_data.get('english', ''),
-                    arabic=verse_data.get('arabic', ''),
-                    roots=verse_data.get('roots', ''),
-                    meanings=verse_data.get('meanings', ''),
-                    footnote=verse_data.get('footnote'),
-                    subtitle=verse_data.get('subtitle')
-                )
-        return None
+        if not self.verses_data:
+            return None
+        
+        verse_data = get_verse_index(self.verses_data).get(verse_ref)
+        if verse_data is None:
+            return None
+        
+        return VerseInfo(
+            sura_verse=verse_ref,
+            english=verse_data.get('english', ''),
+            arabic=verse_data.get('arabic', ''),
+            roots=verse_data.get('roots', ''),
+            meanings=verse_data.get('meanings', ''),
+            footnote=verse_data.get('footnote'),
+            subtitle=verse_data.get('subtitle')
+        )
     
-    def search_verses_by_topic(self, topics: List[str], limit: int = 5) -> List[VerseInfo]:
-        """Search verses related to specific topics"""
-        relevant_verses = []
+    @cached_property
+    def topic_postings(self) -> Dict[str, List[int]]:
+        """Topic -> ascending positions of verses whose English text mentions a topic keyword, built on first use"""
+        postings = {topic: [] for topic in self.TOPIC_KEYWORDS}
         
-        # Topic to keyword mapping for verse search
-        topic_keywords = {
-            'messenger': ['messenger', 'prophet', 'rashad', 'covenant'],
-            'prayer': ['salat', 'pray', 'worship', 'prostrate'],
-            'charity': ['zakat', 'charity', 'give', 'poor'],
-            'submission': ['submit', 'surrender', 'devote', 'obey'],
-            'god': ['god', 'lord', 'worship', 'alone'],
-            'miracle': ['sign', 'proof', 'nineteen', 'mathematical'],
-            'leadership': ['leader', 'guide', 'righteous', 'example']
-        }
+        for position, verse_data in enumerate(self.verses_data or []):
+            english_text = (verse_data.get('english') or '').lower()
+            for topic, keywords in self.TOPIC_KEYWORDS.items():
+                if any(keyword in english_text for keyword in keywords):
+                    postings[topic].append(position)
         
-        for verse_data in self.verses_data:
-            english_text = verse_data.get('english', '').lower()
-            
-            for topic in topics:
-                if topic in topic_keywords:
-                    keywords = topic_keywords[topic]
-                    if any(keyword in english_text for keyword in keywords):
-                        verse_info = self.get_verse_info(verse_data['sura_verse'])
-                        if verse_info and verse_info not in relevant_verses:
-                            relevant_verses.append(verse_info)
-                            if len(relevant_verses) >= limit:
-                                return relevant_verses
+        logger.info(f"✅ Built topic posting lists: { {topic: len(p) for topic, p in postings.items()} }")
+        return postings
+    
+    def search_verses_by_topic(self, topics: List[str], limit: int = 5, exclude: Optional[set] = None) -> List[VerseInfo]:
+        """
+        Search verses related to specific topics
+        Returns the first matching verses in Quran order, skipping references in exclude
+        """
+        if limit <= 0 or not self.verses_data:
+            return []
+        
+        posting_lists = [self.topic_postings[topic] for topic in topics if topic in self.topic_postings]
+        exclude = exclude or set()
+        
+        relevant_verses = []
+        last_position = None
+        for position in heapq.merge(*posting_lists):
+            if position == last_position:
+                continue
+            last_position = position
+            
+            verse_ref = self.verses_data[position].get('sura_verse')
+            if verse_ref in exclude:
+                continue
+            
+            verse_info = self.get_verse_info(verse_ref)
+            if verse_info:
+                relevant_verses.append(verse_info)
+                if len(relevant_verses) >= limit:
+                    break
         
         return relevant_verses
     
+    def gather_local_context(self, verse_refs: List[str], topics: List[str], arabic_terms: List[str], limit: int = 5):
+        """
+        Index-only context: referenced verses, topically related verses and root analysis
+        Returns: (related_verses, root_analysis)
+        """
+        # First, get explicitly referenced verses
+        related_verses = []
+        for ref in verse_refs[:limit]:
+            verse_info = self.get_verse_info(ref)
+            if verse_info:
+                related_verses.append(verse_info)
+        
+        # Then, search for topically relevant verses
+        if topics:
+            related_verses.extend(self.search_verses_by_topic(
+                topics,
+                limit=limit - len(related_verses),
+                exclude={verse.sura_verse for verse in related_verses}
+            ))
+        
+        # Analyze roots if Arabic terms are mentioned
+        root_analysis = self.analyze_roots("", arabic_terms) if arabic_terms else []
+        
+        return related_verses, root_analysis
+    
+    def retrieval_key(self, query: str, verse_refs: List[str], topics: List[str], arabic_terms: List[str]):
+        """
+        Cache key for the retrieval bundle of a context
+        Built from what was extracted (verse references, topics and Arabic terms, which
+        are case- and punctuation-sensitive) plus the normalized query text for the vector
+        search, and a snapshot of the loaded collections so results are recomputed once
+        more collections finish loading
+        """
+        text = ' '.join(re.sub(r'[^\w:]+', ' ', re.sub(r'<[^>]+>', ' ', query.lower())).split())
+        snapshot = tuple(sorted(
+            (name, collection.get("size"))
+            for name, collection in list(self.vector_collections.items())
+        ))
+        return tuple(verse_refs), tuple(topics), tuple(arabic_terms), text, snapshot, id(self.verses_data)
+    
     def search_related_content(self, query: str, topics: List[str], num_results: int = 3) -> List[VectorSearchResult]:
         """Enhanced search across collections based on topics"""
         results = []
@@ -226,41 +299,24 @@ class DebateContextManager:
         return final_results
     
     def analyze_roots(self, text: str, arabic_terms: List[str]) -> List[RootInfo]:
-        """Enhanced root analysis"""
+        """Enhanced root analysis - one root index lookup per term"""
+        if not self.verses_data:
+            return []
+        
+        root_index = get_root_index(self.verses_data)
         roots_info = []
         
         for term in arabic_terms:
-            matching_verses = []
-            root_meanings = set()
-            
-            for verse_data in self.verses_data:
-                roots_str = verse_data.get('roots', '')
-                meanings_str = verse_data.get('meanings', '')
-                
-                if term in roots_str.upper():
-                    matching_verses.append(verse_data.get('sura_verse'))
-                    
-                    # Extract meanings for this root
-                    if meanings_str and term in meanings_str.upper():
-                        # Parse meanings more carefully
-                        parts = meanings_str.split(',')
-                        for part in parts:
-                            if term in part.upper():
-                                meaning = part.strip()
-                                if ':' in meaning:
-                                    meaning = meaning.split(':')[1].strip()
-                                root_meanings.add(meaning)
-            
-            if matching_verses:
-                # Combine meanings intelligently
-                combined_meaning = '; '.join(list(root_meanings)[:3]) if root_meanings else f"Root {term}"
-                
-                roots_info.append(RootInfo(
-                    root=term,
-                    verses=matching_verses[:10],
-                    meaning=combined_meaning,
-                    frequency=len(matching_verses)
-                ))
+            root = root_index.lookup(term)
+            if not root:
+                continue
+            
+            roots_info.append(RootInfo(
+                root=term,
+                verses=root["verses"][:10],
+                meaning='; '.join(root["meanings"]) if root["meanings"] else f"Root {term}",
+                frequency=root["frequency"]
+            ))
         
         return roots_info
     
@@ -353,52 +409,6 @@ class DebateContextManager:
             
         return None
 
-def load_debater_rules():
-    """Load rules from debater rules.json"""
-    try:
-        rules_path = os.path.join(os.path.dirname(__file__), '..', 'data', 'debater', 'rules.json')
-        if os.path.exists(rules_path):
-            with open(rules_path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                return [rule for rule in data.get('rules', []) if rule.get('active', True)]
-    except Exception as e:
-        logger.warning(f"Could not load debater rules: {e}")
-    return []
-
-def get_debater_personality():
-    """Get submitter personality traits"""
-    return """You ARE a submitter. Never say "as a submitter" - you speak from this perspective naturally.
-
-HTML FORMATTING (REQUIRED):
-• Use <br><br> between paragraphs
-• Lists: <br>• Point one<br>• Point two
-• Bold: <strong>text</strong>
-• Verses: [2:255] format
-
-PERSONALITY:
-• Never use "Islam/Muslim" - only "Submission/Submitter"
-• State facts directly without "according to" phrases
-• Maximum 250 words
-• Be direct and authoritative"""
-
-def format_debater_rules(rules):
-    """Format rules for system prompt"""
-    if not rules:
-        return "No specific rules loaded."
-    
-    formatted_rules = []
-    # Prioritize personality and key content rules
-    priority_ids = [3, 14, 15, 19, 43, 69, 70]
-    priority_rules = [r for r in rules if r.get('id') in priority_ids]
-    other_rules = [r for r in rules if r.get('id') not in priority_ids][:8]
-    
-    for rule in priority_rules + other_rules:
-        content = rule.get('content', '').strip()
-        if content and len(content) > 10:
-            formatted_rules.append(content)
-    
-    return "\n".join(formatted_rules)
-
 def create_enhanced_debate_endpoint(app, vector_collections, verses_data, client):
     """Add enhanced debate endpoint to the FastAPI app"""
     
@@ -409,10 +419,17 @@ def create_enhanced_debate_endpoint(app, vector_collections, verses_data, client
         """Enhanced debate endpoint with integrated search and context"""
         
         try:
+            # Stored history for this conversation, or the client-sent history for a new one
+            loop = asyncio.get_running_loop()
+            conversation_id, conversation = await loop.run_in_executor(
+                None, resolve_conversation, request.conversationId, request.conversationHistory
+            )
+            history = conversation["history"]
+            
             # Extract context from the conversation
             full_context = request.message or request.topic or ""
-            if request.conversationHistory:
-                recent_messages = request.conversationHistory[-3:]
+            if history:
+                recent_messages = history[-3:]
                 for msg in recent_messages:
                     full_context += f" {msg.get('content', '')}"
             
@@ -421,43 +438,34 @@ def create_enhanced_debate_endpoint(app, vector_collections, verses_data, client
             topics = context_manager.extract_key_topics(full_context)
             arabic_terms = context_manager.extract_arabic_terms(full_context)
             
-            # Load rules and personality
-            debater_rules = load_debater_rules()
-            personality = get_debater_personality()
-            
-            # Get verse information
-            related_verses = []
-            
-            # First, get explicitly referenced verses
-            for ref in verse_refs[:5]:
-                verse_info = context_manager.get_verse_info(ref)
-                if verse_info:
-                    related_verses.append(verse_info)
-            
-            # Then, search for topically relevant verses
-            if topics:
-                topic_verses = context_manager.search_verses_by_topic(topics, limit=5-len(related_verses))
-                related_verses.extend(topic_verses)
-            
-            # Perform comprehensive searches
-            search_results = []
-            if topics or len(full_context) > 20:
-                search_results = context_manager.search_related_content(
-                    full_context, 
-                    topics,
-                    num_results=3
+            # Popular openings retrieve the same context for every user - reuse the bundle
+            retrieval_key = context_manager.retrieval_key(full_context, verse_refs, topics, arabic_terms)
+            bundle = context_manager.retrieval_cache.get(retrieval_key)
+            if bundle is not None:
+                related_verses, root_analysis, search_results = bundle
+                logger.info(f"♻️ Reusing cached debate context ({len(related_verses)} verses, {len(search_results)} results)")
+            else:
+                # Gather context concurrently - the embedding call for vector search is the slowest
+                # input, so it runs in a worker thread while the local indexes are queried
+                search_needed = bool(topics or len(full_context) > 20)
+                if search_needed:
+                    search_future = loop.run_in_executor(
+                        None, context_manager.search_related_content, full_context, topics, 3
+                    )
+                else:
+                    search_future = asyncio.sleep(0, result=[])
+                
+                (related_verses, root_analysis), search_results = await asyncio.gather(
+                    loop.run_in_executor(None, context_manager.gather_local_context, verse_refs, topics, arabic_terms),
+                    search_future
                 )
+                
+                # Empty search results may be a failed embedding call - don't keep those
+                if search_results or not search_needed:
+                    context_manager.retrieval_cache.set(retrieval_key, (related_verses, root_analysis, search_results))
             
-            # Analyze roots if Arabic terms are mentioned
-            root_analysis = []
-            if arabic_terms:
-                root_analysis = context_manager.analyze_roots(full_context, arabic_terms)
-            
-            # Build system prompt
-            system_content = f"""{personality}
-
-RULES TO FOLLOW:
-{format_debater_rules(debater_rules)}
+            # Build system prompt - rules and personality are compiled once per rules.json version
+            system_content = f"""{get_system_prompt("enhanced")}
 
 AVAILABLE DATA:
 Verses: {len(related_verses)} found
@@ -467,24 +475,11 @@ Roots: {len(root_analysis)} analyzed
 
 USE THIS DATA IN YOUR RESPONSE WHEN RELEVANT."""
 
-            # Build messages
-            messages = [
-                {"role": "system", "content": system_content}
-            ]
-            
-            # Add conversation history
-            for msg in request.conversationHistory:
-                messages.append({
-                    "role": msg.get("role", "user"),
-                    "content": msg.get("content", "")
-                })
-            
-            # Add current message
+            # Build messages within the history token budget - older turns are summarized
             current_message = request.message or f"Let's discuss: {request.topic}"
-            messages.append({"role": "user", "content": current_message})
+            messages = build_chat_messages(system_content, history, current_message, conversation["data"])
             
-            # Generate response
-            response = client.chat.completions.create(
+            completion_args = dict(
                 model="gpt-4-turbo-preview",
                 messages=messages,
                 max_tokens=350,
@@ -493,43 +488,37 @@ USE THIS DATA IN YOUR RESPONSE WHEN RELEVANT."""
                 frequency_penalty=0.2
             )
             
-            ai_response = response.choices[0].message.content
-            
-            # Extract citations from response
-            citations = []
-            response_verse_refs = context_manager.extract_verse_references(ai_response)
-            for ref in response_verse_refs:
-                verse_info = context_manager.get_verse_info(ref)
-                if verse_info:
-                    citations.append({
-                        "type": "verse",
-                        "reference": ref,
-                        "content": verse_info.english[:100] + "...",
-                        "arabic": verse_info.arabic
-                    })
-            
-            # Suggest tabs based on content
-            suggested_tabs = []
-            if verse_refs or response_verse_refs:
-                suggested_tabs.append({
-                    "tab": "verseLookup",
-                    "reason": "View discussed verses",
-                    "data": {"verses": list(set(verse_refs + response_verse_refs))[:5]}
-                })
+            def finish(ai_response):
+                """Citations and suggested tabs for the generated response, then save the turn"""
+                citations, response_verse_refs = build_citations(ai_response)
+                suggested_tabs = suggest_tabs(verse_refs, response_verse_refs, root_analysis, topics, full_context)
+                record_turn(conversation_id, conversation, current_message, ai_response)
+                return citations[:5], suggested_tabs[:3]
+            
+            if request.stream:
+                # Context first so the UI can render it while the reply streams in
+                context_event = {
+                    "relatedVerses": related_verses[:5],
+                    "searchResults": search_results[:5],
+                    "rootAnalysis": root_analysis[:3]
+                }
+                
+                def final_events(ai_response):
+                    citations, suggested_tabs = finish(ai_response)
+                    return [("citations", {"citations": citations, "suggestedTabs": suggested_tabs})]
+                
+                return stream_debate_response(
+                    client, completion_args,
+                    before=[("context", context_event)],
+                    after=final_events,
+                    done_extra={"conversationId": conversation_id}
+                )
             
-            if root_analysis:
-                suggested_tabs.append({
-                    "tab": "rootSearch", 
-                    "reason": "Explore root meanings",
-                    "data": {"roots": [r.root for r in root_analysis[:3]]}
-                })
+            # Generate response as soon as the prompt is ready, without blocking the event loop
+            response = await loop.run_in_executor(None, lambda: client.chat.completions.create(**completion_args))
             
-            if 'messenger' in topics or 'miracle' in topics:
-                suggested_tabs.append({
-                    "tab": "semanticSearch",
-                    "reason": "Find more about this topic",
-                    "data": {"query": full_context[:100]}
-                })
+            ai_response = response.choices[0].message.content
+            citations, suggested_tabs = await loop.run_in_executor(None, finish, ai_response)
             
             # Log the response data before returning
             response_data = EnhancedDebateResponse(
@@ -537,8 +526,9 @@ USE THIS DATA IN YOUR RESPONSE WHEN RELEVANT."""
                 relatedVerses=related_verses[:5],
                 searchResults=search_results[:5],
                 rootAnalysis=root_analysis[:3],
-                suggestedTabs=suggested_tabs[:3],
-                citations=citations[:5]
+                suggestedTabs=suggested_tabs,
+                citations=citations,
+                conversationId=conversation_id
             )
             
             # Log RashadAllMedia results specifically
@@ -552,6 +542,35 @@ USE THIS DATA IN YOUR RESPONSE WHEN RELEVANT."""
             logger.error(f"Error in enhanced debate endpoint: {e}")
             raise HTTPException(status_code=500, detail=str(e))
     
+    def build_citations(ai_response):
+        """Verse citations found in the generated response"""
+        return resolve_citations(ai_response, context_manager.verses_data, limit=5)
+    
+    def suggest_tabs(verse_refs, response_verse_refs, root_analysis, topics, full_context):
+        """Suggest tabs based on content"""
+        suggested_tabs = []
+        if verse_refs or response_verse_refs:
+            suggested_tabs.append({
+                "tab": "verseLookup",
+                "reason": "View discussed verses",
+                "data": {"verses": list(set(verse_refs + response_verse_refs))[:5]}
+            })
+        
+        if root_analysis:
+            suggested_tabs.append({
+                "tab": "rootSearch", 
+                "reason": "Explore root meanings",
+                "data": {"roots": [r.root for r in root_analysis[:3]]}
+            })
+        
+        if 'messenger' in topics or 'miracle' in topics:
+            suggested_tabs.append({
+                "tab": "semanticSearch",
+                "reason": "Find more about this topic",
+                "data": {"query": full_context[:100]}
+            })
+        return suggested_tabs
+    
     @app.options("/debate/enhanced")
     async def enhanced_debate_options():
         return {"message": "OK"}
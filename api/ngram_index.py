@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Character n-gram index
+Inverted index from character n-grams to document ids, used for substring
+candidate lookup and fuzzy (n-gram overlap) matching without scanning every document
+"""
+
+from collections import defaultdict, Counter
+
+class NGramIndex:
+    """
+    Inverted index of character n-grams
+    Documents are added in order and identified by their position (0, 1, 2, ...)
+    """
+
+    def __init__(self, n=3):
+        self.n = n
+        self.postings = defaultdict(list)  # n-gram -> ascending document ids
+        self.gram_counts = []  # document id -> number of distinct n-grams
+
+    def __len__(self):
+        return len(self.gram_counts)
+
+    def grams(self, text, pad_start=True, pad_end=True):
+        """
+        Distinct n-grams of text
+        Padding with a space marks word boundaries, so " قل" only matches words starting with قل.
+        Leave pad_end off for a prefix (as-you-type) query whose last word is incomplete.
+        """
+        text = (" " if pad_start else "") + text + (" " if pad_end else "")
+        if len(text) < self.n:
+            return {text} if text.strip() else set()
+        return {text[i:i + self.n] for i in range(len(text) - self.n + 1)}
+
+    def add(self, text):
+        """Index a document and return its id"""
+        doc_id = len(self.gram_counts)
+        grams = self.grams(text) if text else set()
+        for gram in grams:
+            self.postings[gram].append(doc_id)
+        self.gram_counts.append(len(grams))
+        return doc_id
+
+    def candidates(self, grams):
+        """
+        Ids of documents containing every one of the given n-grams (ascending)
+        Every document containing the query as a substring is a candidate, so callers
+        only need to verify the candidates instead of scanning the whole corpus.
+        """
+        if not grams:
+            return []
+
+        posting_lists = []
+        for gram in grams:
+            docs = self.postings.get(gram)
+            if not docs:
+                return []
+            posting_lists.append(docs)
+
+        # Intersect starting from the rarest n-gram to keep the working set small
+        posting_lists.sort(key=len)
+        result = set(posting_lists[0])
+        for docs in posting_lists[1:]:
+            result.intersection_update(docs)
+            if not result:
+                return []
+        return sorted(result)
+
+    def search(self, text, limit=10, min_score=0.5, pad_start=True, pad_end=True):
+        """
+        Fuzzy search by n-gram overlap
+        Returns: list of (doc_id, score) where score is the share of the query's n-grams
+        found in the document (1.0 = all of them), ties broken by the Dice coefficient
+        so shorter, closer documents rank first
+        Turn padding off to match the query anywhere inside a document, not only at word boundaries.
+        """
+        query_grams = self.grams(text, pad_start=pad_start, pad_end=pad_end)
+        if not query_grams:
+            return []
+
+        shared = Counter()
+        for gram in query_grams:
+            shared.update(self.postings.get(gram, ()))
+
+        total = len(query_grams)
+        needed = min_score * total
+        scored = []
+        for doc_id, count in shared.items():
+            if count < needed:
+                continue
+            dice = 2 * count / (total + self.gram_counts[doc_id])
+            scored.append((count / total, dice, doc_id))
+
+        scored.sort(key=lambda item: (-item[0], -item[1], item[2]))
+        return [(doc_id, round(score, 4)) for score, _, doc_id in scored[:limit]]
@@ -1,60 +1,103 @@
 from fastapi import APIRouter, HTTPException, Request
 from pydantic import BaseModel
-import stripe
 import logging
-from stripe_config import (
-    create_checkout_session, 
-    create_customer_portal_session,
-    handle_subscription_webhook,
-    STRIPE_WEBHOOK_SECRET
-)
-from supabase import create_client, Client
 import os
 from datetime import datetime, timedelta, timezone
+from ttl_cache import TTLCache
+from subscription_store import get_subscription_store
+from webhook_queue import WebhookQueue
 
 logger = logging.getLogger(__name__)
 
+# Subscription status responses by email. The frontend polls the status on every page
+# load; the webhook handler and user creation invalidate entries when a status changes.
+SUBSCRIPTION_CACHE_TTL_SECONDS = int(os.getenv("SUBSCRIPTION_CACHE_TTL_SECONDS", "60"))
+subscription_cache = TTLCache(maxsize=4096, ttl=SUBSCRIPTION_CACHE_TTL_SECONDS)
+
 # Create router
 router = APIRouter(prefix="/api/payment", tags=["payment"])
 
-# Supabase client
-supabase_url = os.getenv('SUPABASE_URL', 'https://fsubmqjevlfpcirgsbhi.supabase.co')
-supabase_key = os.getenv('SUPABASE_SERVICE_KEY', '')  # Need service key for server-side ops
+# Subscriptions are read and written through subscription_store - an async, pooled
+# PostgREST client by default - so database round trips don't block the event loop
+
+def normalize_email(email):
+    return (email or '').lower().strip()
+
+def invalidate_subscription(email=None):
+    """Drop the cached status for an email, or every cached status when it isn't known"""
+    if email:
+        subscription_cache.pop(normalize_email(email))
+    else:
+        subscription_cache.clear()
+
+def parse_expires_at(value):
+    """expires_at as a UTC-aware datetime ('Z', offset or naive UTC formats)"""
+    expires_at = datetime.fromisoformat(value[:-1] + '+00:00' if value.endswith('Z') else value)
+    if expires_at.tzinfo is None:
+        # Assume it's a naive datetime, treat as UTC
+        expires_at = expires_at.replace(tzinfo=timezone.utc)
+    return expires_at
+
+def subscription_status(email, rows):
+    """Status response for a user's rows (the most recent row wins if there are duplicates)"""
+    if not rows:
+        # User doesn't exist, just return that info without creating
+        logger.info(f"User {email} not found in database")
+        return {
+            "hasSubscription": False,
+            "user": None,
+            "error": None
+        }
+
+    if len(rows) > 1:
+        logger.warning(f"Multiple entries found for {email}, using most recent")
+        user = max(rows, key=lambda x: x.get('created_at') or '')
+    else:
+        user = rows[0]
+
+    expires_at_str = user.get('expires_at')
+    has_subscription = False
+
+    if user.get('status') == 'active' and expires_at_str:
+        try:
+            expires_at = parse_expires_at(expires_at_str)
+            current_time = datetime.now(timezone.utc)
+            has_subscription = expires_at > current_time
 
-logger.info(f"Initializing payment endpoints...")
-logger.info(f"SUPABASE_URL: {supabase_url}")
-logger.info(f"SUPABASE_SERVICE_KEY present: {bool(supabase_key)}")
-logger.info(f"SUPABASE_SERVICE_KEY length: {len(supabase_key) if supabase_key else 0}")
+            logger.info(f"Subscription check for {email}: expires_at={expires_at_str}, current_time={current_time}, has_subscription={has_subscription}")
+        except Exception as date_error:
+            logger.error(f"Error parsing date for {email}: {date_error}")
+            has_subscription = False
 
-# Initialize Supabase client only if service key is provided
-supabase = None
-supabase_error = None
-if supabase_key and supabase_key.strip():
+    return {
+        "hasSubscription": has_subscription,
+        "user": user,
+        "error": None
+    }
+
+def warm_up_payment_dependencies():
+    """Import stripe and create the subscription store ahead of the first payment request"""
     try:
-        # Workaround for proxy parameter issue in supabase 2.3.4
-        # Create ClientOptions manually without proxy
-        from supabase.client import ClientOptions
-        
-        # Create options without any proxy settings
-        options = ClientOptions(
-            headers={},
-            auto_refresh_token=True,
-            persist_session=True
-        )
-        
-        # Initialize Supabase client with explicit options
-        supabase = create_client(supabase_url, supabase_key, options)
-        logger.info("✅ Supabase client initialized successfully")
-                
+        import stripe_config  # noqa: F401 - configures the stripe API key on import
+        get_subscription_store()
     except Exception as e:
-        logger.error(f"❌ Failed to initialize Supabase client: {e}")
-        logger.error(f"Error type: {type(e).__name__}")
-        logger.error(f"Error args: {e.args}")
-        supabase_error = str(e)
-        supabase = None
-else:
-    logger.warning("⚠️ SUPABASE_SERVICE_KEY not provided - database operations will fail")
-    supabase_error = "No service key provided"
+        logger.error(f"Failed to warm up payment dependencies: {e}")
+
+@router.on_event("startup")
+async def resume_webhook_events():
+    # Events recorded but not applied before the last shutdown
+    try:
+        await webhook_queue.recover()
+    except Exception as e:
+        logger.error(f"❌ Could not load unapplied webhook events: {e}")
+
+@router.on_event("shutdown")
+async def close_subscription_store():
+    # Let queued webhook events finish before the store goes away
+    await webhook_queue.stop()
+    store = get_subscription_store()
+    if store is not None:
+        await store.close()
 
 # Request models
 class CreateCheckoutRequest(BaseModel):
@@ -69,6 +112,8 @@ class CreatePortalRequest(BaseModel):
 @router.post("/create-checkout-session")
 async def create_checkout_endpoint(request: CreateCheckoutRequest):
     """Create Stripe checkout session for subscription"""
+    from stripe_config import create_checkout_session
+    
     try:
         session = create_checkout_session(
             user_email=request.email,
@@ -88,6 +133,8 @@ async def create_checkout_endpoint(request: CreateCheckoutRequest):
 @router.post("/create-portal-session") 
 async def create_portal_endpoint(request: CreatePortalRequest):
     """Create customer portal session for subscription management"""
+    from stripe_config import create_customer_portal_session
+    
     try:
         session = create_customer_portal_session(
             customer_id=request.customer_id,
@@ -102,9 +149,57 @@ async def create_portal_endpoint(request: CreatePortalRequest):
         logger.error(f"Error creating portal session: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+async def apply_stripe_event(event):
+    """Apply a verified Stripe event to the subscriptions table (run by webhook_queue)"""
+    from stripe_config import handle_subscription_webhook
+    
+    store = get_subscription_store()
+    if not store:
+        logger.warning(f"⚠️ Database not configured - ignoring webhook event {event['id']}")
+        return
+    
+    result = handle_subscription_webhook(event)
+    if not result:
+        return
+    
+    # Update user subscription in database
+    if event['type'] == 'checkout.session.completed':
+        # Activate subscription
+        await store.upsert({
+            'email': result['customer_email'],
+            'status': 'active',
+            'tier': 'premium',
+            'stripe_customer_id': result['customer_id'],
+            'stripe_subscription_id': result['subscription_id'],
+            'expires_at': (datetime.now() + timedelta(days=30)).isoformat(),
+            'updated_at': datetime.now().isoformat()
+        })
+        invalidate_subscription(result['customer_email'])
+        
+    elif event['type'] == 'customer.subscription.deleted':
+        # Cancel subscription
+        rows = await store.update_by_subscription_id(result['subscription_id'], {
+            'status': 'inactive',
+            'tier': 'free',
+            'expires_at': datetime.now().isoformat(),
+            'updated_at': datetime.now().isoformat()
+        })
+        # The event only names the subscription - drop the emails of the updated rows
+        emails = [row.get('email') for row in rows if row.get('email')]
+        for email in emails:
+            invalidate_subscription(email)
+        if not emails:
+            invalidate_subscription()
+
+# Verified events are recorded in the database, then applied in the background once per event ID
+webhook_queue = WebhookQueue(apply_stripe_event, get_subscription_store)
+
 @router.post("/webhook")
 async def stripe_webhook(request: Request):
-    """Handle Stripe webhooks"""
+    """Handle Stripe webhooks - verify the signature and queue the event"""
+    import stripe
+    from stripe_config import STRIPE_WEBHOOK_SECRET
+    
     try:
         # Get the webhook data
         payload = await request.body()
@@ -120,34 +215,18 @@ async def stripe_webhook(request: Request):
         except stripe.error.SignatureVerificationError:
             raise HTTPException(status_code=400, detail="Invalid signature")
         
-        # Handle the webhook
-        result = handle_subscription_webhook(event)
-        
-        if result and supabase:
-            # Update user subscription in database
-            if event['type'] == 'checkout.session.completed':
-                # Activate subscription
-                supabase.table('user_subscriptions').upsert({
-                    'email': result['customer_email'],
-                    'status': 'active',
-                    'tier': 'premium',
-                    'stripe_customer_id': result['customer_id'],
-                    'stripe_subscription_id': result['subscription_id'],
-                    'expires_at': (datetime.now() + timedelta(days=30)).isoformat(),
-                    'updated_at': datetime.now().isoformat()
-                }).execute()
-                
-            elif event['type'] == 'customer.subscription.deleted':
-                # Cancel subscription
-                supabase.table('user_subscriptions').update({
-                    'status': 'inactive',
-                    'tier': 'free',
-                    'expires_at': datetime.now().isoformat(),
-                    'updated_at': datetime.now().isoformat()
-                }).eq('stripe_subscription_id', result['subscription_id']).execute()
+        # Answer Stripe once the event is recorded - the queue's worker applies it
+        try:
+            queued = await webhook_queue.enqueue(event)
+        except Exception as e:
+            # Not acknowledged, so Stripe delivers it again
+            logger.error(f"❌ Could not record webhook event {event['id']}: {e}")
+            raise HTTPException(status_code=503, detail="Could not record the event, retry later")
         
-        return {"status": "success"}
+        return {"status": "success", "queued": queued}
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Webhook error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -163,63 +242,24 @@ async def get_stripe_config():
 @router.get("/user/subscription/{email}")
 async def get_user_subscription(email: str):
     """Get user subscription status"""
-    if not supabase:
+    # Normalize email to lowercase
+    email = normalize_email(email)
+    
+    cached = subscription_cache.get(email)
+    if cached is not None:
+        return cached
+    
+    store = get_subscription_store()
+    if not store:
         raise HTTPException(status_code=500, detail="Database not configured")
     
     try:
-        # Normalize email to lowercase
-        email = email.lower().strip()
-        
         # Check if user exists and has active subscription
-        response = supabase.table('user_subscriptions').select('*').eq('email', email).execute()
-        
-        if not response.data or len(response.data) == 0:
-            # User doesn't exist, just return that info without creating
-            logger.info(f"User {email} not found in database")
-            return {
-                "hasSubscription": False,
-                "user": None,
-                "error": None
-            }
+        rows = await store.find_by_email(email)
         
-        # If multiple entries exist, use the most recent one
-        if len(response.data) > 1:
-            logger.warning(f"Multiple entries found for {email}, using most recent")
-            # Sort by created_at descending and take the first
-            users = sorted(response.data, key=lambda x: x.get('created_at', ''), reverse=True)
-            user = users[0]
-        else:
-            user = response.data[0]
-            
-        # Parse expires_at date properly
-        expires_at_str = user.get('expires_at')
-        has_subscription = False
-        
-        if user.get('status') == 'active' and expires_at_str:
-            try:
-                # Handle different date formats
-                if expires_at_str.endswith('Z'):
-                    expires_at = datetime.fromisoformat(expires_at_str.replace('Z', '+00:00'))
-                elif '+' in expires_at_str or expires_at_str.endswith('+00:00'):
-                    expires_at = datetime.fromisoformat(expires_at_str)
-                else:
-                    # Assume it's a naive datetime, treat as UTC
-                    expires_at = datetime.fromisoformat(expires_at_str).replace(tzinfo=timezone.utc)
-                
-                # Compare with timezone-aware current time in UTC
-                current_time = datetime.now(timezone.utc)
-                has_subscription = expires_at > current_time
-                
-                logger.info(f"Subscription check for {email}: expires_at={expires_at_str}, current_time={current_time}, has_subscription={has_subscription}")
-            except Exception as date_error:
-                logger.error(f"Error parsing date for {email}: {date_error}")
-                has_subscription = False
-        
-        return {
-            "hasSubscription": has_subscription,
-            "user": user,
-            "error": None
-        }
+        status = subscription_status(email, rows)
+        subscription_cache.set(email, status)
+        return status
         
     except Exception as e:
         logger.error(f"Error getting user subscription: {e}")
@@ -234,8 +274,9 @@ async def create_or_update_user(request: dict):
     """Create or update user subscription"""
     logger.info(f"POST /user/subscription called with: {request}")
     
-    if not supabase:
-        logger.error("Supabase not configured")
+    store = get_subscription_store()
+    if not store:
+        logger.error("Subscription store not configured")
         raise HTTPException(status_code=500, detail="Database not configured")
     
     try:
@@ -250,12 +291,12 @@ async def create_or_update_user(request: dict):
         logger.info(f"Processing subscription request for email: {email}")
         
         # Check if user exists
-        existing_response = supabase.table('user_subscriptions').select('*').eq('email', email).execute()
+        existing = await store.find_by_email(email)
         
-        if existing_response.data and len(existing_response.data) > 0:
+        if existing:
             # User already exists, just return the existing user
             logger.info(f"User {email} already exists, returning existing user")
-            return {"success": True, "user": existing_response.data[0]}
+            return {"success": True, "user": existing[0]}
         
         # Only create new user if they don't exist
         logger.info(f"Creating new user for {email}")
@@ -270,10 +311,11 @@ async def create_or_update_user(request: dict):
             'updated_at': datetime.now(timezone.utc).isoformat()
         }
         
-        response = supabase.table('user_subscriptions').insert(user_data).execute()
+        user = await store.insert(user_data)
+        invalidate_subscription(email)
         
-        if response.data:
-            return {"success": True, "user": response.data[0]}
+        if user:
+            return {"success": True, "user": user}
         else:
             raise HTTPException(status_code=500, detail="Failed to create user")
             
@@ -290,8 +332,10 @@ async def check_user_subscription_api(email: str):
 async def test_payment_router():
     """Test endpoint to verify payment router is working"""
     import stripe
+    import stripe_config  # noqa: F401 - configures the stripe API key on import
     
-    supabase_status = "configured" if supabase is not None else "not_configured"
+    store = get_subscription_store()
+    supabase_status = "configured" if store is not None else "not_configured"
     stripe_status = "configured" if stripe.api_key else "not_configured"
     
     env_vars = {
@@ -305,9 +349,9 @@ async def test_payment_router():
     return {
         "status": "success",
         "message": "Payment router is working",
-        "supabase_configured": supabase is not None,
+        "supabase_configured": store is not None,
         "supabase_status": supabase_status,
-        "supabase_error": supabase_error,
+        "subscription_store": type(store).__name__ if store is not None else None,
         "stripe_status": stripe_status,
         "environment_variables": env_vars,
         "supabase_url": os.getenv('SUPABASE_URL'),
@@ -324,35 +368,25 @@ async def test_payment_router():
 @router.get("/test-supabase")
 async def test_supabase_connection():
     """Test Supabase connection specifically"""
-    if not supabase:
-        # Try to get more info about the create_client function
-        import inspect
-        from supabase import create_client
-        
-        create_client_info = {
-            "signature": str(inspect.signature(create_client)) if hasattr(inspect, 'signature') else "N/A",
-            "doc": create_client.__doc__,
-            "module": create_client.__module__
-        }
-        
+    store = get_subscription_store()
+    if not store:
         return {
             "status": "error",
             "message": "Supabase not initialized",
-            "error": supabase_error,
+            "error": "No service key provided",
             "supabase_url": os.getenv('SUPABASE_URL'),
             "service_key_present": bool(os.getenv('SUPABASE_SERVICE_KEY')),
-            "service_key_length": len(os.getenv('SUPABASE_SERVICE_KEY', '')),
-            "create_client_info": create_client_info
+            "service_key_length": len(os.getenv('SUPABASE_SERVICE_KEY', ''))
         }
     
     try:
         # Try a simple query to test the connection
-        response = supabase.table('user_subscriptions').select('count').execute()
+        await store.ping()
         return {
             "status": "success",
             "message": "Supabase connection working",
             "table_accessible": True,
-            "response_data": response.data if hasattr(response, 'data') else str(response)
+            "subscription_store": type(store).__name__
         }
     except Exception as e:
         return {
@@ -360,4 +394,4 @@ async def test_supabase_connection():
             "message": "Supabase connection failed",
             "error": str(e),
             "error_type": type(e).__name__
-        }
\ No newline at end of file
+        }
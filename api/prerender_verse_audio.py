@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+"""
+Pre-render verse audio into the TTS cache
+Synthesizes each selected verse once with the same text, voice, speed and model keys that
+/generate-tts uses, and lists the clips in a manifest the API checks before calling the
+TTS API. Runs are resumable - clips already in the manifest are skipped.
+
+Usage:
+    python prerender_verse_audio.py [--suras 1,36,112-114] [--fields arabic english]
+                                    [--concurrency 4] [--output DIR] [--base-url URL]
+
+--base-url points the OpenAI client at another server (e.g. a local stub for testing).
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timezone
+
+from tts_cache import TTSAudioCache, TTS_PRERENDER_DIR, load_manifest, save_manifest, tts_cache_key
+from tts_endpoint_fastapi import TTSRequest, TTS_MODEL, synthesize
+
+DEFAULT_VOICE = TTSRequest.model_fields["voice"].default
+DEFAULT_SPEED = TTSRequest.model_fields["speed"].default
+ATTEMPTS = 3
+# Completed clips between manifest saves
+SAVE_EVERY = 25
+
+def parse_suras(spec):
+    """'1,36,112-114' -> {1, 36, 112, 113, 114}"""
+    suras = set()
+    for part in spec.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        if "-" in part:
+            first, last = part.split("-", 1)
+            suras.update(range(int(first), int(last) + 1))
+        else:
+            suras.add(int(part))
+    return suras
+
+def load_verses(path=None):
+    """Verses from a JSON file, or from wherever the API loads them"""
+    if path:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    from verses_loader import load_verses_data
+    return load_verses_data() or []
+
+def select_jobs(verses, fields, suras=None, voice=DEFAULT_VOICE, speed=DEFAULT_SPEED, model=TTS_MODEL):
+    """(key, text, info) for each verse text to render, de-duplicated by key"""
+    jobs = {}
+    for verse in verses:
+        sura_verse = verse.get("sura_verse", "")
+        if suras and int(sura_verse.split(":")[0] or 0) not in suras:
+            continue
+        for field in fields:
+            text = (verse.get(field) or "").strip()
+            if not text:
+                continue
+            key = tts_cache_key(text, voice, speed, model)
+            jobs.setdefault(key, (key, text, {
+                "sura_verse": sura_verse, "field": field, "voice": voice, "speed": speed, "model": model
+            }))
+    return list(jobs.values())
+
+def render_clip(cache, key, text, info, client):
+    """Synthesize one clip into the cache, retrying transient failures"""
+    for attempt in range(1, ATTEMPTS + 1):
+        try:
+            audio = synthesize(text, info["voice"], info["speed"], info["model"], client=client)
+            break
+        except Exception:
+            if attempt == ATTEMPTS:
+                raise
+            time.sleep(attempt)
+    cache.put(key, audio)
+    return len(audio)
+
+class Progress:
+    """Prints done/total, rate and ETA at most once per interval"""
+
+    def __init__(self, total, interval=2.0, stream=sys.stdout):
+        self.total = total
+        self.interval = interval
+        self.stream = stream
+        self.done = 0
+        self.failed = 0
+        self.started = time.monotonic()
+        self._last = 0.0
+
+    def update(self, ok, label, force=False):
+        self.done += 1
+        self.failed += 0 if ok else 1
+        now = time.monotonic()
+        if not force and now - self._last < self.interval and self.done < self.total:
+            return
+        self._last = now
+        elapsed = now - self.started
+        rate = self.done / elapsed if elapsed else 0.0
+        eta = (self.total - self.done) / rate if rate else 0.0
+        print(f"[{self.done}/{self.total}] {self.done * 100 / self.total:.1f}% {label} "
+              f"({rate:.1f} clips/s, {self.failed} failed, ETA {eta:.0f}s)", file=self.stream, flush=True)
+
+def prerender(jobs, output_dir, concurrency=4, client=None, progress_interval=2.0):
+    """
+    Render jobs missing from the manifest in output_dir
+    Returns: (rendered, skipped, failed) counts
+    """
+    manifest = load_manifest(output_dir)
+    manifest.setdefault("clips", {})
+    cache = TTSAudioCache(output_dir, max_bytes=None)
+
+    todo = [job for job in jobs if not (job[0] in manifest["clips"] and os.path.exists(cache.path_for(job[0])))]
+    skipped = len(jobs) - len(todo)
+    print(f"🎙️ {len(jobs)} clips selected, {skipped} already rendered, {len(todo)} to render", flush=True)
+    if not todo:
+        return 0, skipped, 0
+
+    progress = Progress(len(todo), interval=progress_interval)
+    lock = threading.Lock()
+    failures = []
+    since_save = 0
+
+    def save():
+        manifest["updated_at"] = datetime.now(timezone.utc).isoformat()
+        save_manifest(output_dir, manifest)
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = {executor.submit(render_clip, cache, key, text, info, client): (key, info) for key, text, info in todo}
+        try:
+            for future in as_completed(futures):
+                key, info = futures[future]
+                label = f"{info['sura_verse']} {info['field']}"
+                try:
+                    size = future.result()
+                except Exception as e:
+                    failures.append((label, str(e)))
+                    progress.update(False, f"{label} failed: {e}", force=True)
+                    continue
+                with lock:
+                    manifest["clips"][key] = {**info, "bytes": size}
+                    since_save += 1
+                    if since_save >= SAVE_EVERY:
+                        save()
+                        since_save = 0
+                progress.update(True, label)
+        except KeyboardInterrupt:
+            print("\n⏹️ Interrupted - saving progress, rerun to resume", flush=True)
+            for future in futures:
+                future.cancel()
+            raise
+        finally:
+            save()
+
+    for label, error in failures[:10]:
+        print(f"❌ {label}: {error}", flush=True)
+    return len(todo) - len(failures), skipped, len(failures)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Pre-render verse audio into the TTS cache")
+    parser.add_argument("--verses", help="Verses JSON file (default: the API's verses data)")
+    parser.add_argument("--suras", help="Suras to render, e.g. '1,36,112-114' (default: all)")
+    parser.add_argument("--fields", nargs="+", default=["arabic"], help="Verse fields to render, e.g. arabic english")
+    parser.add_argument("--voice", default=DEFAULT_VOICE)
+    parser.add_argument("--speed", type=float, default=DEFAULT_SPEED)
+    parser.add_argument("--model", default=TTS_MODEL)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--output", default=TTS_PRERENDER_DIR, help="Directory served as pre-rendered audio by the API")
+    parser.add_argument("--base-url", help="OpenAI-compatible API base URL, e.g. http://127.0.0.1:9000/v1")
+    parser.add_argument("--limit", type=int, help="Render at most this many clips (for trying it out)")
+    parser.add_argument("--progress-interval", type=float, default=2.0, help="Seconds between progress lines")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING)
+
+    verses = load_verses(args.verses)
+    if not verses:
+        print("❌ No verses data found", file=sys.stderr)
+        return 1
+
+    suras = parse_suras(args.suras) if args.suras else None
+    jobs = select_jobs(verses, args.fields, suras, args.voice, args.speed, args.model)
+    if args.limit is not None:
+        jobs = jobs[:args.limit]
+
+    import openai
+    client = openai.OpenAI(
+        api_key=os.getenv("OPENAI_API_KEY") or ("stub" if args.base_url else None),
+        base_url=args.base_url,
+        max_retries=2
+    )
+
+    try:
+        rendered, skipped, failed = prerender(jobs, args.output, args.concurrency, client, args.progress_interval)
+    except KeyboardInterrupt:
+        return 130
+
+    print(f"✅ Rendered {rendered}, skipped {skipped}, failed {failed} - manifest in {args.output}", flush=True)
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
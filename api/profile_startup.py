@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""
+Startup profiler for the Vector Search API
+Reports import time per module, load time per data file and total startup time.
+
+Usage:
+    python profile_startup.py [--top 25] [--json report.json]
+                              [--max-import-ms 800] [--max-startup-ms 3000]
+
+Exits with status 1 when a budget is exceeded so it can run in CI.
+Each measurement runs in a fresh interpreter so module caches don't hide cold-start cost.
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+API_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Data files read during startup, in the order the API loads them
+# Each entry is (setup, load) - only the load statement is timed
+DATA_FILES = {
+    "quran_verse_mapping.json": ("from vector_search_api import load_quran_verse_mapping", "load_quran_verse_mapping()"),
+    "verses data": ("from verses_loader import load_verses_data", "load_verses_data()"),
+    "debater rules.json": ("from debater_rules import get_system_prompt", "get_system_prompt('debate')"),
+    "youtube_search_results_updated.json": ("from youtube_mapper import youtube_mapper", "youtube_mapper.load_mappings()"),
+}
+
+# Startup as the server runs it, stopping once the app accepts requests
+# (vector collections keep loading in the background after this point)
+STARTUP_SCRIPT = """
+import time
+start = time.perf_counter()
+from fastapi.testclient import TestClient
+import vector_search_api
+with TestClient(vector_search_api.app) as test_client:
+    ready = time.perf_counter()
+    test_client.get("/health")
+print(f"STARTUP_MS={(ready - start) * 1000:.1f}")
+"""
+
+def profile_env():
+    """Environment for profiling runs - never download vectors or call external services"""
+    env = dict(os.environ)
+    env.setdefault("USE_CLOUD_VECTORS", "false")
+    env["PYTHONDONTWRITEBYTECODE"] = "1"
+    return env
+
+def run_python(args, timeout=300):
+    """Run a Python snippet in a fresh interpreter inside the API directory"""
+    return subprocess.run(
+        [sys.executable] + args,
+        cwd=API_DIR,
+        env=profile_env(),
+        capture_output=True,
+        text=True,
+        timeout=timeout
+    )
+
+def profile_imports(module="vector_search_api"):
+    """
+    Profile import time with -X importtime
+    Returns: dict with the total import time and per-module cumulative times (ms)
+    """
+    result = run_python(["-X", "importtime", "-c", f"import {module}"])
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{result.stderr[-2000:]}")
+
+    modules = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        parts = line[len("import time:"):].split("|")
+        if len(parts) != 3:
+            continue
+        _, cumulative_us, name = parts
+        name = name.strip()
+        modules[name] = max(modules.get(name, 0.0), int(cumulative_us) / 1000)
+
+    return {
+        "total_ms": modules.get(module, 0.0),
+        "modules": modules,
+    }
+
+def profile_data_files():
+    """Time each data file load in a fresh interpreter"""
+    timings = {}
+    for name, (setup, load) in DATA_FILES.items():
+        script = (
+            "import time, logging\n"
+            "logging.disable(logging.CRITICAL)\n"
+            f"{setup}\n"
+            "start = time.perf_counter()\n"
+            f"{load}\n"
+            "print(f'ELAPSED_MS={(time.perf_counter() - start) * 1000:.1f}')\n"
+        )
+        result = run_python(["-c", script])
+        timings[name] = parse_marker(result.stdout, "ELAPSED_MS")
+        if timings[name] is None:
+            timings[name] = {"error": (result.stderr or result.stdout)[-500:]}
+    return timings
+
+def profile_startup():
+    """Time from interpreter start to the app accepting requests"""
+    result = run_python(["-c", STARTUP_SCRIPT])
+    startup_ms = parse_marker(result.stdout, "STARTUP_MS")
+    if startup_ms is None:
+        raise RuntimeError(f"Startup profiling failed:\n{result.stderr[-2000:]}")
+    return startup_ms
+
+def parse_marker(output, marker):
+    """Find a MARKER=value line in script output"""
+    for line in output.splitlines():
+        if line.startswith(f"{marker}="):
+            return float(line.split("=", 1)[1])
+    return None
+
+def print_report(report, top):
+    """Print a human readable report"""
+    imports = report["imports"]
+    print("=" * 60)
+    print("IMPORT TIME (cumulative, ms)")
+    print("=" * 60)
+    print(f"vector_search_api total: {imports['total_ms']:.1f} ms\n")
+    ranked = sorted(imports["modules"].items(), key=lambda item: item[1], reverse=True)
+    for name, ms in ranked[:top]:
+        print(f"  {ms:9.1f}  {name}")
+
+    print("\n" + "=" * 60)
+    print("DATA FILE LOAD TIME (ms)")
+    print("=" * 60)
+    for name, ms in report["data_files"].items():
+        if isinstance(ms, dict):
+            print(f"  {'error':>9}  {name}: {ms['error'].strip().splitlines()[-1] if ms['error'].strip() else ''}")
+        else:
+            print(f"  {ms:9.1f}  {name}")
+
+    print("\n" + "=" * 60)
+    print(f"STARTUP TIME: {report['startup_ms']:.1f} ms (until the app accepts requests)")
+    print("=" * 60)
+
+def main():
+    parser = argparse.ArgumentParser(description="Profile Vector Search API import and startup time")
+    parser.add_argument("--top", type=int, default=25, help="Number of slowest modules to show")
+    parser.add_argument("--json", dest="json_path", help="Write the full report to this JSON file")
+    parser.add_argument("--max-import-ms", type=float, help="Fail if importing vector_search_api takes longer")
+    parser.add_argument("--max-startup-ms", type=float, help="Fail if startup takes longer")
+    args = parser.parse_args()
+
+    started = time.time()
+    report = {
+        "imports": profile_imports(),
+        "data_files": profile_data_files(),
+        "startup_ms": profile_startup(),
+    }
+    print_report(report, args.top)
+    print(f"\nProfiled in {time.time() - started:.1f}s")
+
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written to {args.json_path}")
+
+    failures = []
+    if args.max_import_ms is not None and report["imports"]["total_ms"] > args.max_import_ms:
+        failures.append(f"import time {report['imports']['total_ms']:.1f} ms > budget {args.max_import_ms:.1f} ms")
+    if args.max_startup_ms is not None and report["startup_ms"] > args.max_startup_ms:
+        failures.append(f"startup time {report['startup_ms']:.1f} ms > budget {args.max_startup_ms:.1f} ms")
+
+    for failure in failures:
+        print(f"❌ {failure}")
+    if failures:
+        sys.exit(1)
+    print("✅ Within startup budgets")
+
+if __name__ == "__main__":
+    main()
@@ -6,10 +6,11 @@ Handles root-based searches similar to Discord bot's rt: functionality
 from typing import List, Optional, Dict
 from pydantic import BaseModel
 import re
+from verse_index import get_arabic_verse_index, get_transliteration_index
 
 class RootSearchRequest(BaseModel):
     query: str
-    search_type: str = "root"  # "root", "english", "arabic", "smart"
+    search_type: str = "root"  # "root", "english", "arabic", "transliteration", "smart"
     limit: int = 100
 
 class RootSearchResponse(BaseModel):
@@ -21,6 +22,11 @@ def search_verses_by_root(verses_data: List[dict], query: str, search_type: str
     """
     Search verses by root pattern
     """
+    if search_type == "arabic":
+        return search_verses_by_arabic(verses_data, query, limit)
+    if search_type == "transliteration":
+        return search_verses_by_transliteration(verses_data, query, limit)
+    
     results = []
     search_info = {
         "query": query,
@@ -69,6 +75,41 @@ def search_verses_by_root(verses_data: List[dict], query: str, search_type: str
         "search_info": search_info
     }
 
+def search_verses_by_arabic(verses_data: List[dict], query: str, limit: int = 100):
+    """
+    Search verses by Arabic text, ignoring diacritics and letter variants
+    Exact phrase matches come first, then prefix (as-you-type) and fuzzy matches
+    """
+    matches = get_arabic_verse_index(verses_data).search(query, limit=limit)
+    
+    return {
+        "verses": [match["verse"] for match in matches],
+        "total_found": len(matches),
+        "search_info": {
+            "query": query,
+            "search_type": "arabic",
+            "match_types": [match["match_type"] for match in matches],
+            "scores": [match["score"] for match in matches]
+        }
+    }
+
+def search_verses_by_transliteration(verses_data: List[dict], query: str, limit: int = 100):
+    """
+    Search verses by transliterated text ("qul huwallahu ahad", "kulhu")
+    Spelling, spacing and accents are ignored; best trigram overlap comes first
+    """
+    matches = get_transliteration_index(verses_data).search(query, limit=limit)
+    
+    return {
+        "verses": [match["verse"] for match in matches],
+        "total_found": len(matches),
+        "search_info": {
+            "query": query,
+            "search_type": "transliteration",
+            "scores": [match["score"] for match in matches]
+        }
+    }
+
 def search_verses_by_text(verses_data: List[dict], query: str, field: str = "english", limit: int = 100):
     """
     Search verses by text content
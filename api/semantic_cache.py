@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Semantic answer cache for debate openings
+New-topic openings are cached by topic embedding. A new topic whose embedding is within
+the cosine threshold of a cached topic gets the cached opening instead of a fresh GPT call.
+
+Opt-in with DEBATE_SEMANTIC_CACHE=true
+"""
+
+import logging
+import os
+import re
+import threading
+import time
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+SEMANTIC_CACHE_ENABLED = os.getenv("DEBATE_SEMANTIC_CACHE", "false").lower() == "true"
+# Cosine similarity needed to reuse an answer - ada-002 scores rephrasings of one topic around 0.97+
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("DEBATE_SEMANTIC_CACHE_THRESHOLD", "0.97"))
+SEMANTIC_CACHE_MAX_ENTRIES = int(os.getenv("DEBATE_SEMANTIC_CACHE_MAX_ENTRIES", "500"))
+SEMANTIC_CACHE_TTL_SECONDS = int(os.getenv("DEBATE_SEMANTIC_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+# Nearest cached topics checked per lookup (skipping expired or other-namespace entries)
+SEARCH_NEIGHBOURS = 5
+
+def normalize_topic(topic):
+    """Topic text with case, punctuation and spacing ignored"""
+    return ' '.join(re.sub(r'[^\w]+', ' ', topic.lower()).split())
+
+class SemanticAnswerCache:
+    """
+    Answers keyed by topic embedding in a small FAISS inner-product index
+    Embeddings are L2-normalized, so inner product is cosine similarity.
+    namespace: entries only match lookups with the same namespace (e.g. a hash of the
+    system prompt, so answers written under old debater rules aren't reused)
+    """
+
+    def __init__(self, threshold=SEMANTIC_CACHE_THRESHOLD, maxsize=SEMANTIC_CACHE_MAX_ENTRIES,
+                 ttl=SEMANTIC_CACHE_TTL_SECONDS, clock=time.time):
+        self.threshold = threshold
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self._entries = []  # dicts: topic, key, namespace, answer, vector, created_at - index order
+        self._exact = {}  # (namespace, normalized topic) -> entry
+        self._index = None
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    @staticmethod
+    def _normalize(embedding):
+        vector = np.asarray(embedding, dtype='float32').reshape(-1)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _expired(self, entry):
+        return self.ttl is not None and entry["created_at"] + self.ttl < self.clock()
+
+    def _rebuild(self):
+        """Rebuild the index from the current entries (after eviction)"""
+        self._index = None
+        self._exact = {}
+        for entry in self._entries:
+            self._append(entry)
+
+    def _append(self, entry):
+        if self._index is None:
+            import faiss
+            self._index = faiss.IndexFlatIP(len(entry["vector"]))
+        self._index.add(entry["vector"].reshape(1, -1))
+        self._exact[(entry["namespace"], entry["key"])] = entry
+
+    def lookup_exact(self, topic, namespace=None):
+        """Cached answer for the same topic text, without needing an embedding"""
+        with self._lock:
+            entry = self._exact.get((namespace, normalize_topic(topic)))
+            if entry is None or self._expired(entry):
+                return None
+            self.hits += 1
+            return entry["answer"]
+
+    def lookup(self, topic, embedding, namespace=None):
+        """
+        Cached answer for the nearest cached topic within the threshold
+        Returns: (answer, cached_topic, similarity) or None
+        """
+        with self._lock:
+            entry = self._exact.get((namespace, normalize_topic(topic)))
+            if entry is not None and not self._expired(entry):
+                self.hits += 1
+                return entry["answer"], entry["topic"], 1.0
+
+            if self._index is not None and self._index.ntotal:
+                vector = self._normalize(embedding)
+                k = min(SEARCH_NEIGHBOURS, self._index.ntotal)
+                similarities, ids = self._index.search(vector.reshape(1, -1), k)
+                for similarity, idx in zip(similarities[0], ids[0]):
+                    if idx < 0 or similarity < self.threshold:
+                        break
+                    entry = self._entries[idx]
+                    if entry["namespace"] == namespace and not self._expired(entry):
+                        self.hits += 1
+                        return entry["answer"], entry["topic"], float(similarity)
+
+            self.misses += 1
+            return None
+
+    def add(self, topic, embedding, answer, namespace=None):
+        """Cache an answer, evicting expired and then the oldest entries when full"""
+        entry = {
+            "topic": topic,
+            "key": normalize_topic(topic),
+            "namespace": namespace,
+            "answer": answer,
+            "vector": self._normalize(embedding),
+            "created_at": self.clock()
+        }
+        with self._lock:
+            if len(self._entries) >= self.maxsize:
+                # FAISS flat indexes can't drop single vectors cheaply - rebuild without
+                # expired entries, or without the oldest quarter if nothing expired
+                kept = [e for e in self._entries if not self._expired(e)]
+                if len(kept) >= self.maxsize:
+                    kept = kept[len(kept) - (self.maxsize * 3) // 4:]
+                self._entries = kept
+                self._rebuild()
+            self._entries.append(entry)
+            self._append(entry)
+
+    def clear(self):
+        with self._lock:
+            self._entries = []
+            self._exact = {}
+            self._index = None
+            self.hits = self.misses = 0
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "threshold": self.threshold,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0
+        }
+
+# Shared cache for /debate openings - None unless enabled
+debate_answer_cache = SemanticAnswerCache() if SEMANTIC_CACHE_ENABLED else None
@@ -0,0 +1,433 @@
+#!/usr/bin/env python3
+"""
+Async access to the user_subscriptions table for the payment endpoints
+Queries go over a pooled async HTTP client straight to Supabase's PostgREST API, so a
+database round trip no longer blocks the event loop, with request timeouts and retries.
+Verified Stripe webhook events are recorded in the stripe_webhook_events table of the same
+database (supabase/stripe_webhook_events_table.sql) until they are applied.
+
+Backends (SUBSCRIPTION_STORE):
+- supabase (default): PostgREST at SUPABASE_URL with SUPABASE_SERVICE_KEY
+- sqlite: local file (SUBSCRIPTION_DB_PATH), for development and tests
+- memory: in-process rows, for tests
+"""
+
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from datetime import datetime, timezone
+
+logger = logging.getLogger(__name__)
+
+TABLE = "user_subscriptions"
+EVENTS_TABLE = "stripe_webhook_events"
+SUBSCRIPTION_STORE_TIMEOUT_SECONDS = float(os.getenv("SUBSCRIPTION_STORE_TIMEOUT_SECONDS", "5"))
+SUBSCRIPTION_STORE_RETRIES = int(os.getenv("SUBSCRIPTION_STORE_RETRIES", "2"))
+SUBSCRIPTION_STORE_MAX_CONNECTIONS = int(os.getenv("SUBSCRIPTION_STORE_MAX_CONNECTIONS", "20"))
+RETRY_BACKOFF_SECONDS = 0.2
+# Worth retrying - the request may succeed on another attempt
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+class SubscriptionStoreError(Exception):
+    """A query failed after its retries"""
+
+def utc_now():
+    return datetime.now(timezone.utc).isoformat()
+
+def webhook_event_row(event, status):
+    """Row of the stripe_webhook_events table for an event"""
+    now = utc_now()
+    return {"id": event["id"], "type": event["type"], "status": status, "attempts": 0, "last_error": None,
+            "payload": dict(event), "received_at": now, "updated_at": now}
+
+class SubscriptionStore(ABC):
+    """
+    Interface of the user_subscriptions data access layer
+    Rows are dicts with the table's columns (email, status, tier, stripe_customer_id,
+    stripe_subscription_id, expires_at, created_at, updated_at).
+    """
+
+    @abstractmethod
+    async def find_by_email(self, email):
+        """All rows for an email (there may be duplicates)"""
+
+    @abstractmethod
+    async def insert(self, row):
+        """Insert a row and return it as stored"""
+
+    @abstractmethod
+    async def upsert(self, row):
+        """Insert a row, merging into an existing one on the primary key (as supabase upsert)"""
+
+    @abstractmethod
+    async def update_by_subscription_id(self, subscription_id, values):
+        """Update the rows of a Stripe subscription and return them"""
+
+    @abstractmethod
+    async def record_webhook_event(self, event, status):
+        """
+        Record a webhook event (id, type, payload) with a status
+        Returns False, leaving the stored event as it is, if its ID was already recorded.
+        """
+
+    @abstractmethod
+    async def get_webhook_event(self, event_id):
+        """The recorded event with an ID, or None"""
+
+    @abstractmethod
+    async def update_webhook_event(self, event_id, values, status=None):
+        """Update a recorded event (only if it has `status`, when given) and return the updated rows"""
+
+    @abstractmethod
+    async def find_webhook_events(self, status):
+        """Recorded events with a status, oldest first"""
+
+    async def ping(self):
+        """Raise if the table can't be reached"""
+        await self.find_by_email("")
+
+    async def close(self):
+        pass
+
+class PostgRESTSubscriptionStore(SubscriptionStore):
+    """
+    Supabase's REST API over httpx.AsyncClient
+    Connections are pooled per event loop. Reads and updates are retried on timeouts,
+    connection errors and 429/5xx responses; inserts and upserts only when the connection
+    failed before the request was sent, so a retry can't write a row twice.
+    """
+
+    def __init__(self, url, key, timeout=SUBSCRIPTION_STORE_TIMEOUT_SECONDS, retries=SUBSCRIPTION_STORE_RETRIES,
+                 max_connections=SUBSCRIPTION_STORE_MAX_CONNECTIONS, transport=None):
+        self.base_url = f"{url.rstrip('/')}/rest/v1"
+        self.headers = {"apikey": key, "Authorization": f"Bearer {key}"}
+        self.timeout = timeout
+        self.retries = retries
+        self.max_connections = max_connections
+        self.transport = transport
+        self._client = None
+        self._loop = None
+
+    def _get_client(self):
+        import httpx
+        loop = asyncio.get_running_loop()
+        # A pooled connection belongs to the loop that opened it
+        if self._client is None or self._loop is not loop:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                headers=self.headers,
+                timeout=httpx.Timeout(self.timeout),
+                limits=httpx.Limits(max_connections=self.max_connections,
+                                    max_keepalive_connections=self.max_connections),
+                transport=self.transport
+            )
+            self._loop = loop
+        return self._client
+
+    async def _request(self, method, params=None, json_body=None, prefer=None, idempotent=True, table=TABLE):
+        import httpx
+        headers = {"Prefer": prefer} if prefer else None
+        for attempt in range(self.retries + 1):
+            retry = attempt < self.retries
+            try:
+                response = await self._get_client().request(method, f"/{table}", params=params,
+                                                            json=json_body, headers=headers)
+            except (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout) as e:
+                error = e
+            except httpx.TransportError as e:
+                error = e
+                retry = retry and idempotent
+            else:
+                if response.status_code < 400:
+                    return response.json() if response.content else []
+                error = SubscriptionStoreError(f"{method} {table} failed: {response.status_code} {response.text[:200]}")
+                retry = retry and response.status_code in RETRY_STATUS_CODES and idempotent
+            if not retry:
+                raise error if isinstance(error, SubscriptionStoreError) else SubscriptionStoreError(
+                    f"{method} {table} failed: {type(error).__name__}: {error}")
+            logger.warning(f"⚠️ {method} {table} attempt {attempt + 1} failed, retrying: {error}")
+            await asyncio.sleep(RETRY_BACKOFF_SECONDS * 2 ** attempt)
+
+    async def find_by_email(self, email):
+        return await self._request("GET", params={"select": "*", "email": f"eq.{email}"})
+
+    async def insert(self, row):
+        rows = await self._request("POST", json_body=row, prefer="return=representation", idempotent=False)
+        return rows[0] if rows else None
+
+    async def upsert(self, row):
+        rows = await self._request("POST", json_body=row, prefer="resolution=merge-duplicates,return=representation",
+                                   idempotent=False)
+        return rows[0] if rows else None
+
+    async def update_by_subscription_id(self, subscription_id, values):
+        return await self._request("PATCH", params={"stripe_subscription_id": f"eq.{subscription_id}"},
+                                   json_body=values, prefer="return=representation")
+
+    async def record_webhook_event(self, event, status):
+        # Duplicates are ignored rather than merged, so a retried insert is safe
+        rows = await self._request("POST", json_body=webhook_event_row(event, status), table=EVENTS_TABLE,
+                                   prefer="resolution=ignore-duplicates,return=representation")
+        return bool(rows)
+
+    async def get_webhook_event(self, event_id):
+        rows = await self._request("GET", params={"select": "*", "id": f"eq.{event_id}"}, table=EVENTS_TABLE)
+        return rows[0] if rows else None
+
+    async def update_webhook_event(self, event_id, values, status=None):
+        params = {"id": f"eq.{event_id}"}
+        if status is not None:
+            params["status"] = f"eq.{status}"
+        return await self._request("PATCH", params=params, json_body={**values, "updated_at": utc_now()},
+                                   prefer="return=representation", table=EVENTS_TABLE)
+
+    async def find_webhook_events(self, status):
+        return await self._request("GET", params={"select": "*", "status": f"eq.{status}", "order": "received_at.asc"},
+                                   table=EVENTS_TABLE)
+
+    async def ping(self):
+        await self._request("GET", params={"select": "email", "limit": "1"})
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+class MemorySubscriptionStore(SubscriptionStore):
+    """
+    Rows in a list, with the table's id and created_at defaults
+    latency: seconds each call waits, to stand in for a database round trip
+    """
+
+    def __init__(self, rows=None, latency=0.0):
+        self.rows = []
+        self.events = {}  # Webhook event rows by ID
+        self.latency = latency
+        self.calls = []
+        self._next_id = 1
+        for row in rows or []:
+            self._add(row)
+
+    def _add(self, row):
+        stored = {"id": self._next_id, "created_at": utc_now(), **row}
+        self._next_id = max(self._next_id, stored["id"]) + 1
+        self.rows.append(stored)
+        return dict(stored)
+
+    async def _call(self, name):
+        self.calls.append(name)
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+    async def find_by_email(self, email):
+        await self._call("find_by_email")
+        return [dict(row) for row in self.rows if row.get("email") == email]
+
+    async def insert(self, row):
+        await self._call("insert")
+        return self._add(row)
+
+    async def upsert(self, row):
+        await self._call("upsert")
+        for stored in self.rows:
+            if "id" in row and stored["id"] == row["id"]:
+                stored.update(row)
+                return dict(stored)
+        return self._add(row)
+
+    async def update_by_subscription_id(self, subscription_id, values):
+        await self._call("update_by_subscription_id")
+        updated = []
+        for row in self.rows:
+            if row.get("stripe_subscription_id") == subscription_id:
+                row.update(values)
+                updated.append(dict(row))
+        return updated
+
+    async def record_webhook_event(self, event, status):
+        await self._call("record_webhook_event")
+        if event["id"] in self.events:
+            return False
+        self.events[event["id"]] = webhook_event_row(event, status)
+        return True
+
+    async def get_webhook_event(self, event_id):
+        await self._call("get_webhook_event")
+        row = self.events.get(event_id)
+        return dict(row) if row is not None else None
+
+    async def update_webhook_event(self, event_id, values, status=None):
+        await self._call("update_webhook_event")
+        row = self.events.get(event_id)
+        if row is None or (status is not None and row["status"] != status):
+            return []
+        row.update(values, updated_at=utc_now())
+        return [dict(row)]
+
+    async def find_webhook_events(self, status):
+        await self._call("find_webhook_events")
+        rows = [dict(row) for row in self.events.values() if row["status"] == status]
+        return sorted(rows, key=lambda row: row["received_at"])
+
+class SQLiteSubscriptionStore(SubscriptionStore):
+    """SQLite file with the same semantics as the memory store; queries run in the default executor"""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {TABLE} ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, email TEXT, stripe_subscription_id TEXT, data TEXT NOT NULL)"
+            )
+            self._conn.execute(f"CREATE INDEX IF NOT EXISTS {TABLE}_email ON {TABLE} (email)")
+            self._conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {EVENTS_TABLE} ("
+                "id TEXT PRIMARY KEY, status TEXT NOT NULL, received_at TEXT NOT NULL, data TEXT NOT NULL)"
+            )
+
+    async def _run(self, function, *args):
+        return await asyncio.get_running_loop().run_in_executor(None, function, *args)
+
+    def _select(self, where, args):
+        rows = self._conn.execute(f"SELECT id, data FROM {TABLE} WHERE {where}", args).fetchall()
+        return [{"id": row_id, **json.loads(data)} for row_id, data in rows]
+
+    def _write(self, row_id, row):
+        data = {key: value for key, value in row.items() if key != "id"}
+        if row_id is None:
+            data.setdefault("created_at", utc_now())
+            cursor = self._conn.execute(
+                f"INSERT INTO {TABLE} (email, stripe_subscription_id, data) VALUES (?, ?, ?)",
+                (data.get("email"), data.get("stripe_subscription_id"), json.dumps(data))
+            )
+            row_id = cursor.lastrowid
+        else:
+            self._conn.execute(
+                f"UPDATE {TABLE} SET email = ?, stripe_subscription_id = ?, data = ? WHERE id = ?",
+                (data.get("email"), data.get("stripe_subscription_id"), json.dumps(data), row_id)
+            )
+        return {"id": row_id, **data}
+
+    def _find_by_email(self, email):
+        with self._lock:
+            return self._select("email = ?", (email,))
+
+    def _upsert(self, row, merge):
+        with self._lock, self._conn:
+            existing = self._select("id = ?", (row["id"],)) if merge and "id" in row else []
+            if existing:
+                return self._write(row["id"], {**existing[0], **row})
+            return self._write(None, row)
+
+    def _update_by_subscription_id(self, subscription_id, values):
+        with self._lock, self._conn:
+            rows = self._select("stripe_subscription_id = ?", (subscription_id,))
+            return [self._write(row["id"], {**row, **values}) for row in rows]
+
+    def _record_webhook_event(self, event, status):
+        row = webhook_event_row(event, status)
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                f"INSERT OR IGNORE INTO {EVENTS_TABLE} (id, status, received_at, data) VALUES (?, ?, ?, ?)",
+                (row["id"], status, row["received_at"], json.dumps(row))
+            )
+            return cursor.rowcount == 1
+
+    def _get_webhook_event(self, event_id):
+        with self._lock:
+            found = self._conn.execute(f"SELECT data FROM {EVENTS_TABLE} WHERE id = ?", (event_id,)).fetchone()
+        return json.loads(found[0]) if found is not None else None
+
+    def _update_webhook_event(self, event_id, values, status):
+        with self._lock, self._conn:
+            found = self._conn.execute(f"SELECT data FROM {EVENTS_TABLE} WHERE id = ?", (event_id,)).fetchone()
+            if found is None:
+                return []
+            row = json.loads(found[0])
+            if status is not None and row["status"] != status:
+                return []
+            row.update(values, updated_at=utc_now())
+            self._conn.execute(f"UPDATE {EVENTS_TABLE} SET status = ?, data = ? WHERE id = ?",
+                               (row["status"], json.dumps(row), event_id))
+            return [row]
+
+    def _find_webhook_events(self, status):
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT data FROM {EVENTS_TABLE} WHERE status = ? ORDER BY received_at", (status,)
+            ).fetchall()
+        return [json.loads(data) for (data,) in rows]
+
+    async def find_by_email(self, email):
+        return await self._run(self._find_by_email, email)
+
+    async def insert(self, row):
+        return await self._run(self._upsert, row, False)
+
+    async def upsert(self, row):
+        return await self._run(self._upsert, row, True)
+
+    async def update_by_subscription_id(self, subscription_id, values):
+        return await self._run(self._update_by_subscription_id, subscription_id, values)
+
+    async def record_webhook_event(self, event, status):
+        return await self._run(self._record_webhook_event, event, status)
+
+    async def get_webhook_event(self, event_id):
+        return await self._run(self._get_webhook_event, event_id)
+
+    async def update_webhook_event(self, event_id, values, status=None):
+        return await self._run(self._update_webhook_event, event_id, values, status)
+
+    async def find_webhook_events(self, status):
+        return await self._run(self._find_webhook_events, status)
+
+    async def close(self):
+        with self._lock:
+            self._conn.close()
+
+def create_subscription_store():
+    """Store configured by SUBSCRIPTION_STORE, or None when Supabase has no service key"""
+    backend = os.getenv("SUBSCRIPTION_STORE", "supabase").lower()
+    if backend == "sqlite":
+        path = os.getenv("SUBSCRIPTION_DB_PATH", "subscriptions.db")
+        logger.info(f"✅ Using SQLite subscription store at {path}")
+        return SQLiteSubscriptionStore(path)
+    if backend == "memory":
+        logger.info("✅ Using in-memory subscription store")
+        return MemorySubscriptionStore()
+
+    url = os.getenv('SUPABASE_URL', 'https://fsubmqjevlfpcirgsbhi.supabase.co')
+    key = os.getenv('SUPABASE_SERVICE_KEY', '')  # Need service key for server-side ops
+    if not key.strip():
+        logger.warning("⚠️ SUPABASE_SERVICE_KEY not provided - database operations will fail")
+        return None
+    logger.info(f"✅ Using Supabase subscription store at {url}")
+    return PostgRESTSubscriptionStore(url, key)
+
+_store = None
+_store_initialized = False
+_store_lock = threading.Lock()
+
+def get_subscription_store():
+    """The configured store, created on first use (None if the database isn't configured)"""
+    global _store, _store_initialized
+    if not _store_initialized:
+        with _store_lock:
+            if not _store_initialized:
+                _store = create_subscription_store()
+                _store_initialized = True
+    return _store
+
+def set_subscription_store(store):
+    """Replace the store (tests, or wiring a custom backend)"""
+    global _store, _store_initialized
+    _store = store
+    _store_initialized = True
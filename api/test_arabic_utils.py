@@ -7,7 +7,10 @@ from arabic_utils import (
     is_arabic_text,
     enhance_arabic_search_query,
     get_phonetic_variations,
-    fuzzy_arabic_match
+    fuzzy_arabic_match,
+    compile_transliteration_map,
+    PatternAutomaton,
+    TRANSLITERATION_MAP
 )
 
 def test_arabic_utils():
@@ -59,5 +62,43 @@ def test_arabic_utils():
         match = fuzzy_arabic_match(text1, text2)
         print(f"   '{text1}' matches '{text2}': {match}")
 
+def test_compiled_query_engine():
+    """Compiled lookups give the same answers as the plain substring checks"""
+    # Normalization folds letters and strips diacritics
+    assert normalize_arabic_text("قُلْ هُوَ اللَّهُ أَحَدٌ") == "قل هو الله احد"
+    assert normalize_arabic_text("  ٱلرَّحِيمِ   ٱلرَّحْمَٰنِ ") == "الرحىم الرحمن"
+    
+    # Longest transliteration wins, so 'allahu' is not left half-replaced
+    assert transliterate_to_arabic("allahu akbar") == "الله akbar"
+    assert transliterate_to_arabic("inshallah tomorrow") == "إن شاء الله tomorrow"
+    assert transliterate_to_arabic("  Kul Hu  ") == "قل هو"
+    
+    # Variations include every overlapping key, in map order
+    variations = get_phonetic_variations("qul huwallahu ahad")
+    assert variations[0] == "qul huwallahu ahad"
+    for key in ["allah", "allahu", "qul huwallahu ahad"]:
+        assert key in variations
+    assert variations.index("allah") < variations.index("allahu")
+    
+    # Arabic input finds its transliteration through the same automaton
+    assert "kulhu" in get_phonetic_variations("قل هو")
+    
+    # The automaton reports overlapping and nested patterns
+    automaton = PatternAutomaton(["he", "she", "his", "hers"])
+    assert automaton.find_all("ushers") == {"she", "he", "hers"}
+    
+    # Changes to the map take effect once it is recompiled
+    TRANSLITERATION_MAP["salam"] = ["سلام"]
+    try:
+        compile_transliteration_map()
+        assert transliterate_to_arabic("salam") == "سلام"
+        assert enhance_arabic_search_query("salam alaykum") == "سلام alaykum"
+    finally:
+        del TRANSLITERATION_MAP["salam"]
+        compile_transliteration_map()
+    assert transliterate_to_arabic("salam") == "salam"
+    print("✅ Compiled query engine matches expected results")
+
 if __name__ == "__main__":
-    test_arabic_utils()
\ No newline at end of file
+    test_arabic_utils()
+    test_compiled_query_engine()
\ No newline at end of file
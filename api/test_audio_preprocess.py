@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""Test voice query preprocessing before transcription"""
+
+import io
+
+import numpy as np
+from scipy.io import wavfile
+
+import audio_preprocess
+from audio_preprocess import TARGET_SAMPLE_RATE, preprocess_audio, speech_bounds
+from transcription import prepare_upload
+
+
+def wav_bytes(samples, rate):
+    buffer = io.BytesIO()
+    wavfile.write(buffer, rate, (np.clip(samples, -1, 1) * 32767).astype(np.int16))
+    return buffer.getvalue()
+
+
+class without_ffmpeg:
+    """Decode and encode as on a host without ffmpeg (WAV in, WAV out)"""
+
+    def __enter__(self):
+        self.original = audio_preprocess.ffmpeg_available
+        audio_preprocess.ffmpeg_available = lambda: False
+
+    def __exit__(self, *exc_info):
+        audio_preprocess.ffmpeg_available = self.original
+
+
+def padded_tone(rate, lead, tone, trail, channels=1, amplitude=0.3):
+    t = np.arange(int(rate * tone)) / rate
+    signal = np.concatenate([np.zeros(int(rate * lead)), amplitude * np.sin(2 * np.pi * 220 * t), np.zeros(int(rate * trail))])
+    signal = signal + np.random.default_rng(0).normal(0, 0.0005, len(signal))
+    return np.repeat(signal[:, np.newaxis], channels, axis=1) if channels > 1 else signal
+
+
+def test_speech_bounds_keep_padding():
+    rate = TARGET_SAMPLE_RATE
+    start, end = speech_bounds(padded_tone(rate, 2.0, 1.0, 3.0), rate, padding_ms=250)
+    assert abs(start / rate - 1.75) < 0.05
+    assert abs(end / rate - 3.25) < 0.05
+    # Silence alone has no speech
+    assert speech_bounds(np.zeros(rate), rate) is None
+
+
+def test_wav_is_downmixed_resampled_and_trimmed():
+    data = wav_bytes(padded_tone(48000, 2.0, 1.5, 3.0, channels=2), 48000)
+    with without_ffmpeg():
+        processed = preprocess_audio(data, "query.wav", "audio/wav")
+
+    assert processed.filename == "query.wav" and processed.content_type == "audio/wav"
+    assert abs(processed.original_seconds - 6.5) < 0.01
+    assert 1.5 <= processed.seconds < 2.2
+    assert len(processed.data) < len(data) / 5
+
+    rate, samples = wavfile.read(io.BytesIO(processed.data))
+    assert rate == TARGET_SAMPLE_RATE and samples.ndim == 1 and samples.dtype == np.int16
+
+
+def test_quiet_recording_is_normalized():
+    data = wav_bytes(padded_tone(16000, 0.5, 1.0, 0.5, amplitude=0.05), 16000)
+    with without_ffmpeg():
+        processed = preprocess_audio(data, "quiet.wav", "audio/wav")
+    _, samples = wavfile.read(io.BytesIO(processed.data))
+    assert np.abs(samples).max() > 0.8 * 32767
+
+
+def test_undecodable_uploads_fall_back():
+    # Not actually WAV
+    assert preprocess_audio(b"RIFF garbage", "query.wav", "audio/wav") is None
+
+    with without_ffmpeg():
+        upload = io.BytesIO(b"\x1aE\xdf\xa3" + b"\x00" * 100)
+        file, filename, content_type = prepare_upload(upload, "blob.webm", "audio/webm", preprocess=True)
+        assert file is upload and filename == "blob.webm" and content_type == "audio/webm"
+        # Left unread
+        assert upload.tell() == 0
+
+
+def test_prepare_upload_sends_processed_wav():
+    data = wav_bytes(padded_tone(44100, 3.0, 1.0, 3.0), 44100)
+    with without_ffmpeg():
+        file, filename, content_type = prepare_upload(io.BytesIO(data), "recording.wav", "audio/wav", preprocess=True)
+    processed = file.read()
+    assert filename == "recording.wav" and content_type == "audio/wav"
+    assert len(processed) < len(data) / 5
+
+    # Disabled
+    upload = io.BytesIO(data)
+    assert prepare_upload(upload, "recording.wav", "audio/wav", preprocess=False)[0] is upload
+
+
+def test_smaller_original_is_sent():
+    """An 8kHz 8-bit recording with no silence is smaller than its 16kHz 16-bit re-encoding"""
+    tone = padded_tone(8000, 0.0, 2.0, 0.0)
+    buffer = io.BytesIO()
+    wavfile.write(buffer, 8000, (np.clip(tone, -1, 1) * 127 + 128).astype(np.uint8))
+    data = buffer.getvalue()
+    with without_ffmpeg():
+        assert preprocess_audio(data, "phone.wav", "audio/wav") is None
+        upload = io.BytesIO(data)
+        file, filename, content_type = prepare_upload(upload, "phone.wav", "audio/wav", preprocess=True)
+    assert file is upload and filename == "phone.wav" and upload.tell() == 0
+
+
+def test_compressed_output_with_ffmpeg():
+    if not audio_preprocess.ffmpeg_available():
+        print("ffmpeg not installed - skipping the Opus encoding test")
+        return
+    data = wav_bytes(padded_tone(48000, 1.0, 3.0, 1.0), 48000)
+    processed = preprocess_audio(data, "query.wav", "audio/wav")
+    assert processed.filename == "query.ogg" and processed.content_type == "audio/ogg"
+    # Far below the 32KB/s of 16kHz WAV
+    assert len(processed.data) < processed.seconds * 8000
+    samples, rate = audio_preprocess.decode_ffmpeg(processed.data)
+    assert rate == TARGET_SAMPLE_RATE and abs(len(samples) / rate - processed.seconds) < 0.1
+
+
+if __name__ == "__main__":
+    test_speech_bounds_keep_padding()
+    test_wav_is_downmixed_resampled_and_trimmed()
+    test_quiet_recording_is_normalized()
+    test_undecodable_uploads_fall_back()
+    test_prepare_upload_sends_processed_wav()
+    test_smaller_original_is_sent()
+    test_compressed_output_with_ffmpeg()
+    print("\n✅ All audio preprocessing tests passed")
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""Test verse citation parsing, validation and resolution"""
+
+import time
+
+from citation_resolver import (
+    extract_verse_references,
+    load_chapter_verse_counts,
+    parse_verse_ranges,
+    resolve_citations,
+    MAX_RANGE_VERSES
+)
+
+
+VERSES = [
+    {"sura_verse": "1:1", "english": "In the name of GOD, Most Gracious, Most Merciful.", "arabic": "بسم الله الرحمن الرحيم"},
+    {"sura_verse": "2:255", "english": "GOD: there is no other god besides Him, the Living, the Eternal.", "arabic": "الله لا اله الا هو الحي القيوم"},
+    {"sura_verse": "74:30", "english": "Over it is nineteen.", "arabic": "عليها تسعه عشر"},
+]
+
+
+def test_verse_counts_loaded():
+    counts = load_chapter_verse_counts()
+    assert counts is not None and len(counts) == 114
+    assert counts[1] == 7 and counts[9] == 127
+
+
+def test_invalid_references_dropped():
+    """Chapters past 114 and verses past the end of a chapter are not citations"""
+    refs = extract_verse_references("See 1:8, 115:1, 0:3, 1:0, 112:1 and the time 10:30.")
+    assert refs == ["112:1", "10:30"]
+
+
+def test_ranges_capped_and_merged():
+    # "2:1-286" expands to MAX_RANGE_VERSES references, not 286
+    refs = extract_verse_references("Read 2:1-286.")
+    assert len(refs) == MAX_RANGE_VERSES and refs[0] == "2:1"
+
+    # Ranges are clipped to the chapter, and overlapping ranges and repeats are merged
+    assert parse_verse_ranges("1:1-3, 1:2-5, 1:4, 1:6-99") == [(1, 1, 7)]
+    assert extract_verse_references("74:30, 1:1, 74:30-31") == ["74:30", "74:31", "1:1"]
+
+
+def test_worst_case_is_bounded():
+    """A response full of ranges stays cheap to post-process"""
+    text = " ".join(f"{chapter}:1-300" for chapter in range(1, 115)) * 20
+    started = time.perf_counter()
+    refs = extract_verse_references(text)
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    assert len(refs) <= 50
+    assert elapsed_ms < 200, elapsed_ms
+    print(f"✅ {len(text)} characters of ranges resolved to {len(refs)} references in {elapsed_ms:.1f}ms")
+
+
+def test_resolve_citations():
+    citations, refs = resolve_citations("As 2:255 and 74:30 say (see also 3:1)", VERSES, limit=5)
+    assert refs == ["2:255", "74:30", "3:1"]
+    # 3:1 is valid but not in this verses data
+    assert [c["reference"] for c in citations] == ["2:255", "74:30"]
+    assert citations[0]["arabic"] == VERSES[1]["arabic"]
+
+    citations, _ = resolve_citations("1:1 2:255 74:30", VERSES, limit=2)
+    assert len(citations) == 2
+    assert resolve_citations("2:255", None) == ([], ["2:255"])
+
+
+if __name__ == "__main__":
+    test_verse_counts_loaded()
+    test_invalid_references_dropped()
+    test_ranges_capped_and_merged()
+    test_worst_case_is_bounded()
+    test_resolve_citations()
+    print("\n✅ All citation resolver tests passed")
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""Test token-budgeted conversation context for the debate endpoints"""
+
+from conversation_context import (
+    ConversationContextBuilder,
+    count_message_tokens,
+    summarize_turns,
+    SUMMARY_HEADER
+)
+
+
+def make_history(turns, words_per_turn=60):
+    """Alternating user/assistant turns with distinct content"""
+    history = []
+    for i in range(turns):
+        role = "user" if i % 2 == 0 else "assistant"
+        text = " ".join(f"turn{i}word{w}" for w in range(words_per_turn))
+        history.append({"role": role, "content": f"<strong>Turn {i}</strong><br>{text}"})
+    return history
+
+
+def test_short_history_unchanged():
+    """History within budget is sent verbatim, as before"""
+    builder = ConversationContextBuilder(history_budget=2000, summary_budget=300)
+    history = make_history(4, words_per_turn=10)
+
+    messages = builder.build("SYSTEM", history, "Next question")
+    assert messages == [{"role": "system", "content": "SYSTEM"}] + history + [{"role": "user", "content": "Next question"}]
+
+    # No current message (e.g. /debate without message or topic)
+    assert builder.build("SYSTEM", [], None) == [{"role": "system", "content": "SYSTEM"}]
+
+
+def test_long_history_stays_within_budget():
+    """Older turns collapse into a summary and prompt size stops growing"""
+    builder = ConversationContextBuilder(history_budget=600, summary_budget=200)
+
+    sizes = []
+    for turns in [10, 30, 50]:
+        history = make_history(turns)
+        messages = builder.build("SYSTEM", history, "Next question")
+        history_messages = messages[1:-1]
+        sizes.append(count_message_tokens(history_messages))
+
+        assert messages[1]["role"] == "system" and messages[1]["content"].startswith(SUMMARY_HEADER)
+        # The debate's opening turn is always in the summary
+        assert "Turn 0" in messages[1]["content"]
+        # The latest turn is kept verbatim
+        assert messages[-2] == history[-1]
+        assert sizes[-1] <= 600, sizes
+
+    # Bounded instead of linear in the number of turns
+    assert sizes[2] <= sizes[1] + 50, sizes
+    print(f"✅ History tokens at 10/30/50 turns: {sizes}")
+
+
+def test_summary_reuses_cached_prefix():
+    """Each request only summarizes the turns that left the window since the last one"""
+    summarized_counts = []
+
+    def counting_summarizer(previous, turns, max_tokens):
+        summarized_counts.append(len(turns))
+        return summarize_turns(previous, turns, max_tokens)
+
+    builder = ConversationContextBuilder(history_budget=600, summary_budget=200, summarizer=counting_summarizer)
+    history = make_history(40)
+
+    for turns in range(20, 41, 2):
+        builder.build("SYSTEM", history[:turns], "Next")
+
+    # The first build summarizes the initial prefix, later ones only a couple of new turns
+    assert summarized_counts[0] > 2
+    assert all(count <= 2 for count in summarized_counts[1:]), summarized_counts
+
+    # Same history again: served from cache
+    before = len(summarized_counts)
+    builder.build("SYSTEM", history, "Next")
+    assert len(summarized_counts) == before
+
+
+def test_summary_strips_html_and_bounds_size():
+    turns = make_history(30)
+    summary = summarize_turns("", turns, max_tokens=400)
+    assert "<strong>" not in summary
+    assert summary.splitlines()[0] == SUMMARY_HEADER
+    assert "Turn 0" in summary.splitlines()[1]
+    assert "Turn 29" in summary.splitlines()[-1]
+    assert len(summary.splitlines()) < 32
+
+
+if __name__ == "__main__":
+    test_short_history_unchanged()
+    test_long_history_stays_within_budget()
+    test_summary_reuses_cached_prefix()
+    test_summary_strips_html_and_bounds_size()
+    print("\n✅ All conversation context tests passed")
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""Test server-side conversation storage for the debate endpoints"""
+
+import os
+import tempfile
+from types import SimpleNamespace
+
+from fastapi.testclient import TestClient
+
+import conversation_store
+import vector_search_api
+from conversation_store import (
+    MemoryConversationStore,
+    SQLiteConversationStore,
+    RedisConversationStore,
+    new_record,
+    record_turn,
+    resolve_conversation,
+    set_conversation_store
+)
+
+
+class FakeRedis:
+    """The subset of redis-py used by the store, with expiry on a fake clock"""
+
+    def __init__(self):
+        self.now = 0.0
+        self.values = {}
+
+    def get(self, name):
+        value, expires_at = self.values.get(name, (None, None))
+        if expires_at is not None and expires_at <= self.now:
+            del self.values[name]
+            return None
+        return value
+
+    def set(self, name, value, ex=None):
+        self.values[name] = (value.encode("utf-8"), self.now + ex if ex else None)
+
+    def delete(self, name):
+        self.values.pop(name, None)
+
+
+def check_round_trip(store):
+    """Save, load, update and delete a conversation"""
+    record = new_record([{"role": "user", "content": "Is Salat in the Quran?"}])
+    record["data"]["summary"] = "Summary of earlier turns"
+    store.save("abc", record)
+
+    loaded = store.get("abc")
+    assert loaded == record
+    # Changing the loaded copy doesn't change the stored record
+    loaded["history"].append({"role": "assistant", "content": "Yes [2:43]"})
+    assert len(store.get("abc")["history"]) == 1
+
+    store.save("abc", loaded)
+    assert len(store.get("abc")["history"]) == 2
+
+    store.delete("abc")
+    assert store.get("abc") is None
+    assert store.get("missing") is None
+
+
+def test_memory_store():
+    store = MemoryConversationStore(maxsize=2, ttl=60)
+    check_round_trip(store)
+
+    # Least recently used conversation is evicted
+    for conversation_id in ["a", "b", "c"]:
+        store.save(conversation_id, new_record())
+    assert store.get("a") is None and store.get("c") is not None
+
+
+def test_sqlite_store():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "conversations.db")
+        store = SQLiteConversationStore(path, ttl=60)
+        check_round_trip(store)
+
+        # Another connection to the same file (another worker) sees saved conversations
+        store.save("shared", new_record([{"role": "user", "content": "سلام"}]))
+        assert SQLiteConversationStore(path, ttl=60).get("shared")["history"][0]["content"] == "سلام"
+
+        # Expired conversations are not returned
+        expired = SQLiteConversationStore(path, ttl=0)
+        assert expired.get("shared") is None
+
+
+def test_redis_store():
+    redis = FakeRedis()
+    store = RedisConversationStore(redis, ttl=60)
+    check_round_trip(store)
+
+    store.save("x", new_record())
+    assert "debate:conversation:x" in redis.values
+    redis.now += 61
+    assert store.get("x") is None
+
+
+def test_resolve_and_record_turn():
+    set_conversation_store(MemoryConversationStore())
+    try:
+        client_history = [{"role": "user", "content": "Hello"}, {"role": "assistant", "content": "Peace"}]
+
+        # New conversation seeded with client history
+        conversation_id, record = resolve_conversation(None, client_history)
+        assert conversation_id and record["history"] == client_history
+        record_turn(conversation_id, record, "What is Salat?", "The Contact Prayer [2:43]")
+
+        # Stored history wins over whatever the client sends
+        same_id, stored = resolve_conversation(conversation_id, [])
+        assert same_id == conversation_id
+        assert [m["content"] for m in stored["history"]] == ["Hello", "Peace", "What is Salat?", "The Contact Prayer [2:43]"]
+
+        # Unknown IDs (e.g. expired) start over with the client history, under a new ID
+        new_id, record = resolve_conversation("expired", client_history)
+        assert record["history"] == client_history
+        assert new_id not in ("expired", conversation_id)
+    finally:
+        set_conversation_store(None)
+
+
+def test_history_is_trimmed():
+    set_conversation_store(MemoryConversationStore())
+    original_max = conversation_store.CONVERSATION_MAX_MESSAGES
+    conversation_store.CONVERSATION_MAX_MESSAGES = 4
+    try:
+        conversation_id, record = resolve_conversation(None)
+        for i in range(5):
+            record_turn(conversation_id, record, f"question {i}", f"answer {i}")
+        _, stored = resolve_conversation(conversation_id)
+        assert [m["content"] for m in stored["history"]] == ["question 3", "answer 3", "question 4", "answer 4"]
+    finally:
+        conversation_store.CONVERSATION_MAX_MESSAGES = original_max
+        set_conversation_store(None)
+
+
+def test_debate_sends_only_new_message():
+    """Follow-up requests send conversationId and the new message - the server supplies the history"""
+    prompts = []
+
+    def create(messages, **kwargs):
+        prompts.append(messages)
+        reply = f"Answer {len(prompts)} [2:43]"
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=reply))])
+
+    set_conversation_store(MemoryConversationStore())
+    original_client = vector_search_api.client
+    vector_search_api.client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+    try:
+        client = TestClient(vector_search_api.app)
+        first = client.post("/debate", json={"topic": "Salat", "isNewTopic": True}).json()
+        conversation_id = first["conversationId"]
+        assert conversation_id
+
+        second = client.post("/debate", json={"message": "How many times a day?", "conversationId": conversation_id}).json()
+        assert second["conversationId"] == conversation_id
+
+        history = [(m["role"], m["content"]) for m in prompts[1][1:]]
+        assert history == [
+            ("user", "Let's debate about: Salat"),
+            ("assistant", "Answer 1 [2:43]"),
+            ("user", "How many times a day?"),
+        ]
+    finally:
+        vector_search_api.client = original_client
+        set_conversation_store(None)
+
+
+if __name__ == "__main__":
+    test_memory_store()
+    test_sqlite_store()
+    test_redis_store()
+    test_resolve_and_record_turn()
+    test_history_is_trimmed()
+    test_debate_sends_only_new_message()
+    print("\n✅ All conversation store tests passed")
@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+"""Test DebateContextManager lookups against a small synthetic corpus"""
+
+import json
+import os
+import tempfile
+import threading
+from types import SimpleNamespace
+
+import numpy as np
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+import debater_rules
+from enhanced_debate_endpoint import DebateContextManager, create_enhanced_debate_endpoint
+from verse_index import RootIndex
+
+
+VERSES = [
+    {"sura_verse": "1:1", "english": "In the name of GOD, Most Gracious, Most Merciful.", "arabic": "بسم الله الرحمن الرحيم",
+     "roots": "س م و, ا ل ه, ر ح م, ر ح م", "meanings": "name, god, gracious, merciful"},
+    {"sura_verse": "1:5", "english": "You alone we worship. You alone we ask for help.", "arabic": "اياك نعبد واياك نستعين",
+     "roots": "-, ع ب د, -, ع و ن", "meanings": "-, worship, -, help"},
+    {"sura_verse": "2:43", "english": "You shall observe the Contact Prayers (Salat) and give the obligatory charity (Zakat).", "arabic": "واقيموا الصلاه",
+     "roots": "ق و م, ص ل و", "meanings": "observe, contact prayer"},
+    {"sura_verse": "3:81", "english": "GOD took a covenant from the prophets: a messenger will come to you.", "arabic": "واذ اخذ الله ميثاق النبيين",
+     "roots": "ا خ ذ, ا ل ه, و ث ق, ن ب ا", "meanings": "took, god, covenant, prophets"},
+    {"sura_verse": "74:30", "english": "Over it is nineteen.", "arabic": "عليها تسعه عشر",
+     "roots": "-, ت س ع, ع ش ر", "meanings": "-, nine, ten"},
+]
+
+
+def linear_topic_search(verses, topics, limit):
+    """The original full-scan behaviour, for comparison"""
+    found = []
+    for verse in verses:
+        english = verse["english"].lower()
+        for topic in topics:
+            keywords = DebateContextManager.TOPIC_KEYWORDS.get(topic)
+            if keywords and any(k in english for k in keywords) and verse["sura_verse"] not in found:
+                found.append(verse["sura_verse"])
+    return found[:limit]
+
+
+def test_verse_lookup():
+    """Verse references resolve through the shared index"""
+    manager = DebateContextManager({}, VERSES, None)
+
+    info = manager.get_verse_info("2:43")
+    assert info.sura_verse == "2:43"
+    assert info.english.startswith("You shall observe")
+    assert manager.get_verse_info("9:999") is None
+
+    assert DebateContextManager({}, None, None).get_verse_info("1:1") is None
+
+
+def test_topic_search_matches_scan():
+    """Posting-list topic search returns the same verses, in the same order, as a full scan"""
+    manager = DebateContextManager({}, VERSES, None)
+
+    for topics in [["god"], ["prayer", "charity"], ["messenger", "miracle"], ["god", "prayer", "messenger"]]:
+        for limit in [1, 2, 5]:
+            expected = linear_topic_search(VERSES, topics, limit)
+            actual = [v.sura_verse for v in manager.search_verses_by_topic(topics, limit=limit)]
+            assert actual == expected, (topics, limit, actual, expected)
+
+    # No duplicates when a verse matches several topics
+    results = [v.sura_verse for v in manager.search_verses_by_topic(["prayer", "charity", "god"], limit=5)]
+    assert len(results) == len(set(results))
+
+    # Already referenced verses are skipped, and nothing is returned without room for it
+    assert "2:43" not in [v.sura_verse for v in manager.search_verses_by_topic(["prayer"], exclude={"2:43"})]
+    assert manager.search_verses_by_topic(["god"], limit=0) == []
+    assert manager.search_verses_by_topic(["unknown"]) == []
+    print(f"✅ Topic postings: {manager.topic_postings}")
+
+
+def test_root_analysis():
+    """Roots resolve by Latin key or Arabic letters with their verses, frequency and meanings"""
+    manager = DebateContextManager({}, VERSES, None)
+
+    roots = {info.root: info for info in manager.analyze_roots("", ["RHM", "ALH", "XYZ"])}
+    assert set(roots) == {"RHM", "ALH"}
+    assert roots["RHM"].verses == ["1:1"]
+    assert roots["RHM"].frequency == 1
+    assert roots["RHM"].meaning == "gracious; merciful"
+    assert roots["ALH"].verses == ["1:1", "3:81"]
+    assert roots["ALH"].meaning == "god"
+
+    index = RootIndex(VERSES)
+    assert index.lookup("ع ب د")["verses"] == ["1:5"]
+    assert index.lookup("عبد")["meanings"] == ["worship"]
+    print(f"✅ Root analysis: {[(r.root, r.verses, r.meaning) for r in roots.values()]}")
+
+
+def test_root_tokens_match_exactly():
+    """A root never matches inside a longer root string"""
+    index = RootIndex([
+        {"sura_verse": "1:1", "roots": "SLMN, KTB", "meanings": "peace, book"},
+        {"sura_verse": "1:2", "roots": "SLM", "meanings": "submission"},
+    ])
+    assert index.lookup("SLM")["verses"] == ["1:2"]
+    assert index.lookup("SLM")["meanings"] == ["submission"]
+    assert index.lookup("LMN") is None
+
+
+def test_ambiguous_latin_roots_are_not_merged():
+    """A Latin key shared by distinct Arabic roots resolves to neither"""
+    index = RootIndex([
+        {"sura_verse": "1:2", "roots": "ح م د", "meanings": "praise"},
+        {"sura_verse": "22:5", "roots": "ه م د", "meanings": "lifeless"},
+        {"sura_verse": "96:1", "roots": "ق ر ا", "meanings": "read"},
+        {"sura_verse": "101:1", "roots": "ق ر ع", "meanings": "shocker"},
+        {"sura_verse": "1:1", "roots": "ر ح م", "meanings": "merciful"},
+    ])
+    assert index.lookup("HMD") is None
+    assert index.lookup("QRA") is None
+    # Arabic letters are exact
+    assert index.lookup("حمد")["meanings"] == ["praise"]
+    assert index.lookup("ه م د")["verses"] == ["22:5"]
+    # Unambiguous keys still resolve
+    assert index.lookup("RHM")["verses"] == ["1:1"]
+
+
+class FakeOpenAI:
+    """Embeddings and chat completions that record when they run"""
+
+    def __init__(self, embedding_started):
+        self.embedding_started = embedding_started
+        self.messages = None
+        self.embeddings = SimpleNamespace(create=self._embed)
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._complete))
+
+    def _embed(self, input, model):
+        self.embedding_started.set()
+        return SimpleNamespace(data=[SimpleNamespace(embedding=[0.0] * 8)])
+
+    def _complete(self, messages, **kwargs):
+        self.messages = messages
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content="See [1:5] and [2:43]."))])
+
+
+def test_enhanced_debate_gathers_context_concurrently():
+    """Local lookups run while the embedding call is in flight, then the completion runs"""
+    embedding_started = threading.Event()
+    overlapped = []
+    fake_client = FakeOpenAI(embedding_started)
+
+    original_gather = DebateContextManager.gather_local_context
+
+    def slow_gather(self, *args, **kwargs):
+        # Only returns promptly if the embedding call started in parallel
+        overlapped.append(embedding_started.wait(timeout=2))
+        return original_gather(self, *args, **kwargs)
+
+    with tempfile.TemporaryDirectory() as rules_dir:
+        rules_path = os.path.join(rules_dir, "rules.json")
+        with open(rules_path, "w", encoding="utf-8") as f:
+            json.dump({"rules": [{"id": 3, "content": "Quote verses by number."}]}, f)
+
+        original_rules_path = debater_rules.RULES_PATH
+        DebateContextManager.gather_local_context = slow_gather
+        debater_rules.RULES_PATH = rules_path
+        try:
+            app = FastAPI()
+            create_enhanced_debate_endpoint(app, {}, VERSES, fake_client)
+            response = TestClient(app).post("/debate/enhanced", json={
+                "message": "What does 1:5 say about worship and prayer? Explain RHM.",
+                "conversationHistory": []
+            })
+        finally:
+            DebateContextManager.gather_local_context = original_gather
+            debater_rules.RULES_PATH = original_rules_path
+
+    assert response.status_code == 200, response.text
+    assert overlapped == [True]
+
+    data = response.json()
+    assert [v["sura_verse"] for v in data["relatedVerses"]] == ["1:5", "2:43"]
+    assert [r["root"] for r in data["rootAnalysis"]] == ["RHM"]
+    assert sorted(c["reference"] for c in data["citations"]) == ["1:5", "2:43"]
+    assert "Quote verses by number." in fake_client.messages[0]["content"]
+
+
+class CountingOpenAI:
+    """Counts embedding calls; replies with a fixed completion"""
+
+    def __init__(self):
+        self.embedding_calls = 0
+        self.embeddings = SimpleNamespace(create=self._embed)
+        self.chat = SimpleNamespace(completions=SimpleNamespace(
+            create=lambda **kwargs: SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content="See [3:81]."))])
+        ))
+
+    def _embed(self, input, model):
+        self.embedding_calls += 1
+        return SimpleNamespace(data=[SimpleNamespace(embedding=[0.0] * 8)])
+
+
+def test_retrieval_bundle_is_cached():
+    """Repeated contexts reuse related verses and search results without another embedding call"""
+    index = SimpleNamespace(search=lambda vectors, k: (np.zeros((1, k)), np.zeros((1, k), dtype=int)))
+    collections = {"QuranTalkArticles": {
+        "index": index,
+        "metadata": [{"title": "The Messenger of the Covenant", "content": "Quran 3:81", "url": "https://example.org/a"}],
+        "size": 1
+    }}
+    fake_client = CountingOpenAI()
+    app = FastAPI()
+    create_enhanced_debate_endpoint(app, collections, VERSES, fake_client)
+    client = TestClient(app)
+
+    first = client.post("/debate/enhanced", json={"message": "Who is the messenger of the covenant?"}).json()
+    # Case, punctuation and spacing don't matter
+    second = client.post("/debate/enhanced", json={"message": "who is the  Messenger of the Covenant"}).json()
+    assert fake_client.embedding_calls == 1
+    assert first["searchResults"] == second["searchResults"] and first["searchResults"]
+    assert first["relatedVerses"] == second["relatedVerses"]
+
+    # Contexts whose extracted inputs differ are never served each other's bundle
+    manager = DebateContextManager(collections, VERSES, fake_client)
+    def key(text):
+        return manager.retrieval_key(text, manager.extract_verse_references(text),
+                                     manager.extract_key_topics(text), manager.extract_arabic_terms(text))
+    assert key("Explain 2:255-260") != key("Explain 2:255 260")
+    assert key("What does ZKR mean?") != key("What does zkr mean?")
+    assert key("Who is the messenger?") == key("who is the  Messenger")
+
+    # A new collection snapshot is retrieved again
+    collections["QuranTalkArticles"]["size"] = 2
+    client.post("/debate/enhanced", json={"message": "Who is the messenger of the covenant?"})
+    assert fake_client.embedding_calls == 2
+
+
+if __name__ == "__main__":
+    test_verse_lookup()
+    test_topic_search_matches_scan()
+    test_root_analysis()
+    test_root_tokens_match_exactly()
+    test_ambiguous_latin_roots_are_not_merged()
+    test_enhanced_debate_gathers_context_concurrently()
+    test_retrieval_bundle_is_cached()
+    print("\n✅ All debate context tests passed")
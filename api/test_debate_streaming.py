@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""Test server-sent event streaming for /debate and /debate/enhanced"""
+
+import json
+from types import SimpleNamespace
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+import vector_search_api
+from enhanced_debate_endpoint import create_enhanced_debate_endpoint
+
+
+VERSES = [
+    {"sura_verse": "1:5", "english": "You alone we worship. You alone we ask for help.", "arabic": "اياك نعبد واياك نستعين",
+     "roots": "-, ع ب د, -, ع و ن", "meanings": "-, worship, -, help"},
+    {"sura_verse": "2:43", "english": "You shall observe the Contact Prayers (Salat).", "arabic": "واقيموا الصلاه",
+     "roots": "ق و م, ص ل و", "meanings": "observe, contact prayer"},
+]
+
+TOKENS = ["Worship ", "GOD ", "alone ", "[1:5]."]
+
+
+class StreamingOpenAI:
+    """Chat completions that stream TOKENS as deltas"""
+
+    def __init__(self):
+        self.stream_requested = None
+        self.embeddings = SimpleNamespace(create=lambda input, model: SimpleNamespace(data=[SimpleNamespace(embedding=[0.0] * 8)]))
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._complete))
+
+    def _complete(self, messages, stream=False, **kwargs):
+        self.stream_requested = stream
+        if not stream:
+            return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content="".join(TOKENS)))])
+        # First chunk carries the role only, like the real API
+        chunks = [SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=None))])]
+        chunks += [SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=token))]) for token in TOKENS]
+        return iter(chunks)
+
+
+def parse_events(body):
+    """Split a server-sent events body into (event, data) pairs"""
+    events = []
+    for block in body.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+def test_debate_stream():
+    """/debate streams tokens and ends with the full response"""
+    fake_client = StreamingOpenAI()
+    original_client = vector_search_api.client
+    vector_search_api.client = fake_client
+    try:
+        response = TestClient(vector_search_api.app).post("/debate", json={
+            "message": "Who should we worship?",
+            "stream": True
+        })
+    finally:
+        vector_search_api.client = original_client
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    assert fake_client.stream_requested is True
+
+    events = parse_events(response.text)
+    assert [e for e, _ in events] == ["token"] * len(TOKENS) + ["done"]
+    assert [d["text"] for e, d in events if e == "token"] == TOKENS
+    assert events[-1][1]["response"] == "".join(TOKENS)
+    print(f"✅ /debate streamed {len(TOKENS)} tokens")
+
+
+def test_enhanced_debate_stream():
+    """/debate/enhanced sends context first, then tokens, citations and done"""
+    app = FastAPI()
+    create_enhanced_debate_endpoint(app, {}, VERSES, StreamingOpenAI())
+    client = TestClient(app)
+
+    response = client.post("/debate/enhanced", json={"message": "Explain 2:43 about prayer", "stream": True})
+    assert response.status_code == 200
+
+    events = parse_events(response.text)
+    names = [e for e, _ in events]
+    assert names == ["context"] + ["token"] * len(TOKENS) + ["citations", "done"]
+
+    context = events[0][1]
+    assert [v["sura_verse"] for v in context["relatedVerses"]] == ["2:43", "1:5"]
+    assert context["rootAnalysis"] == []
+
+    citations = events[-2][1]
+    assert [c["reference"] for c in citations["citations"]] == ["1:5"]
+    assert citations["suggestedTabs"][0]["tab"] == "verseLookup"
+    assert events[-1][1]["response"] == "".join(TOKENS)
+
+    # Without stream the JSON response is unchanged
+    data = client.post("/debate/enhanced", json={"message": "Explain 2:43 about prayer"}).json()
+    assert data["response"] == "".join(TOKENS)
+    assert data["citations"] == citations["citations"]
+    print(f"✅ /debate/enhanced streamed events: {names}")
+
+
+if __name__ == "__main__":
+    test_debate_stream()
+    test_enhanced_debate_stream()
+    print("\n✅ All debate streaming tests passed")
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""Test cached debater rules and compiled system prompts"""
+
+import json
+import os
+import tempfile
+
+import debater_rules
+from debater_rules import load_debater_rules, get_system_prompt, format_debater_rules
+
+
+def write_rules(path, rules, mtime):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"rules": rules}, f)
+    # Explicit mtimes so the test doesn't depend on filesystem timestamp resolution
+    os.utime(path, ns=(mtime, mtime))
+
+
+def test_rules_cached_until_file_changes():
+    """The file is parsed once per modification and prompts are recompiled only then"""
+    with tempfile.TemporaryDirectory() as rules_dir:
+        path = os.path.join(rules_dir, "rules.json")
+        write_rules(path, [
+            {"id": 3, "category": "personality", "content": "Speak as a submitter."},
+            {"id": 99, "category": "content", "content": "Inactive rule text here.", "active": False},
+        ], mtime=1_000_000_000)
+
+        rules = load_debater_rules(path)
+        assert [r["id"] for r in rules] == [3]
+        assert load_debater_rules(path) is rules
+
+        prompt = get_system_prompt("debate", path)
+        assert "[PERSONALITY] Speak as a submitter." in prompt
+        assert get_system_prompt("debate", path) is prompt
+        assert "RULES TO FOLLOW:\nSpeak as a submitter." in get_system_prompt("enhanced", path)
+
+        # Editing the file takes effect without a restart
+        write_rules(path, [{"id": 14, "category": "content", "content": "Cite verses as [x:y]."}], mtime=2_000_000_000)
+        assert [r["id"] for r in load_debater_rules(path)] == [14]
+        assert "[CONTENT] Cite verses as [x:y]." in get_system_prompt("debate", path)
+
+        # A half-written file keeps the last good rules
+        with open(path, "w", encoding="utf-8") as f:
+            f.write('{"rules": [')
+        os.utime(path, ns=(3_000_000_000, 3_000_000_000))
+        assert [r["id"] for r in load_debater_rules(path)] == [14]
+
+
+def test_reload_after_load_keeps_prompts_consistent():
+    """A reload right after a request loaded the rules can't pair its prompt with the new rules"""
+    with tempfile.TemporaryDirectory() as rules_dir:
+        path = os.path.join(rules_dir, "rules.json")
+        write_rules(path, [{"id": 3, "category": "personality", "content": "Old rule content."}], mtime=1_000_000_000)
+
+        load_snapshot = debater_rules._load_snapshot
+        reloaded = []
+
+        def load_then_file_changes(*args, **kwargs):
+            snapshot = load_snapshot(*args, **kwargs)
+            if not reloaded:
+                # Another request reloads the edited file before this one compiles its prompt
+                write_rules(path, [{"id": 3, "category": "personality", "content": "New rule content."}],
+                            mtime=2_000_000_000)
+                reloaded.append(load_snapshot(path))
+            return snapshot
+
+        debater_rules._load_snapshot = load_then_file_changes
+        try:
+            first = get_system_prompt("debate", path)
+            second = get_system_prompt("debate", path)
+        finally:
+            debater_rules._load_snapshot = load_snapshot
+
+        assert "Old rule content." in first
+        assert "New rule content." in second and "Old rule content." not in second
+
+
+def test_missing_rules_file():
+    with tempfile.TemporaryDirectory() as rules_dir:
+        path = os.path.join(rules_dir, "missing.json")
+        assert load_debater_rules(path) == []
+        assert "No specific rules loaded." in get_system_prompt("enhanced", path)
+
+
+def test_format_limits_other_rules():
+    """Priority rules come first, other rules are capped"""
+    rules = [{"id": i, "category": "general", "content": f"Rule number {i} content"} for i in range(100, 120)]
+    rules.append({"id": 70, "category": "key", "content": "Priority rule content"})
+
+    formatted = format_debater_rules(rules, max_other_rules=3).splitlines()
+    assert formatted == ["Priority rule content", "Rule number 100 content", "Rule number 101 content", "Rule number 102 content"]
+    assert format_debater_rules(rules, with_categories=True).splitlines()[0] == "[KEY] Priority rule content"
+
+
+def test_default_rules_file_loads():
+    """The shipped rules.json compiles into both prompts"""
+    if not os.path.exists(debater_rules.RULES_PATH):
+        return
+    assert load_debater_rules()
+    assert "KEY RULES TO FOLLOW:" in get_system_prompt("debate")
+    assert "RULES TO FOLLOW:" in get_system_prompt("enhanced")
+
+
+if __name__ == "__main__":
+    test_rules_cached_until_file_changes()
+    test_reload_after_load_keeps_prompts_consistent()
+    test_missing_rules_file()
+    test_format_limits_other_rules()
+    test_default_rules_file_loads()
+    print("✅ All debater rules tests passed")
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""Test verse audio pre-rendering against a local stub TTS server"""
+
+import json
+import os
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+import prerender_verse_audio
+from prerender_verse_audio import main, parse_suras
+from tts_cache import PrerenderedAudio, TTSAudioCache, load_manifest, set_prerendered_audio, set_tts_cache
+from tts_endpoint_fastapi import add_tts_routes
+
+VERSES = [
+    {"sura_verse": "1:1", "arabic": "بسم الله الرحمن الرحيم", "english": "In the name of GOD, Most Gracious, Most Merciful."},
+    {"sura_verse": "1:2", "arabic": "الحمد لله رب العالمين", "english": "Praise be to GOD, Lord of the universe."},
+    {"sura_verse": "112:1", "arabic": "قل هو الله احد", "english": "Proclaim, \"He is the One and only GOD.\""},
+    {"sura_verse": "112:2", "arabic": "الله الصمد", "english": "\"The Absolute GOD.\""},
+    {"sura_verse": "113:1", "arabic": "بسم الله الرحمن الرحيم", "english": ""},
+]
+
+
+class StubTTSServer:
+    """OpenAI-compatible POST /v1/audio/speech that returns the input as 'audio'"""
+
+    def __init__(self):
+        self.requests = []
+        self.fail_inputs = set()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                stub.requests.append(body)
+                if self.path != "/v1/audio/speech" or body["input"] in stub.fail_inputs:
+                    self.send_response(400)
+                    self.send_header("Content-Type", "application/json")
+                    self.end_headers()
+                    self.wfile.write(b'{"error": {"message": "rejected by stub"}}')
+                    return
+                audio = f"MP3|{body['model']}|{body['voice']}|{body['speed']}|{body['input']}".encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "audio/mpeg")
+                self.send_header("Content-Length", str(len(audio)))
+                self.end_headers()
+                self.wfile.write(audio)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.base_url = f"http://127.0.0.1:{self.server.server_address[1]}/v1"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def inputs(self):
+        return [request["input"] for request in self.requests]
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def write_verses(directory):
+    path = os.path.join(directory, "verses.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(VERSES, f, ensure_ascii=False)
+    return path
+
+
+def test_parse_suras():
+    assert parse_suras("1,36,112-114") == {1, 36, 112, 113, 114}
+    assert parse_suras(" 2 ,") == {2}
+
+
+def test_prerender_is_resumable():
+    stub = StubTTSServer()
+    original_save_every = prerender_verse_audio.SAVE_EVERY
+    prerender_verse_audio.SAVE_EVERY = 1
+    with tempfile.TemporaryDirectory() as directory:
+        output = os.path.join(directory, "prerendered")
+        args = ["--verses", write_verses(directory), "--output", output, "--base-url", stub.base_url,
+                "--concurrency", "3", "--progress-interval", "0"]
+        try:
+            # A partial run (as if interrupted) renders two clips
+            assert main(args + ["--limit", "2"]) == 0
+            assert len(stub.requests) == 2
+
+            # The full run only renders what's missing; 1:1 and 113:1 share the Basmalah clip
+            assert main(args) == 0
+            assert sorted(stub.inputs()) == sorted(v["arabic"] for v in VERSES[:4])
+
+            manifest = load_manifest(output)
+            assert len(manifest["clips"]) == 4
+            assert {clip["sura_verse"] for clip in manifest["clips"].values()} >= {"1:2", "112:1", "112:2"}
+
+            # Nothing left to do
+            assert main(args) == 0
+            assert len(stub.requests) == 4
+
+            # Selected suras and a translation field
+            assert main(args + ["--suras", "112", "--fields", "english"]) == 0
+            assert stub.inputs()[4:] and all("GOD" in text for text in stub.inputs()[4:])
+            assert len(load_manifest(output)["clips"]) == 6
+        finally:
+            prerender_verse_audio.SAVE_EVERY = original_save_every
+            stub.close()
+
+
+def test_failed_clips_are_retried_on_next_run():
+    stub = StubTTSServer()
+    stub.fail_inputs = {"الله الصمد"}
+    original_attempts = prerender_verse_audio.ATTEMPTS
+    prerender_verse_audio.ATTEMPTS = 1
+    with tempfile.TemporaryDirectory() as directory:
+        output = os.path.join(directory, "prerendered")
+        args = ["--verses", write_verses(directory), "--output", output, "--base-url", stub.base_url,
+                "--suras", "112", "--progress-interval", "0"]
+        try:
+            assert main(args) == 1
+            assert len(load_manifest(output)["clips"]) == 1
+
+            stub.fail_inputs = set()
+            assert main(args) == 0
+            assert len(load_manifest(output)["clips"]) == 2
+            assert stub.inputs().count("قل هو الله احد") == 1
+        finally:
+            prerender_verse_audio.ATTEMPTS = original_attempts
+            stub.close()
+
+
+def test_api_serves_prerendered_audio():
+    """The API answers from the manifest without calling the TTS API"""
+    stub = StubTTSServer()
+    with tempfile.TemporaryDirectory() as directory:
+        output = os.path.join(directory, "prerendered")
+        assert main(["--verses", write_verses(directory), "--output", output, "--base-url", stub.base_url,
+                     "--suras", "1", "--progress-interval", "0"]) == 0
+        stub.close()
+
+        set_prerendered_audio(PrerenderedAudio(output))
+        set_tts_cache(TTSAudioCache(os.path.join(directory, "cache")))
+        try:
+            app = FastAPI()
+            add_tts_routes(app)
+            response = TestClient(app).post("/generate-tts", json={"text": VERSES[1]["arabic"]})
+            assert response.status_code == 200
+            assert response.content == f"MP3|tts-1|onyx|0.8|{VERSES[1]['arabic']}".encode("utf-8")
+        finally:
+            set_prerendered_audio(None)
+            set_tts_cache(None)
+
+
+def test_manifest_is_reloaded_after_a_run():
+    """Clips rendered while the API is running are served without a restart"""
+    stub = StubTTSServer()
+    with tempfile.TemporaryDirectory() as directory:
+        output = os.path.join(directory, "prerendered")
+        prerendered = PrerenderedAudio(output)
+        try:
+            assert main(["--verses", write_verses(directory), "--output", output, "--base-url", stub.base_url,
+                         "--suras", "1", "--progress-interval", "0"]) == 0
+        finally:
+            stub.close()
+
+        keys = list(load_manifest(output)["clips"])
+        assert keys
+        for key in keys:
+            assert prerendered.get(key) is not None
+
+
+if __name__ == "__main__":
+    test_parse_suras()
+    test_prerender_is_resumable()
+    test_failed_clips_are_retried_on_next_run()
+    test_api_serves_prerendered_audio()
+    test_manifest_is_reloaded_after_a_run()
+    print("\n✅ All pre-render tests passed")
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""Test the semantic answer cache for debate openings"""
+
+from types import SimpleNamespace
+
+import numpy as np
+from fastapi.testclient import TestClient
+
+import semantic_cache
+import vector_search_api
+from semantic_cache import SemanticAnswerCache
+
+
+def unit(*values):
+    """Embedding padded to 8 dimensions"""
+    return np.array(list(values) + [0.0] * (8 - len(values)), dtype='float32')
+
+
+def test_similar_topics_share_answer():
+    cache = SemanticAnswerCache(threshold=0.95, maxsize=10, ttl=None)
+    assert cache.lookup("hadith", unit(1, 0)) is None
+
+    cache.add("Hadith", unit(1, 0), "Opening about hadith")
+    # Nearly the same direction (cosine ~0.995), scale doesn't matter
+    answer, topic, similarity = cache.lookup("hadiths and sunna", unit(10, 1))
+    assert answer == "Opening about hadith" and topic == "Hadith" and similarity > 0.95
+
+    # Different topic
+    assert cache.lookup("code 19", unit(0, 1)) is None
+    # Same text needs no embedding
+    assert cache.lookup_exact("  HADITH ") == "Opening about hadith"
+
+    stats = cache.stats()
+    assert stats["hits"] == 2 and stats["misses"] == 2 and stats["size"] == 1
+
+
+def test_namespace_and_expiry():
+    now = [0.0]
+    cache = SemanticAnswerCache(threshold=0.95, maxsize=10, ttl=60, clock=lambda: now[0])
+    cache.add("Code 19", unit(0, 1), "Old rules answer", namespace="rules-v1")
+
+    # Answers generated under another system prompt are not reused
+    assert cache.lookup("Code 19", unit(0, 1), namespace="rules-v2") is None
+    assert cache.lookup("Code 19", unit(0, 1), namespace="rules-v1")[0] == "Old rules answer"
+
+    now[0] = 61
+    assert cache.lookup("Code 19", unit(0, 1), namespace="rules-v1") is None
+    assert cache.lookup_exact("Code 19", namespace="rules-v1") is None
+
+
+def test_size_bound():
+    cache = SemanticAnswerCache(threshold=0.99, maxsize=4, ttl=None)
+    for i in range(10):
+        vector = np.zeros(8, dtype='float32')
+        vector[i % 8] = 1.0
+        vector[(i + 1) % 8] = i  # distinct directions
+        cache.add(f"topic {i}", vector, f"answer {i}")
+        assert len(cache) <= 4
+
+    # Most recent entries survive and are still found through the rebuilt index
+    vector = np.zeros(8, dtype='float32')
+    vector[1] = 1.0
+    vector[2] = 9
+    assert cache.lookup("topic 9 again", vector)[0] == "answer 9"
+
+
+def test_debate_openings_use_cache():
+    """Near-identical new topics reuse the opening; follow-ups always call the model"""
+    completions = []
+    vectors = {"Hadith": unit(1, 0), "hadith & sunna": unit(10, 1), "Code 19": unit(0, 1)}
+
+    def complete(messages, **kwargs):
+        completions.append(messages)
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=f"Opening {len(completions)}"))])
+
+    fake_client = SimpleNamespace(
+        chat=SimpleNamespace(completions=SimpleNamespace(create=complete)),
+        embeddings=SimpleNamespace(create=lambda input, model: SimpleNamespace(data=[SimpleNamespace(embedding=vectors[input])]))
+    )
+    original = vector_search_api.client, semantic_cache.debate_answer_cache
+    vector_search_api.client = fake_client
+    semantic_cache.debate_answer_cache = SemanticAnswerCache(threshold=0.95, maxsize=10, ttl=None)
+    try:
+        client = TestClient(vector_search_api.app)
+
+        def open_topic(topic, **extra):
+            return client.post("/debate", json={"topic": topic, "isNewTopic": True, **extra}).json()
+
+        first = open_topic("Hadith")
+        assert first["response"] == "Opening 1"
+        assert open_topic("hadith & sunna")["response"] == "Opening 1"
+        assert open_topic("Code 19")["response"] == "Opening 2"
+        assert len(completions) == 2
+
+        # The cached opening is still recorded in the conversation
+        data = client.post("/debate", json={"message": "Why?", "conversationId": first["conversationId"]}).json()
+        assert data["response"] == "Opening 3"
+
+        # Not an opening if there's already history
+        history = [{"role": "user", "content": "Hi"}, {"role": "assistant", "content": "Peace"}]
+        assert open_topic("Hadith", conversationHistory=history)["response"] == "Opening 4"
+    finally:
+        vector_search_api.client, semantic_cache.debate_answer_cache = original
+
+
+if __name__ == "__main__":
+    test_similar_topics_share_answer()
+    test_namespace_and_expiry()
+    test_size_bound()
+    test_debate_openings_use_cache()
+    print("\n✅ All semantic cache tests passed")
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""Test cached subscription status lookups and their invalidation from the Stripe webhook"""
+
+import hashlib
+import hmac
+import json
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+import stripe_config
+from payment_endpoints import parse_expires_at, router, subscription_cache, webhook_queue
+from subscription_store import MemorySubscriptionStore, set_subscription_store
+
+WEBHOOK_SECRET = "whsec_test"
+
+
+def signed_event(event_type, obj, event_id=None, secret=WEBHOOK_SECRET):
+    """A Stripe event with a valid Stripe-Signature header for secret"""
+    event_id = event_id or f"evt_{uuid.uuid4().hex}"
+    payload = json.dumps({"id": event_id, "object": "event", "type": event_type, "data": {"object": obj}})
+    timestamp = int(time.time())
+    signature = hmac.new(secret.encode(), f"{timestamp}.{payload}".encode(), hashlib.sha256).hexdigest()
+    return payload, {"stripe-signature": f"t={timestamp},v1={signature}", "Content-Type": "application/json"}
+
+
+def make_client(store):
+    set_subscription_store(store)
+    subscription_cache.clear()
+    app = FastAPI()
+    app.include_router(router)
+    return TestClient(app)
+
+
+def restore():
+    set_subscription_store(None)
+    subscription_cache.clear()
+
+
+def lookups(store):
+    return store.calls.count("find_by_email")
+
+
+def test_parse_expires_at_formats():
+    expected = datetime(2030, 1, 2, 3, 4, 5, tzinfo=timezone.utc)
+    assert parse_expires_at("2030-01-02T03:04:05Z") == expected
+    assert parse_expires_at("2030-01-02T03:04:05+00:00") == expected
+    assert parse_expires_at("2030-01-02T03:04:05") == expected
+    assert parse_expires_at("2030-01-01T22:04:05-05:00") == expected
+
+
+def test_status_is_cached():
+    future = (datetime.now(timezone.utc) + timedelta(days=10)).isoformat()
+    db = MemorySubscriptionStore([
+        {"email": "reader@example.com", "status": "inactive", "tier": "free", "expires_at": None, "created_at": "2024-01-01"},
+        {"email": "reader@example.com", "status": "active", "tier": "premium", "expires_at": future, "created_at": "2024-06-01"},
+    ])
+    client = make_client(db)
+    try:
+        first = client.get("/api/payment/user/subscription/Reader@Example.com").json()
+        assert first["hasSubscription"] is True and first["user"]["tier"] == "premium"
+
+        for _ in range(5):
+            assert client.get("/api/payment/user/subscription/reader@example.com").json() == first
+        assert client.get("/api/payment/user/check-subscription/reader@example.com").json() == first
+
+        assert lookups(db) == 1
+
+        # Unknown users are cached too, until they are created
+        assert client.get("/api/payment/user/subscription/new@example.com").json()["user"] is None
+        assert client.post("/api/payment/user/subscription", json={"email": "new@example.com"}).json()["success"]
+        assert client.get("/api/payment/user/subscription/new@example.com").json()["user"]["email"] == "new@example.com"
+    finally:
+        restore()
+
+
+def test_webhook_invalidates_cached_status():
+    db = MemorySubscriptionStore([{"email": "buyer@example.com", "status": "inactive", "tier": "free", "expires_at": None,
+                                   "created_at": "2024-01-01"}])
+    client = make_client(db)
+    original_secret = stripe_config.STRIPE_WEBHOOK_SECRET
+    stripe_config.STRIPE_WEBHOOK_SECRET = WEBHOOK_SECRET
+    try:
+        url = "/api/payment/user/subscription/buyer@example.com"
+        # One event loop for the whole test, so the queue's worker keeps running
+        with client:
+            assert client.get(url).json()["hasSubscription"] is False
+
+            payload, headers = signed_event("checkout.session.completed", {
+                "customer": "cus_1", "subscription": "sub_1", "customer_details": {"email": "buyer@example.com"}
+            })
+            assert client.post("/api/payment/webhook", content=payload, headers=headers).status_code == 200
+            client.portal.call(webhook_queue.join)
+            assert client.get(url).json()["hasSubscription"] is True
+
+            payload, headers = signed_event("customer.subscription.deleted", {"id": "sub_1", "customer": "cus_1"})
+            assert client.post("/api/payment/webhook", content=payload, headers=headers).status_code == 200
+            client.portal.call(webhook_queue.join)
+            assert client.get(url).json()["hasSubscription"] is False
+        assert lookups(db) == 3
+    finally:
+        stripe_config.STRIPE_WEBHOOK_SECRET = original_secret
+        restore()
+
+
+if __name__ == "__main__":
+    test_parse_expires_at_formats()
+    test_status_is_cached()
+    test_webhook_invalidates_cached_status()
+    print("\n✅ All subscription cache tests passed")
@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""Test the subscription store backends"""
+
+import asyncio
+import json
+import os
+import tempfile
+
+import httpx
+
+import subscription_store
+from subscription_store import (
+    MemorySubscriptionStore,
+    PostgRESTSubscriptionStore,
+    SQLiteSubscriptionStore,
+    SubscriptionStore,
+    SubscriptionStoreError
+)
+
+
+class FakePostgREST:
+    """/rest/v1/user_subscriptions over httpx.MockTransport, failing the first requests if asked"""
+
+    def __init__(self, fail_first=0, fail_with=503):
+        self.store = MemorySubscriptionStore()
+        self.requests = []
+        self.fail_first = fail_first
+        self.fail_with = fail_with
+
+    async def handle(self, request):
+        self.requests.append(request)
+        if len(self.requests) <= self.fail_first:
+            if self.fail_with == "connect":
+                raise httpx.ConnectError("connection refused", request=request)
+            return httpx.Response(self.fail_with, json={"message": "unavailable"})
+        assert request.headers["apikey"] == "service-key"
+        params = request.url.params
+        if request.url.path == "/rest/v1/stripe_webhook_events":
+            return await self.handle_events(request, params)
+        assert request.url.path == "/rest/v1/user_subscriptions"
+        if request.method == "GET":
+            return httpx.Response(200, json=await self.store.find_by_email(params["email"][3:]))
+        if request.method == "POST":
+            return httpx.Response(201, json=[await self.store.insert(json.loads(request.content))])
+        if request.method == "PATCH":
+            rows = await self.store.update_by_subscription_id(params["stripe_subscription_id"][3:], json.loads(request.content))
+            return httpx.Response(200, json=rows)
+        return httpx.Response(405)
+
+    async def handle_events(self, request, params):
+        events = self.store.events
+        if request.method == "GET" and "id" in params:
+            row = await self.store.get_webhook_event(params["id"][3:])
+            return httpx.Response(200, json=[row] if row else [])
+        if request.method == "GET":
+            return httpx.Response(200, json=await self.store.find_webhook_events(params["status"][3:]))
+        if request.method == "POST":
+            assert "resolution=ignore-duplicates" in request.headers["prefer"]
+            row = json.loads(request.content)
+            if row["id"] in events:
+                return httpx.Response(201, json=[])
+            events[row["id"]] = row
+            return httpx.Response(201, json=[row])
+        if request.method == "PATCH":
+            status = params["status"][3:] if "status" in params else None
+            rows = await self.store.update_webhook_event(params["id"][3:], json.loads(request.content), status)
+            return httpx.Response(200, json=rows)
+        return httpx.Response(405)
+
+    def client(self, retries=2):
+        return PostgRESTSubscriptionStore("https://example.supabase.co/", "service-key", retries=retries,
+                                          transport=httpx.MockTransport(self.handle))
+
+
+async def exercise(store):
+    """The calls the payment endpoints make"""
+    assert await store.find_by_email("a@example.com") == []
+    created = await store.insert({"email": "a@example.com", "status": "inactive", "tier": "free"})
+    assert created["email"] == "a@example.com" and "created_at" in created
+    await store.upsert({"email": "a@example.com", "status": "active", "tier": "premium", "stripe_subscription_id": "sub_1"})
+    rows = await store.find_by_email("a@example.com")
+    assert sorted(row["tier"] for row in rows) == ["free", "premium"]
+
+    updated = await store.update_by_subscription_id("sub_1", {"status": "inactive", "tier": "free"})
+    assert [row["email"] for row in updated] == ["a@example.com"]
+    assert all(row["tier"] == "free" for row in await store.find_by_email("a@example.com"))
+    assert await store.update_by_subscription_id("sub_missing", {"status": "inactive"}) == []
+
+    # Webhook events
+    event = {"id": "evt_1", "type": "checkout.session.completed", "data": {"object": {"customer": "cus_1"}}}
+    assert await store.record_webhook_event(event, "queued")
+    assert not await store.record_webhook_event(event, "queued")
+    await store.record_webhook_event({"id": "evt_2", "type": "customer.subscription.deleted"}, "queued")
+    queued = await store.find_webhook_events("queued")
+    assert [row["id"] for row in queued] == ["evt_1", "evt_2"] and queued[0]["payload"] == event
+    assert (await store.get_webhook_event("evt_2"))["status"] == "queued"
+    assert await store.get_webhook_event("evt_missing") is None
+    # Conditional on the current status
+    assert await store.update_webhook_event("evt_1", {"status": "queued"}, status="failed") == []
+    updated = await store.update_webhook_event("evt_1", {"status": "failed", "attempts": 5, "last_error": "boom"})
+    assert updated[0]["status"] == "failed" and updated[0]["attempts"] == 5
+    assert [row["id"] for row in await store.find_webhook_events("failed")] == ["evt_1"]
+    assert [row["id"] for row in await store.find_webhook_events("queued")] == ["evt_2"]
+
+
+def test_memory_and_sqlite_stores():
+    asyncio.run(exercise(MemorySubscriptionStore()))
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "subscriptions.db")
+        store = SQLiteSubscriptionStore(path)
+        asyncio.run(exercise(store))
+        asyncio.run(store.close())
+        # Rows and events survive reopening
+        reopened = SQLiteSubscriptionStore(path)
+        assert len(asyncio.run(reopened.find_by_email("a@example.com"))) == 2
+        assert [row["id"] for row in asyncio.run(reopened.find_webhook_events("failed"))] == ["evt_1"]
+        asyncio.run(reopened.close())
+
+
+def test_backends_implement_the_interface():
+    class Partial(SubscriptionStore):
+        async def find_by_email(self, email):
+            return []
+    try:
+        Partial()
+        assert False, "a store missing methods should not be created"
+    except TypeError:
+        pass
+
+
+def test_postgrest_store():
+    server = FakePostgREST()
+    store = server.client()
+
+    async def run():
+        await exercise(store)
+        await store.close()
+
+    asyncio.run(run())
+    prefer = [request.headers.get("prefer") for request in server.requests
+              if request.method == "POST" and request.url.path.endswith("/user_subscriptions")]
+    assert prefer == ["return=representation", "resolution=merge-duplicates,return=representation"]
+
+
+def test_postgrest_retries():
+    original_backoff = subscription_store.RETRY_BACKOFF_SECONDS
+    subscription_store.RETRY_BACKOFF_SECONDS = 0
+    try:
+        # Reads are retried on 5xx
+        server = FakePostgREST(fail_first=2)
+        assert asyncio.run(server.client().find_by_email("a@example.com")) == []
+        assert len(server.requests) == 3
+
+        # Writes are not - the row may already be written
+        server = FakePostgREST(fail_first=1)
+        try:
+            asyncio.run(server.client().insert({"email": "a@example.com"}))
+            assert False, "insert should fail"
+        except SubscriptionStoreError as e:
+            assert "503" in str(e)
+        assert len(server.requests) == 1
+
+        # ...unless the connection failed before the request was sent
+        server = FakePostgREST(fail_first=1, fail_with="connect")
+        assert asyncio.run(server.client().insert({"email": "a@example.com"}))["email"] == "a@example.com"
+
+        # Out of retries
+        server = FakePostgREST(fail_first=10)
+        try:
+            asyncio.run(server.client(retries=1).find_by_email("a@example.com"))
+            assert False, "find_by_email should fail"
+        except SubscriptionStoreError:
+            pass
+        assert len(server.requests) == 2
+    finally:
+        subscription_store.RETRY_BACKOFF_SECONDS = original_backoff
+
+
+if __name__ == "__main__":
+    test_memory_and_sqlite_stores()
+    test_backends_implement_the_interface()
+    test_postgrest_store()
+    test_postgrest_retries()
+    print("\n✅ All subscription store tests passed")
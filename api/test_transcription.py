@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""Test /transcribe-audio upload handling"""
+
+import io
+import threading
+from types import SimpleNamespace
+
+from fastapi import FastAPI, File, Request, UploadFile
+from fastapi.testclient import TestClient
+
+import vector_search_api
+from transcription import UploadSizeLimitMiddleware, transcription_cache, upload_filename
+
+
+class FakeWhisper:
+    """audio.transcriptions.create recording what it was sent"""
+
+    def __init__(self):
+        self.calls = []
+        self.audio = SimpleNamespace(transcriptions=SimpleNamespace(create=self.create))
+
+    def create(self, model, file, response_format, language=None):
+        filename, fileobj, content_type = file
+        self.calls.append({
+            "filename": filename,
+            "content": fileobj.read(),
+            "content_type": content_type,
+            "language": language,
+            "thread": threading.current_thread().name
+        })
+        return "قل هو الله احد"
+
+
+def test_upload_filename():
+    assert upload_filename("query.m4a", "audio/mp4") == "query.m4a"
+    assert upload_filename("blob", "audio/webm;codecs=opus") == "blob.webm"
+    assert upload_filename(None, "audio/mp4") == "audio.mp4"
+    assert upload_filename("recording", "audio/wav") == "recording.wav"
+    assert upload_filename("", None) == "audio.webm"
+
+
+def test_transcribe_sends_upload_directly():
+    whisper = FakeWhisper()
+    original = vector_search_api.client
+    vector_search_api.client = whisper
+    transcription_cache.clear()
+    try:
+        client = TestClient(vector_search_api.app)
+        audio = b"\x1aE\xdf\xa3" + b"\x00" * 5000
+        response = client.post(
+            "/transcribe-audio?language=ar",
+            files={"audio": ("blob", audio, "audio/webm")}
+        )
+        assert response.status_code == 200, response.text
+        assert response.json() == {"transcription": "قل هو الله احد"}
+
+        call = whisper.calls[0]
+        assert call["content"] == audio
+        assert call["filename"] == "blob.webm" and call["content_type"] == "audio/webm"
+        assert call["language"] == "ar"
+        # Whisper is called from a worker thread, not the event loop
+        assert call["thread"] != threading.main_thread().name
+
+        # Auto-detect when no language is given
+        client.post("/transcribe-audio", files={"audio": ("q.mp3", audio, "audio/mpeg")})
+        assert whisper.calls[1]["language"] is None
+
+        empty = client.post("/transcribe-audio", files={"audio": ("empty.webm", b"", "audio/webm")})
+        assert empty.status_code == 400
+    finally:
+        vector_search_api.client = original
+
+
+def test_repeated_upload_served_from_cache():
+    whisper = FakeWhisper()
+    original = vector_search_api.client
+    vector_search_api.client = whisper
+    transcription_cache.clear()
+    transcription_cache.hits = transcription_cache.misses = 0
+    try:
+        client = TestClient(vector_search_api.app)
+        audio = b"\x1aE\xdf\xa3" + b"\x01" * 5000
+
+        def post(language="ar", name="blob"):
+            response = client.post(f"/transcribe-audio?language={language}", files={"audio": (name, audio, "audio/webm")})
+            assert response.json() == {"transcription": "قل هو الله احد"}
+
+        post()
+        post(name="retry")
+        assert len(whisper.calls) == 1
+
+        # The language is part of the key
+        post(language="en")
+        assert len(whisper.calls) == 2
+
+        stats = client.get("/metrics").json()["transcription_cache"]
+        assert stats["hits"] == 1 and stats["misses"] == 2 and stats["size"] == 2
+    finally:
+        vector_search_api.client = original
+        transcription_cache.clear()
+
+
+def test_oversized_upload_rejected_early():
+    received = []
+    app = FastAPI()
+    app.add_middleware(UploadSizeLimitMiddleware, paths=["/upload"], max_bytes=1000)
+
+    @app.post("/upload")
+    async def upload(audio: UploadFile = File(...)):
+        received.append(len(await audio.read()))
+        return {"ok": True}
+
+    @app.post("/other")
+    async def other(request: Request):
+        return {"size": len(await request.body())}
+
+    client = TestClient(app)
+    assert client.post("/upload", files={"audio": ("a.webm", b"x" * 500, "audio/webm")}).status_code == 200
+
+    # Declared size over the limit
+    response = client.post("/upload", files={"audio": ("a.webm", b"x" * 5000, "audio/webm")})
+    assert response.status_code == 413 and "too large" in response.json()["detail"]
+
+    # Chunked upload without Content-Length
+    def chunks():
+        for _ in range(10):
+            yield b"y" * 500
+
+    response = client.post("/upload", content=chunks(), headers={"Content-Type": "multipart/form-data; boundary=xyz"})
+    assert response.status_code == 413
+    assert received == [500]
+
+    # Other paths are unaffected
+    assert client.post("/other", content=b"z" * 5000).json() == {"size": 5000}
+
+
+def test_final_payload_size_is_checked():
+    """What is sent to Whisper is checked against the limit, not only the upload"""
+    whisper = FakeWhisper()
+    original_client, original_prepare = vector_search_api.client, vector_search_api.prepare_upload
+    vector_search_api.client = whisper
+    vector_search_api.prepare_upload = lambda file, filename, content_type: (
+        io.BytesIO(b"\x00" * (vector_search_api.TRANSCRIBE_MAX_UPLOAD_BYTES + 1)), filename, content_type
+    )
+    transcription_cache.clear()
+    try:
+        client = TestClient(vector_search_api.app)
+        response = client.post("/transcribe-audio", files={"audio": ("blob.webm", b"\x1aE\xdf\xa3" * 10, "audio/webm")})
+        assert response.status_code == 413
+        assert whisper.calls == []
+    finally:
+        vector_search_api.client, vector_search_api.prepare_upload = original_client, original_prepare
+
+
+if __name__ == "__main__":
+    test_upload_filename()
+    test_transcribe_sends_upload_directly()
+    test_repeated_upload_served_from_cache()
+    test_oversized_upload_rejected_early()
+    test_final_payload_size_is_checked()
+    print("\n✅ All transcription tests passed")
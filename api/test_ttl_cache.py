@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""Test the shared in-memory LRU/TTL cache"""
+
+from ttl_cache import TTLCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_lru_eviction():
+    cache = TTLCache(maxsize=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1  # "a" is now most recently used
+    cache.set("c", 3)
+    assert "b" not in cache
+    assert cache.get("a") == 1 and cache.get("c") == 3
+    assert len(cache) == 2
+
+
+def test_ttl_expiry_and_stats():
+    clock = FakeClock()
+    cache = TTLCache(maxsize=10, ttl=60, clock=clock)
+    cache.set("key", "value")
+    cache.set("forever", "value", ttl=None)
+
+    assert cache.get("key") == "value"
+    clock.now = 61
+    assert cache.get("key") is None
+    assert cache.get("forever") == "value"
+
+    assert cache.pop("forever") == "value"
+    assert cache.get("forever", "default") == "default"
+
+    stats = cache.stats()
+    assert stats["hits"] == 2 and stats["misses"] == 2
+    assert stats["hit_rate"] == 0.5
+
+
+if __name__ == "__main__":
+    test_lru_eviction()
+    test_ttl_expiry_and_stats()
+    print("✅ All TTL cache tests passed")
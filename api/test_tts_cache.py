@@ -0,0 +1,305 @@
+#!/usr/bin/env python3
+"""Test the content-addressed TTS audio cache and /generate-tts streaming"""
+
+import asyncio
+import os
+import tempfile
+import time
+from types import SimpleNamespace
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+import tts_endpoint_fastapi
+from tts_cache import TTSAudioCache, tts_cache_key, etag_for, etag_matches, set_tts_cache
+from tts_endpoint_fastapi import add_tts_routes, stream_and_cache, SpeechStream
+
+
+class FakeStreamingResponse:
+    """Context manager like with_streaming_response.create"""
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.closed = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.closed = True
+
+    def iter_bytes(self, chunk_size=None):
+        for chunk in self.chunks:
+            if isinstance(chunk, Exception):
+                raise chunk
+            if callable(chunk):
+                chunk = chunk()
+            yield chunk
+
+
+class FakeSpeech:
+    """audio.speech returning the request as 'audio' in two chunks"""
+
+    def __init__(self):
+        self.calls = []
+        self.responses = []
+        self.with_streaming_response = SimpleNamespace(create=self.create_streaming)
+
+    @staticmethod
+    def audio_for(voice, speed, text):
+        return f"MP3:{voice}:{speed}:{text}".encode("utf-8")
+
+    def create(self, model, voice, input, speed):
+        self.calls.append((model, voice, input, speed))
+        audio = self.audio_for(voice, speed, input)
+        return SimpleNamespace(iter_bytes=lambda chunk_size=None: iter([audio[:5], audio[5:]]))
+
+    def create_streaming(self, model, voice, input, speed):
+        self.calls.append((model, voice, input, speed))
+        audio = self.audio_for(voice, speed, input)
+        response = FakeStreamingResponse(self.chunks_for(input) or [audio[:5], audio[5:]])
+        self.responses.append(response)
+        return response
+
+    def chunks_for(self, text):
+        """Override to script the upstream stream for a text"""
+        return None
+
+
+def test_cache_key():
+    key = tts_cache_key("بسم الله", "onyx", 0.8, "tts-1")
+    assert key == tts_cache_key("بسم الله", "onyx", 0.80, "tts-1")
+    assert key != tts_cache_key("بسم الله", "onyx", 1.0, "tts-1")
+    assert key != tts_cache_key("بسم الله", "alloy", 0.8, "tts-1")
+    assert key != tts_cache_key("بسم الله", "onyx", 0.8, "tts-1-hd")
+
+    assert etag_matches(etag_for(key), key)
+    assert etag_matches(f'W/"other", W/{etag_for(key)}', key)
+    assert etag_matches("*", key)
+    assert not etag_matches('"other"', key) and not etag_matches(None, key)
+
+
+def test_put_get_and_lru_eviction():
+    with tempfile.TemporaryDirectory() as directory:
+        cache = TTSAudioCache(directory, max_bytes=250)
+        assert cache.get("a" * 64) is None
+
+        for name in "abc":
+            cache.put(name * 64, name.encode() * 100)
+        # Over 250 bytes: the oldest clip went
+        assert cache.get("a" * 64) is None
+
+        # Using b makes c the least recently used
+        assert open(cache.get("b" * 64), "rb").read() == b"b" * 100
+        cache.put("d" * 64, b"d" * 100)
+        assert cache.get("c" * 64) is None
+        assert cache.get("b" * 64) and cache.get("d" * 64)
+        assert cache.stats()["bytes"] == 200
+
+        # Nothing half-written is left behind, and a restart finds the clips
+        files = [name for _, _, names in os.walk(directory) for name in names]
+        assert all(name.endswith(".mp3") for name in files) and len(files) == 2
+        assert TTSAudioCache(directory, max_bytes=250).get("d" * 64)
+
+
+def test_stale_temporary_files_are_removed():
+    """Writes interrupted by a crash are cleaned up when the cache is next opened"""
+    with tempfile.TemporaryDirectory() as directory:
+        cache = TTSAudioCache(directory)
+        cache.put("a" * 64, b"x" * 100)
+        stale = cache.writer("b" * 64)
+        stale._file.close()
+        hour_ago = time.time() - 2 * 3600
+        os.utime(stale.temp_path, (hour_ago, hour_ago))
+        # Possibly another worker's write in progress
+        fresh = cache.writer("c" * 64)
+
+        reopened = TTSAudioCache(directory)
+        assert not os.path.exists(stale.temp_path) and os.path.exists(fresh.temp_path)
+        assert reopened.stats()["clips"] == 1 and reopened.get("a" * 64)
+        fresh.abort()
+
+
+class LoopCheckingCache(TTSAudioCache):
+    """Records whether disk access happened on the event loop"""
+
+    def __init__(self, directory):
+        super().__init__(directory)
+        self.on_event_loop = []
+
+    def _record(self):
+        try:
+            asyncio.get_running_loop()
+            self.on_event_loop.append(True)
+        except RuntimeError:
+            self.on_event_loop.append(False)
+
+    def get(self, key):
+        self._record()
+        return super().get(key)
+
+    def writer(self, key):
+        self._record()
+        return super().writer(key)
+
+
+def test_generate_tts_is_cached():
+    speech = FakeSpeech()
+    original_client = tts_endpoint_fastapi._client
+    tts_endpoint_fastapi._client = SimpleNamespace(audio=SimpleNamespace(speech=speech))
+
+    with tempfile.TemporaryDirectory() as directory:
+        set_tts_cache(TTSAudioCache(directory))
+        try:
+            app = FastAPI()
+            add_tts_routes(app)
+            client = TestClient(app)
+            body = {"text": "قل هو الله احد", "voice": "onyx", "speed": 0.8}
+
+            first = client.post("/generate-tts", json=body)
+            assert first.status_code == 200
+            assert first.headers["content-type"] == "audio/mpeg"
+            assert first.content == "MP3:onyx:0.8:قل هو الله احد".encode("utf-8")
+            etag = first.headers["etag"]
+
+            # Another user playing the same verse is served from disk
+            second = client.post("/generate-tts", json=body)
+            assert second.content == first.content and second.headers["etag"] == etag
+            assert len(speech.calls) == 1
+
+            # A client that still has the audio gets 304 with no body
+            not_modified = client.post("/generate-tts", json=body, headers={"If-None-Match": etag})
+            assert not_modified.status_code == 304 and not_modified.content == b""
+
+            # Different speed is different audio
+            client.post("/generate-tts", json={**body, "speed": 1.0})
+            assert len(speech.calls) == 2
+
+            assert client.post("/generate-tts", json={**body, "text": ""}).status_code == 400
+
+            # Lookups and temporary files stay off the event loop
+            cache = LoopCheckingCache(directory)
+            set_tts_cache(cache)
+            client.post("/generate-tts", json=body)
+            client.post("/generate-tts", json={**body, "speed": 1.2})
+            assert cache.on_event_loop == [False, False, False]
+        finally:
+            set_tts_cache(None)
+            tts_endpoint_fastapi._client = original_client
+
+
+def test_audio_streams_before_synthesis_finishes():
+    """The first chunk reaches the client while the rest is still being synthesized"""
+    synthesized = []
+
+    def later_chunk():
+        synthesized.append("second")
+        return b"-second"
+
+    speech = FakeSpeech()
+    speech.chunks_for = lambda text: [b"first", later_chunk]
+    original_client = tts_endpoint_fastapi._client
+    tts_endpoint_fastapi._client = SimpleNamespace(audio=SimpleNamespace(speech=speech))
+
+    with tempfile.TemporaryDirectory() as directory:
+        cache = TTSAudioCache(directory)
+        try:
+            stream = stream_and_cache(SpeechStream("long passage", "onyx", 0.8), cache.writer("k" * 64))
+            assert next(stream) == b"first"
+            assert synthesized == [] and cache.get("k" * 64) is None
+
+            assert list(stream) == [b"-second"]
+            with open(cache.get("k" * 64), "rb") as f:
+                assert f.read() == b"first-second"
+            assert speech.responses[0].closed
+        finally:
+            tts_endpoint_fastapi._client = original_client
+
+
+def test_interrupted_stream_is_not_cached():
+    speech = FakeSpeech()
+    original_client = tts_endpoint_fastapi._client
+    tts_endpoint_fastapi._client = SimpleNamespace(audio=SimpleNamespace(speech=speech))
+
+    with tempfile.TemporaryDirectory() as directory:
+        cache = TTSAudioCache(directory)
+        try:
+            # Upstream fails midway
+            speech.chunks_for = lambda text: [b"partial", ConnectionError("upstream reset")]
+            stream = stream_and_cache(SpeechStream("text", "onyx", 0.8), cache.writer("e" * 64))
+            assert next(stream) == b"partial"
+            try:
+                next(stream)
+                assert False, "expected the upstream error"
+            except ConnectionError:
+                pass
+
+            # Client disconnects after the first chunk
+            speech.chunks_for = lambda text: [b"one", b"two"]
+            stream = stream_and_cache(SpeechStream("text", "onyx", 0.8), cache.writer("d" * 64))
+            next(stream)
+            stream.close()
+
+            assert cache.get("e" * 64) is None and cache.get("d" * 64) is None
+            assert [name for _, _, names in os.walk(directory) for name in names] == []
+            assert all(response.closed for response in speech.responses)
+        finally:
+            tts_endpoint_fastapi._client = original_client
+
+
+def test_unsent_response_closes_upstream():
+    """A response whose body is never iterated still releases the upstream stream"""
+    speech = FakeSpeech()
+    original_client = tts_endpoint_fastapi._client
+    tts_endpoint_fastapi._client = SimpleNamespace(audio=SimpleNamespace(speech=speech))
+
+    with tempfile.TemporaryDirectory() as directory:
+        set_tts_cache(TTSAudioCache(directory))
+        try:
+            app = FastAPI()
+            add_tts_routes(app)
+            endpoint = next(route.endpoint for route in app.routes if getattr(route, "path", None) == "/generate-tts")
+
+            async def respond_without_sending():
+                response = await endpoint(tts_endpoint_fastapi.TTSRequest(text="hello"), None)
+                await response.background()
+
+            asyncio.run(respond_without_sending())
+            assert speech.responses[0].closed
+            assert [name for _, _, names in os.walk(directory) for name in names] == []
+        finally:
+            set_tts_cache(None)
+            tts_endpoint_fastapi._client = original_client
+
+
+def test_upstream_error_before_audio():
+    """Errors from the TTS API still return a 500 rather than an empty stream"""
+    def failing_create(**kwargs):
+        raise RuntimeError("invalid voice")
+
+    original_client = tts_endpoint_fastapi._client
+    tts_endpoint_fastapi._client = SimpleNamespace(audio=SimpleNamespace(speech=SimpleNamespace(
+        with_streaming_response=SimpleNamespace(create=failing_create)
+    )))
+    with tempfile.TemporaryDirectory() as directory:
+        set_tts_cache(TTSAudioCache(directory))
+        try:
+            app = FastAPI()
+            add_tts_routes(app)
+            response = TestClient(app).post("/generate-tts", json={"text": "hello", "voice": "nobody"})
+            assert response.status_code == 500 and "invalid voice" in response.json()["detail"]
+        finally:
+            set_tts_cache(None)
+            tts_endpoint_fastapi._client = original_client
+
+
+if __name__ == "__main__":
+    test_cache_key()
+    test_put_get_and_lru_eviction()
+    test_stale_temporary_files_are_removed()
+    test_generate_tts_is_cached()
+    test_audio_streams_before_synthesis_finishes()
+    test_interrupted_stream_is_not_cached()
+    test_unsent_response_closes_upstream()
+    test_upstream_error_before_audio()
+    print("\n✅ All TTS cache tests passed")
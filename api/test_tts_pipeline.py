@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""Test sentence-chunked TTS synthesis"""
+
+import tempfile
+import threading
+import time
+from types import SimpleNamespace
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+import tts_endpoint_fastapi
+from tts_cache import TTSAudioCache, set_tts_cache, tts_cache_key
+from tts_endpoint_fastapi import add_tts_routes
+from tts_pipeline import TTSPipeline, PassageStream, split_for_tts
+
+BASMALAH = "بسم الله الرحمن الرحيم"
+
+
+class FakeSynthesizer:
+    """Synthesize as 'audio' bytes, with optional per-text delay and failures"""
+
+    def __init__(self, delays=None, failures=None):
+        self.delays = delays or {}
+        self.failures = dict(failures or {})
+        self.calls = []
+        self.active = 0
+        self.max_active = 0
+        self.lock = threading.Lock()
+
+    def __call__(self, text, voice, speed, model):
+        with self.lock:
+            self.calls.append(text)
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        try:
+            time.sleep(self.delays.get(text, 0.01))
+            if self.failures.get(text):
+                self.failures[text] -= 1
+                raise ConnectionError(f"TTS failed for {text}")
+            return f"<{text}>".encode("utf-8")
+        finally:
+            with self.lock:
+                self.active -= 1
+
+
+def test_split_at_sentences_and_verses():
+    text = f"{BASMALAH}۝ الحمد لله رب العالمين. Praise be to GOD!\nWho is the Lord? The Creator."
+    assert split_for_tts(text) == [
+        f"{BASMALAH}۝", "الحمد لله رب العالمين.", "Praise be to GOD!", "Who is the Lord?", "The Creator."
+    ]
+    assert split_for_tts("") == [] and split_for_tts("  \n ") == []
+
+
+def test_long_sentences_are_split():
+    sentence = ", ".join(f"clause number {i} of a very long sentence" for i in range(30)) + "."
+    chunks = split_for_tts(sentence, max_chars=120)
+    assert len(chunks) > 1
+    assert all(len(chunk) <= 120 for chunk in chunks)
+    # Nothing lost
+    assert " ".join(chunks).split() == sentence.split()
+
+
+def test_chunks_stream_in_order_with_bounded_concurrency():
+    chunks = [f"Sentence {i}." for i in range(10)]
+    # The first chunk is the slowest, later ones finish first
+    synthesizer = FakeSynthesizer(delays={"Sentence 0.": 0.1})
+    with tempfile.TemporaryDirectory() as directory:
+        pipeline = TTSPipeline(synthesizer, max_workers=8, concurrency=3, cache=TTSAudioCache(directory))
+        audio = list(pipeline.stream(chunks, "onyx", 0.8, "tts-1"))
+
+    assert audio == [f"<{chunk}>".encode("utf-8") for chunk in chunks]
+    assert 1 < synthesizer.max_active <= 3
+
+
+def test_shared_chunks_hit_cache():
+    synthesizer = FakeSynthesizer()
+    with tempfile.TemporaryDirectory() as directory:
+        pipeline = TTSPipeline(synthesizer, cache=TTSAudioCache(directory))
+        first = split_for_tts(f"{BASMALAH}۝ قل هو الله احد۝")
+        second = split_for_tts(f"{BASMALAH}۝ الحمد لله رب العالمين۝")
+        list(pipeline.stream(first, "onyx", 0.8, "tts-1"))
+        list(pipeline.stream(second, "onyx", 0.8, "tts-1"))
+
+    # The Basmalah was synthesized once for both passages
+    assert synthesizer.calls.count(f"{BASMALAH}۝") == 1
+    assert len(synthesizer.calls) == 3
+
+
+def test_failed_chunk_is_retried():
+    synthesizer = FakeSynthesizer(failures={"Two.": 1})
+    with tempfile.TemporaryDirectory() as directory:
+        pipeline = TTSPipeline(synthesizer, cache=TTSAudioCache(directory), attempts=2)
+        audio = list(pipeline.stream(["One.", "Two.", "Three."], "onyx", 0.8, "tts-1"))
+    assert audio == [b"<One.>", b"<Two.>", b"<Three.>"]
+    assert synthesizer.calls.count("Two.") == 2
+
+
+def test_closing_stream_cancels_pending_chunks():
+    chunks = [f"Sentence {i}." for i in range(20)]
+    synthesizer = FakeSynthesizer(delays={chunk: 0.05 for chunk in chunks})
+    with tempfile.TemporaryDirectory() as directory:
+        pipeline = TTSPipeline(synthesizer, max_workers=1, concurrency=4, cache=TTSAudioCache(directory))
+        passage = PassageStream(pipeline, chunks, "onyx", 0.8, "tts-1")
+        next(iter(passage))
+        passage.close()
+        time.sleep(0.2)
+    # Only the chunks already started ran - not the whole passage
+    assert len(synthesizer.calls) < 6, synthesizer.calls
+
+
+class StreamingSynthesizer:
+    """Synthesize in two pieces, the second only once `release` is set"""
+
+    def __init__(self):
+        self.release = threading.Event()
+        self.closed = []
+
+    def __call__(self, text, voice, speed, model):
+        try:
+            yield f"<{text}".encode("utf-8")
+            self.release.wait(2)
+            yield b">"
+        finally:
+            self.closed.append(text)
+
+
+def test_pieces_stream_before_chunk_finishes():
+    synthesizer = StreamingSynthesizer()
+    with tempfile.TemporaryDirectory() as directory:
+        cache = TTSAudioCache(directory)
+        pipeline = TTSPipeline(synthesizer, cache=cache)
+        audio = pipeline.stream(["One.", "Two."], "onyx", 0.8, "tts-1")
+        # The first piece arrives while the chunk is still being synthesized
+        assert next(audio) == b"<One."
+        synthesizer.release.set()
+        assert list(audio) == [b">", b"<Two.", b">"]
+        # Whole chunks are cached
+        with open(cache.get(tts_cache_key("One.", "onyx", 0.8, "tts-1")), "rb") as f:
+            assert f.read() == b"<One.>"
+
+
+def test_closing_passage_closes_upstream():
+    synthesizer = StreamingSynthesizer()
+    with tempfile.TemporaryDirectory() as directory:
+        cache = TTSAudioCache(directory)
+        pipeline = TTSPipeline(synthesizer, cache=cache)
+        passage = PassageStream(pipeline, ["One.", "Two."], "onyx", 0.8, "tts-1")
+        passage.close()
+        synthesizer.release.set()
+        deadline = time.time() + 2
+        while len(synthesizer.closed) < 2 and time.time() < deadline:
+            time.sleep(0.01)
+        assert sorted(synthesizer.closed) == ["One.", "Two."]
+        # Abandoned chunks are not cached
+        assert cache.stats()["clips"] == 0
+
+
+def test_generate_tts_long_passage():
+    synthesizer = FakeSynthesizer()
+    original = tts_endpoint_fastapi.tts_pipeline
+
+    with tempfile.TemporaryDirectory() as directory:
+        set_tts_cache(TTSAudioCache(directory))
+        tts_endpoint_fastapi.tts_pipeline = TTSPipeline(synthesizer)
+        try:
+            app = FastAPI()
+            add_tts_routes(app)
+            client = TestClient(app)
+            body = {"text": f"{BASMALAH}۝ قل هو الله احد۝ الله الصمد۝", "voice": "onyx", "speed": 0.8}
+
+            response = client.post("/generate-tts", json=body)
+            assert response.status_code == 200
+            assert response.content == f"<{BASMALAH}۝><قل هو الله احد۝><الله الصمد۝>".encode("utf-8")
+
+            # The whole passage is cached too, so replaying it needs no synthesis at all
+            assert client.post("/generate-tts", json=body).content == response.content
+            assert len(synthesizer.calls) == 3
+        finally:
+            set_tts_cache(None)
+            tts_endpoint_fastapi.tts_pipeline = original
+
+
+if __name__ == "__main__":
+    test_split_at_sentences_and_verses()
+    test_long_sentences_are_split()
+    test_chunks_stream_in_order_with_bounded_concurrency()
+    test_shared_chunks_hit_cache()
+    test_failed_chunk_is_retried()
+    test_closing_stream_cancels_pending_chunks()
+    test_pieces_stream_before_chunk_finishes()
+    test_closing_passage_closes_upstream()
+    test_generate_tts_long_passage()
+    print("\n✅ All TTS pipeline tests passed")
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""Test parallel loading of vector collections from local files"""
+
+import json
+import os
+import tempfile
+import threading
+import time
+
+import faiss
+import numpy as np
+
+import vector_loader
+from vector_loader import load_vectors_parallel
+
+
+def write_collection(base_dir, faiss_rel, json_rel, count, dimension=8):
+    """Write a small FAISS index and metadata list to disk"""
+    faiss_path = os.path.join(base_dir, faiss_rel)
+    json_path = os.path.join(base_dir, json_rel)
+    os.makedirs(os.path.dirname(faiss_path), exist_ok=True)
+
+    index = faiss.IndexFlatL2(dimension)
+    index.add(np.random.rand(count, dimension).astype('float32'))
+    faiss.write_index(index, faiss_path)
+
+    with open(json_path, 'w', encoding='utf-8') as f:
+        json.dump([{"content": f"item {i}"} for i in range(count)], f)
+
+
+def test_parallel_local_loading():
+    """Each collection is published through the callback as soon as it loads"""
+    with tempfile.TemporaryDirectory() as base_dir:
+        write_collection(base_dir, "FinalTestament.faiss", "FinalTestament.json", 5)
+        write_collection(base_dir, "arabic_embeddings/arabic_verses.faiss", "arabic_embeddings/arabic_verses.json", 3)
+
+        published = {}
+        lock = threading.Lock()
+
+        def on_loaded(name, collection):
+            with lock:
+                published[name] = collection
+
+        collections = load_vectors_parallel(on_loaded=on_loaded, use_cloud=False, base_dir=base_dir)
+
+        print(f"Loaded collections: {sorted(collections)}")
+        assert sorted(collections) == ["ArabicVerses", "FinalTestament"]
+        assert collections["FinalTestament"]["size"] == 5
+        assert len(collections["ArabicVerses"]["metadata"]) == 3
+
+        # Missing collections are reported with None so callers stop waiting on them
+        assert published["FinalTestament"] is collections["FinalTestament"]
+        assert published["RashadAllMedia"] is None
+        assert set(published) == set(vector_loader.get_local_vector_paths(base_dir))
+
+
+def test_collections_load_concurrently():
+    """A slow collection does not hold back the others"""
+    original = vector_loader.load_collection_from_local
+    order = []
+
+    def fake_load(name, paths):
+        if name == "RashadAllMedia":
+            time.sleep(0.3)
+        return {"index": None, "metadata": [], "size": 0}
+
+    vector_loader.load_collection_from_local = fake_load
+    try:
+        start = time.time()
+        load_vectors_parallel(on_loaded=lambda name, c: order.append(name), use_cloud=False)
+        elapsed = time.time() - start
+    finally:
+        vector_loader.load_collection_from_local = original
+
+    print(f"Load order: {order} in {elapsed:.2f}s")
+    assert order[-1] == "RashadAllMedia"
+    assert elapsed < 0.6
+
+
+def test_background_failures_are_logged():
+    """Startup work run in the executor reports its exceptions instead of dropping them"""
+    import asyncio
+    import logging
+    import vector_search_api
+
+    records = []
+
+    class Collect(logging.Handler):
+        def emit(self, record):
+            records.append(record.getMessage())
+
+    def broken():
+        raise RuntimeError("index file missing")
+
+    async def run():
+        future = vector_search_api.run_in_background(asyncio.get_running_loop(), "index build", broken)
+        await asyncio.wait([future])
+        await asyncio.sleep(0)  # Let the done callback run
+
+    handler = Collect()
+    vector_search_api.logger.addHandler(handler)
+    try:
+        asyncio.run(run())
+    finally:
+        vector_search_api.logger.removeHandler(handler)
+        vector_search_api.background_tasks.clear()
+    assert any("index build failed" in message and "index file missing" in message for message in records)
+
+
+if __name__ == "__main__":
+    test_parallel_local_loading()
+    test_collections_load_concurrently()
+    test_background_failures_are_logged()
+    print("✅ Vector loading tests passed")
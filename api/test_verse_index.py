@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+"""Test the Arabic verse index against a small synthetic corpus"""
+
+from ngram_index import NGramIndex
+from verse_index import (
+    ArabicVerseIndex, TransliterationIndex, get_arabic_verse_index, lookup_verses, selective_matches
+)
+from root_search_api import search_verses_by_root
+
+
+VERSES = [
+    {"sura_verse": "1:1", "arabic": "بِسْمِ ٱللَّهِ ٱلرَّحْمَٰنِ ٱلرَّحِيمِ", "roots": "س م و, ا ل ه, ر ح م, ر ح م",
+     "transliteration": "Bismi Allāhi alrraḥmāni alrraḥīmi", "english": "In the name of GOD, Most Gracious, Most Merciful."},
+    {"sura_verse": "1:2", "arabic": "ٱلْحَمْدُ لِلَّهِ رَبِّ ٱلْعَٰلَمِينَ", "roots": "ح م د, ا ل ه, ر ب ب, ع ل م",
+     "transliteration": "Alḥamdu lillāhi rabbi alʿālamīna", "english": "Praise be to GOD, Lord of the universe."},
+    {"sura_verse": "112:1", "arabic": "قُلْ هُوَ ٱللَّهُ أَحَدٌ", "roots": "ق و ل, -, ا ل ه, ا ح د",
+     "transliteration": "Qul huwa Allāhu aḥadun", "english": "Say, \"He is the One and only GOD."},
+    {"sura_verse": "112:2", "arabic": "ٱللَّهُ ٱلصَّمَدُ", "roots": "ا ل ه, ص م د",
+     "transliteration": "Allāhu alṣṣamadu", "english": "\"The Absolute GOD."},
+    {"sura_verse": "2:163", "arabic": "وَإِلَٰهُكُمْ إِلَٰهٌ وَٰحِدٌ لَّآ إِلَٰهَ إِلَّا هُوَ ٱلرَّحْمَٰنُ ٱلرَّحِيمُ", "roots": "ا ل ه, ا ل ه, و ح د",
+     "transliteration": "Wa-ilāhukum ilāhun wāḥidun lā ilāha illā huwa alrraḥmānu alrraḥīmu", "english": "Your god is one god."},
+]
+
+
+def refs(verses):
+    return [verse["sura_verse"] for verse in verses]
+
+
+def test_ngram_index():
+    """Candidates contain every query trigram, fuzzy search ranks by overlap"""
+    index = NGramIndex(n=3)
+    for text in ["hello world", "help wanted", "yellow"]:
+        index.add(text)
+
+    assert index.candidates(index.grams("hello")) == [0]
+    assert index.candidates(index.grams("hel", pad_end=False)) == [0, 1]
+    assert index.candidates(index.grams("missing")) == []
+
+    results = index.search("helo", min_score=0.4)
+    assert results[0][0] == 0
+    print(f"✅ n-gram search: {results}")
+
+
+def test_arabic_verse_index():
+    """Exact, prefix and fuzzy matching ignore diacritics and alif variants"""
+    index = ArabicVerseIndex(VERSES)
+
+    # The normalized column has no diacritics and folds alif wasla
+    assert index.normalized_arabic[2] == "قل هو الله احد"
+
+    # Exact phrase, typed without diacritics and with a different alif
+    assert refs(index.exact("قل هو الله أحد")) == ["112:1"]
+    assert refs(index.exact("الرحيم")) == ["1:1", "2:163"]
+    # Whole words only - "الله" is not part of "لله"
+    assert refs(index.exact("الله")) == ["1:1", "112:1", "112:2"]
+
+    # As-you-type: last word incomplete
+    assert refs(index.prefix("قل هو ال")) == ["112:1"]
+    assert refs(index.prefix("الصم")) == ["112:2"]
+
+    # Fuzzy tolerates a missing letter
+    fuzzy = index.fuzzy("الحمد لله رب العلمين")
+    assert fuzzy and fuzzy[0][0]["sura_verse"] == "1:2"
+
+    # Non-Arabic queries that are not known transliterations have no Arabic match
+    assert index.search("hello") == []
+
+    # Combined search: exact matches first, no duplicates
+    results = index.search("الرحيم", limit=10)
+    assert [r["match_type"] for r in results[:2]] == ["exact", "exact"]
+    assert len(refs(r["verse"] for r in results)) == len(set(refs(r["verse"] for r in results)))
+    print(f"✅ Arabic verse index: {[(r['verse']['sura_verse'], r['match_type']) for r in results]}")
+
+
+def test_arabic_search_type():
+    """/verses/search with search_type 'arabic' uses the index, built once per corpus"""
+    result = search_verses_by_root(VERSES, "قل هو", search_type="arabic", limit=5)
+    assert refs(result["verses"]) == ["112:1"]
+    assert result["search_info"]["match_types"] == ["exact"]
+
+    assert get_arabic_verse_index(VERSES) is get_arabic_verse_index(VERSES)
+
+    # Root search is unchanged
+    result = search_verses_by_root(VERSES, "ص م د", search_type="root")
+    assert refs(result["verses"]) == ["112:2"]
+
+
+def test_transliteration_index():
+    """Transliterated queries resolve regardless of spelling, spacing and accents"""
+    index = TransliterationIndex(VERSES)
+
+    for query in ["qul huwallahu ahad", "Kul huwa allahu ahadun", "kulhu"]:
+        results = index.search(query)
+        assert results and results[0]["verse"]["sura_verse"] == "112:1", query
+        print(f"✅ '{query}' → {[(r['verse']['sura_verse'], r['score']) for r in results]}")
+
+    assert index.search("alhamdulillah rabbil alamin")[0]["verse"]["sura_verse"] == "1:2"
+    assert index.search("bismi allahi al rahman")[0]["verse"]["sura_verse"] == "1:1"
+    # Too short to be meaningful
+    assert index.search("ku") == []
+
+    # lookup_verses routes by script
+    assert lookup_verses(VERSES, "qul huwa")[0]["match_type"] == "transliteration"
+    assert lookup_verses(VERSES, "قل هو")[0]["match_type"] == "exact"
+
+    result = search_verses_by_root(VERSES, "kul hu wallahu", search_type="transliteration", limit=3)
+    assert result["verses"][0]["sura_verse"] == "112:1"
+
+
+def test_search_resolves_transliteration_locally():
+    """/search answers ArabicVerses from the local index without creating an embedding"""
+    from fastapi.testclient import TestClient
+    import vector_search_api
+
+    class NoEmbeddings:
+        @property
+        def embeddings(self):
+            raise AssertionError("embedding API should not be called")
+
+    import asyncio
+
+    on_event_loop = []
+
+    def recording_lookup(*args, **kwargs):
+        try:
+            asyncio.get_running_loop()
+            on_event_loop.append(True)
+        except RuntimeError:
+            on_event_loop.append(False)
+        return lookup_verses(*args, **kwargs)
+
+    original = vector_search_api.client, vector_search_api.QURAN_VERSES_DATA, vector_search_api.lookup_verses
+    vector_search_api.client = NoEmbeddings()
+    vector_search_api.QURAN_VERSES_DATA = VERSES
+    vector_search_api.lookup_verses = recording_lookup
+    try:
+        response = TestClient(vector_search_api.app).post("/search", json={
+            "query": "qul huwallahu ahad",
+            "include_rashad_media": False,
+            "include_final_testament": False,
+            "include_qurantalk": False,
+            "include_newsletters": False,
+            "include_appendices": False
+        })
+    finally:
+        vector_search_api.client, vector_search_api.QURAN_VERSES_DATA, vector_search_api.lookup_verses = original
+
+    assert response.status_code == 200, response.text
+    results = response.json()["results"]
+    assert results[0]["collection"] == "ArabicVerses"
+    assert results[0]["title"].startswith("[112:1]")
+    # Scaled to rank alongside embedding similarities, which stay below 1
+    assert results[0]["similarity_score"] == vector_search_api.LOCAL_MATCH_SCORE_WEIGHT
+    # The lookup (and any index build it waits for) runs off the event loop
+    assert on_event_loop == [False]
+
+
+def test_common_words_are_not_resolved_locally():
+    """Short or common words fully match many verses - they go to semantic search instead"""
+    for query in ["allah", "huwa", "ilah", "rabbi", "alrahman", "الله"]:
+        assert selective_matches(query, lookup_verses(VERSES, query, limit=4), 0.8) == [], query
+    for query, expected in [("qul huwallahu ahad", "112:1"), ("bismi allahi al rahman", "1:1"), ("قل هو", "112:1")]:
+        matches = selective_matches(query, lookup_verses(VERSES, query, limit=4), 0.8)
+        assert [match["verse"]["sura_verse"] for match in matches] == [expected], query
+
+    from fastapi.testclient import TestClient
+    import vector_search_api
+
+    original = vector_search_api.client, vector_search_api.QURAN_VERSES_DATA
+    vector_search_api.client = object()
+    vector_search_api.QURAN_VERSES_DATA = VERSES
+    try:
+        response = TestClient(vector_search_api.app).post("/search", json={
+            "query": "Allah", "include_rashad_media": False, "include_final_testament": False,
+            "include_qurantalk": False, "include_newsletters": False, "include_appendices": False
+        })
+    finally:
+        vector_search_api.client, vector_search_api.QURAN_VERSES_DATA = original
+    # No local matches - ArabicVerses is left to the embedding search (not loaded here)
+    assert response.status_code == 200, response.text
+    assert response.json()["results"] == []
+
+
+def test_verses_search_runs_off_the_event_loop():
+    """/verses/search lookups may wait for the startup index build, so they don't hold the loop"""
+    from fastapi.testclient import TestClient
+    import asyncio
+    import vector_search_api
+
+    on_event_loop = []
+
+    def recording_search(**kwargs):
+        try:
+            asyncio.get_running_loop()
+            on_event_loop.append(True)
+        except RuntimeError:
+            on_event_loop.append(False)
+        return search_verses_by_root(**kwargs)
+
+    original = vector_search_api.QURAN_VERSES_DATA, vector_search_api.search_verses_by_root
+    vector_search_api.QURAN_VERSES_DATA = VERSES
+    vector_search_api.search_verses_by_root = recording_search
+    try:
+        client = TestClient(vector_search_api.app)
+        for search_type in ["arabic", "transliteration"]:
+            response = client.post("/verses/search", json={"query": "qul huwa", "search_type": search_type})
+            assert response.status_code == 200, response.text
+    finally:
+        vector_search_api.QURAN_VERSES_DATA, vector_search_api.search_verses_by_root = original
+    assert on_event_loop == [False, False]
+
+
+if __name__ == "__main__":
+    test_ngram_index()
+    test_arabic_verse_index()
+    test_arabic_search_type()
+    test_transliteration_index()
+    test_search_resolves_transliteration_locally()
+    test_common_words_are_not_resolved_locally()
+    test_verses_search_runs_off_the_event_loop()
+    print("\n✅ All verse index tests passed")
@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+"""Test durable, queued, idempotent Stripe webhook processing with locally signed events"""
+
+import asyncio
+import os
+import tempfile
+import time
+
+import httpx
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+import stripe_config
+from payment_endpoints import router, subscription_cache, webhook_queue
+import subscription_store
+from subscription_store import (
+    MemorySubscriptionStore,
+    SQLiteSubscriptionStore,
+    SubscriptionStoreError,
+    set_subscription_store
+)
+from test_subscription_cache import WEBHOOK_SECRET, signed_event
+from test_subscription_store import FakePostgREST
+from webhook_queue import APPLIED, FAILED, QUEUED, WebhookQueue
+
+CHECKOUT = {"customer": "cus_9", "subscription": "sub_9", "customer_details": {"email": "payer@example.com"}}
+
+
+class FlakyHandler:
+    """Fails the first `failures` calls for each event"""
+
+    def __init__(self, failures=0):
+        self.failures = failures
+        self.attempts = {}
+        self.applied = []
+
+    async def __call__(self, event):
+        self.attempts[event["id"]] = self.attempts.get(event["id"], 0) + 1
+        if self.attempts[event["id"]] <= self.failures:
+            raise ConnectionError("database unavailable")
+        self.applied.append(event["id"])
+
+
+def event(event_id):
+    return {"id": event_id, "type": "checkout.session.completed"}
+
+
+def make_queue(handler, store=None, **kwargs):
+    store = store or MemorySubscriptionStore()
+    return WebhookQueue(handler, lambda: store, **kwargs), store
+
+
+def test_duplicates_are_applied_once():
+    handler = FlakyHandler()
+    queue, store = make_queue(handler, backoff=0)
+
+    async def run():
+        assert await queue.enqueue(event("evt_1"))
+        assert not await queue.enqueue(event("evt_1"))  # While queued
+        assert await queue.enqueue(event("evt_2"))
+        await queue.join()
+        assert not await queue.enqueue(event("evt_1"))  # After it was applied
+        await queue.stop()
+
+    asyncio.run(run())
+    assert handler.applied == ["evt_1", "evt_2"]
+    assert queue.stats()["duplicates"] == 2 and queue.stats()["applied"] == 2
+    assert {event_id: row["status"] for event_id, row in store.events.items()} == {"evt_1": "applied", "evt_2": "applied"}
+
+
+def test_failures_are_retried_with_backoff():
+    handler = FlakyHandler(failures=2)
+    queue, store = make_queue(handler, max_attempts=3, backoff=0.01)
+
+    async def run():
+        await queue.enqueue(event("evt_1"))
+        started = time.perf_counter()
+        await queue.join()
+        return time.perf_counter() - started
+
+    elapsed = asyncio.run(run())
+    assert handler.applied == ["evt_1"] and handler.attempts["evt_1"] == 3
+    # Waited 0.01s, then 0.02s
+    assert elapsed >= 0.03
+    assert queue.stats()["retries"] == 2
+    assert store.events["evt_1"]["status"] == "applied" and store.events["evt_1"]["attempts"] == 3
+
+
+def test_exhausted_event_is_kept_as_dead_letter():
+    handler = FlakyHandler(failures=2)
+    queue, store = make_queue(handler, max_attempts=2, backoff=0)
+
+    async def run():
+        await queue.enqueue(event("evt_1"))
+        await queue.join()
+        assert handler.applied == [] and queue.stats()["failed"] == 1
+        failed = await store.find_webhook_events(FAILED)
+        assert [row["id"] for row in failed] == ["evt_1"]
+        assert "database unavailable" in failed[0]["last_error"]
+        # Stripe's next delivery is accepted and applied
+        assert await queue.enqueue(event("evt_1"))
+        await queue.join()
+
+    asyncio.run(run())
+    assert handler.applied == ["evt_1"]
+    assert store.events["evt_1"]["status"] == "applied"
+
+
+def test_unapplied_events_survive_a_restart():
+    """Events acknowledged but not applied when the process stopped are applied at the next start"""
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "subscriptions.db")
+
+        async def first_run():
+            blocked = asyncio.Event()
+
+            async def never_finishes(event):
+                await blocked.wait()
+
+            store = SQLiteSubscriptionStore(path)
+            queue, _ = make_queue(never_finishes, store)
+            assert await queue.enqueue(event("evt_1"))
+            assert await queue.enqueue(event("evt_2"))
+            await queue.stop(timeout=0.05)
+            await store.close()
+
+        asyncio.run(first_run())
+
+        handler = FlakyHandler()
+        store = SQLiteSubscriptionStore(path)
+        queue, _ = make_queue(handler, store, backoff=0)
+
+        async def second_run():
+            # Stripe redelivering an event recorded by the first run queues it, and only once
+            assert await queue.enqueue(event("evt_1"))
+            assert await queue.recover() == 1
+            await queue.join()
+            assert await store.find_webhook_events(QUEUED) == []
+            assert len(await store.find_webhook_events(APPLIED)) == 2
+            await store.close()
+
+        asyncio.run(second_run())
+        assert handler.applied == ["evt_1", "evt_2"]
+
+
+class LostInsertResponse(FakePostgREST):
+    """Commits the first webhook event insert, then times out before answering"""
+
+    def __init__(self):
+        super().__init__()
+        self.lost = False
+
+    async def handle_events(self, request, params):
+        response = await super().handle_events(request, params)
+        if request.method == "POST" and not self.lost:
+            self.lost = True
+            raise httpx.ReadTimeout("timed out", request=request)
+        return response
+
+
+def test_event_is_queued_when_the_insert_response_is_lost():
+    """A retried insert finds the event already recorded - it is still queued, not skipped"""
+    original_backoff = subscription_store.RETRY_BACKOFF_SECONDS
+    subscription_store.RETRY_BACKOFF_SECONDS = 0
+    server = LostInsertResponse()
+    store = server.client()
+    handler = FlakyHandler()
+    queue, _ = make_queue(handler, store, backoff=0)
+
+    async def run():
+        assert await queue.enqueue(event("evt_1"))
+        await queue.join()
+        # Stripe's redelivery of the applied event is still a duplicate
+        assert not await queue.enqueue(event("evt_1"))
+        await queue.stop()
+        await store.close()
+
+    try:
+        asyncio.run(run())
+    finally:
+        subscription_store.RETRY_BACKOFF_SECONDS = original_backoff
+    assert server.lost and handler.applied == ["evt_1"]
+    assert server.store.events["evt_1"]["status"] == APPLIED
+    assert queue.stats()["duplicates"] == 1
+
+
+class SlowUpserts(MemorySubscriptionStore):
+    """Subscription writes take `upsert_latency` seconds, recording events doesn't"""
+
+    def __init__(self, upsert_latency):
+        super().__init__()
+        self.upsert_latency = upsert_latency
+
+    async def upsert(self, row):
+        await asyncio.sleep(self.upsert_latency)
+        return await super().upsert(row)
+
+
+class BrokenEventTable(MemorySubscriptionStore):
+    async def record_webhook_event(self, event, status):
+        raise SubscriptionStoreError("POST stripe_webhook_events failed: 503")
+
+
+def test_webhook_answers_before_the_database_write():
+    store = SlowUpserts(upsert_latency=0.5)
+    set_subscription_store(store)
+    subscription_cache.clear()
+    original_secret = stripe_config.STRIPE_WEBHOOK_SECRET
+    stripe_config.STRIPE_WEBHOOK_SECRET = WEBHOOK_SECRET
+    app = FastAPI()
+    app.include_router(router)
+    try:
+        with TestClient(app) as client:
+            payload, headers = signed_event("checkout.session.completed", CHECKOUT)
+            started = time.perf_counter()
+            response = client.post("/api/payment/webhook", content=payload, headers=headers)
+            assert time.perf_counter() - started < 0.4
+            assert response.json() == {"status": "success", "queued": True}
+
+            # Stripe retrying the same event
+            response = client.post("/api/payment/webhook", content=payload, headers=headers)
+            assert response.json() == {"status": "success", "queued": False}
+
+            client.portal.call(webhook_queue.join)
+            assert store.calls.count("upsert") == 1
+            assert [row["email"] for row in store.rows] == ["payer@example.com"]
+            assert [row["status"] for row in store.events.values()] == ["applied"]
+
+            # Signed with another secret
+            payload, headers = signed_event("checkout.session.completed", CHECKOUT, secret="whsec_other")
+            assert client.post("/api/payment/webhook", content=payload, headers=headers).status_code == 400
+            client.portal.call(webhook_queue.join)
+            assert store.calls.count("upsert") == 1
+    finally:
+        stripe_config.STRIPE_WEBHOOK_SECRET = original_secret
+        set_subscription_store(None)
+        subscription_cache.clear()
+
+
+def test_webhook_fails_when_the_event_cannot_be_recorded():
+    """Stripe only gets a 2xx once the event is stored, so it keeps retrying otherwise"""
+    store = BrokenEventTable()
+    set_subscription_store(store)
+    original_secret = stripe_config.STRIPE_WEBHOOK_SECRET
+    stripe_config.STRIPE_WEBHOOK_SECRET = WEBHOOK_SECRET
+    app = FastAPI()
+    app.include_router(router)
+    try:
+        with TestClient(app) as client:
+            payload, headers = signed_event("checkout.session.completed", CHECKOUT)
+            response = client.post("/api/payment/webhook", content=payload, headers=headers)
+            assert response.status_code == 503
+            client.portal.call(webhook_queue.join)
+            assert store.calls.count("upsert") == 0
+    finally:
+        stripe_config.STRIPE_WEBHOOK_SECRET = original_secret
+        set_subscription_store(None)
+        subscription_cache.clear()
+
+
+if __name__ == "__main__":
+    test_duplicates_are_applied_once()
+    test_failures_are_retried_with_backoff()
+    test_exhausted_event_is_kept_as_dead_letter()
+    test_unapplied_events_survive_a_restart()
+    test_event_is_queued_when_the_insert_response_is_lost()
+    test_webhook_answers_before_the_database_write()
+    test_webhook_fails_when_the_event_cannot_be_recorded()
+    print("\n✅ All webhook queue tests passed")
@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+Speech-to-text for /transcribe-audio
+The upload is passed to Whisper as a (filename, file, content type) tuple straight from
+the spooled upload buffer - no full read into memory and no extra temporary file - and
+oversized uploads are rejected before their body is parsed. Uploads that can be decoded
+are first trimmed to 16kHz mono speech (see audio_preprocess), and transcripts are cached
+by a hash of the audio sent plus the language, so re-uploading the same query is instant.
+"""
+
+import hashlib
+import io
+import logging
+import os
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse
+
+from audio_preprocess import TRANSCRIBE_PREPROCESS, can_decode, preprocess_audio
+from ttl_cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+# Whisper rejects files over 25MB
+TRANSCRIBE_MAX_UPLOAD_BYTES = int(float(os.getenv("TRANSCRIBE_MAX_UPLOAD_MB", "25")) * 1024 * 1024)
+WHISPER_MODEL = "whisper-1"
+TRANSCRIPTION_CACHE_TTL_SECONDS = int(os.getenv("TRANSCRIPTION_CACHE_TTL_SECONDS", "3600"))
+TRANSCRIPTION_CACHE_MAX_ENTRIES = int(os.getenv("TRANSCRIPTION_CACHE_MAX_ENTRIES", "1024"))
+HASH_CHUNK_SIZE = 1024 * 1024
+
+# Whisper detects the format from the file extension
+CONTENT_TYPE_EXTENSIONS = [
+    ('mp4', '.mp4'),
+    ('mp4a', '.mp4'),
+    ('m4a', '.m4a'),
+    ('wav', '.wav'),
+    ('mpeg', '.mp3'),
+    ('mp3', '.mp3'),
+    ('ogg', '.ogg'),
+]
+DEFAULT_EXTENSION = '.webm'
+
+# Transcripts by audio fingerprint and language
+transcription_cache = TTLCache(maxsize=TRANSCRIPTION_CACHE_MAX_ENTRIES, ttl=TRANSCRIPTION_CACHE_TTL_SECONDS)
+
+def upload_too_large():
+    return HTTPException(
+        status_code=413,
+        detail=f"Audio file too large (max {TRANSCRIBE_MAX_UPLOAD_BYTES // (1024 * 1024)}MB)"
+    )
+
+class UploadSizeLimitMiddleware:
+    """
+    Rejects request bodies over max_bytes on the given paths
+    Uses Content-Length when present; otherwise counts bytes as they are received and
+    stops once the limit is passed, so an oversized upload is never fully read.
+    """
+
+    def __init__(self, app, paths, max_bytes=TRANSCRIBE_MAX_UPLOAD_BYTES):
+        self.app = app
+        self.paths = set(paths)
+        self.max_bytes = max_bytes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST" or scope["path"] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+
+        content_length = dict(scope["headers"]).get(b"content-length")
+        if content_length and content_length.isdigit() and int(content_length) > self.max_bytes:
+            error = upload_too_large()
+            response = JSONResponse({"detail": error.detail}, status_code=error.status_code)
+            await response(scope, receive, send)
+            return
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    # Raised while the form is parsed - FastAPI turns it into the 413 response
+                    raise upload_too_large()
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+def upload_filename(filename, content_type):
+    """Filename with an extension Whisper recognizes"""
+    if filename and os.path.splitext(filename)[1]:
+        return filename
+    extension = DEFAULT_EXTENSION
+    for marker, candidate in CONTENT_TYPE_EXTENSIONS:
+        if content_type and marker in content_type:
+            extension = candidate
+            break
+    return f"{os.path.splitext(filename or 'audio')[0]}{extension}"
+
+def upload_size(file):
+    """Size of a file object, leaving it at the start"""
+    file.seek(0, os.SEEK_END)
+    size = file.tell()
+    file.seek(0)
+    return size
+
+def prepare_upload(file, filename, content_type, preprocess=None):
+    """
+    (file, filename, content_type) to send to Whisper (blocking - run it off the event loop)
+    Decodable uploads are replaced by their trimmed 16kHz mono re-encoding when that is
+    smaller; anything else, or audio that fails to decode, is sent as uploaded.
+    """
+    if preprocess is None:
+        preprocess = TRANSCRIBE_PREPROCESS
+    if not preprocess or not can_decode(filename, content_type):
+        return file, filename, content_type
+
+    file.seek(0)
+    processed = preprocess_audio(file.read(), filename, content_type)
+    file.seek(0)
+    if processed is None:
+        return file, filename, content_type
+
+    logger.info(
+        f"🎚️ Preprocessed {filename}: {processed.original_bytes} -> {len(processed.data)} bytes, "
+        f"{processed.original_seconds:.1f}s -> {processed.seconds:.1f}s"
+    )
+    return io.BytesIO(processed.data), processed.filename, processed.content_type
+
+def transcription_cache_key(file, language=None):
+    """
+    sha256 of the audio that will be sent to Whisper (after preprocessing) plus the
+    language (blocking). The file is left at the start.
+    """
+    digest = hashlib.sha256()
+    file.seek(0)
+    for chunk in iter(lambda: file.read(HASH_CHUNK_SIZE), b""):
+        digest.update(chunk)
+    file.seek(0)
+    return f"{digest.hexdigest()}:{language or 'auto'}"
+
+def transcribe_file(client, file, filename, content_type=None, language=None):
+    """
+    Transcribe an audio file object with Whisper (blocking - run it off the event loop)
+    language: "ar", "en", ... or None to auto-detect
+    """
+    params = {
+        "model": WHISPER_MODEL,
+        "file": (upload_filename(filename, content_type), file, content_type or "application/octet-stream"),
+        "response_format": "text"
+    }
+    if language:
+        params["language"] = language
+
+    transcript = client.audio.transcriptions.create(**params)
+
+    # Handle both string and object responses
+    if isinstance(transcript, str):
+        return transcript
+    return transcript.text if hasattr(transcript, 'text') else str(transcript)
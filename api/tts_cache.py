@@ -0,0 +1,285 @@
+#!/usr/bin/env python3
+"""
+Content-addressed disk cache for synthesized TTS audio
+Audio is keyed by a hash of (text, voice, speed, model), so the same verse played by any
+user is synthesized once. The cache is bounded by total size with least-recently-used
+eviction, and the key doubles as the response ETag.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger("TTS_API")
+
+TTS_CACHE_DIR = os.getenv("TTS_CACHE_DIR", os.path.join(os.path.dirname(__file__), 'tts_cache'))
+TTS_CACHE_MAX_BYTES = int(os.getenv("TTS_CACHE_MAX_MB", "500")) * 1024 * 1024
+# Audio rendered ahead of time by prerender_verse_audio.py - never evicted
+TTS_PRERENDER_DIR = os.getenv("TTS_PRERENDER_DIR", os.path.join(os.path.dirname(__file__), 'tts_prerendered'))
+AUDIO_EXTENSION = ".mp3"
+TEMP_EXTENSION = ".tmp"
+# Temporary files older than this were left by an interrupted write (another worker
+# process may still be writing younger ones to a shared directory)
+TTS_CACHE_STALE_TEMP_SECONDS = int(os.getenv("TTS_CACHE_STALE_TEMP_SECONDS", "3600"))
+MANIFEST_NAME = "manifest.json"
+
+def tts_cache_key(text, voice, speed, model):
+    """Content hash of everything that changes the synthesized audio"""
+    payload = json.dumps([model, voice, round(float(speed), 3), text], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def audio_path(directory, key):
+    """Where the audio for key lives in a cache directory"""
+    return os.path.join(directory, key[:2], key + AUDIO_EXTENSION)
+
+def etag_for(key):
+    return f'"{key}"'
+
+def etag_matches(if_none_match, key):
+    """Whether an If-None-Match header value matches the audio for key"""
+    if not if_none_match:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    tags = [tag[2:] if tag.startswith("W/") else tag for tag in tags]
+    return "*" in tags or etag_for(key) in tags
+
+class TTSAudioCache:
+    """
+    Audio files under directory/<key[:2]>/<key>.mp3
+    Writes go to a temporary file that is renamed into place (see CacheWriter), so readers
+    never see a partial file. Recency is kept in memory and in file mtimes (for restarts).
+    """
+
+    def __init__(self, directory=TTS_CACHE_DIR, max_bytes=TTS_CACHE_MAX_BYTES):
+        """max_bytes: size bound, or None for no eviction"""
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # key -> size, least recently used first
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self._scan()
+
+    def _scan(self):
+        """Index files left by a previous run, oldest first, and delete stale temporary files"""
+        found = []
+        removed = 0
+        stale_before = time.time() - TTS_CACHE_STALE_TEMP_SECONDS
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                    if name.endswith(TEMP_EXTENSION) and stat.st_mtime < stale_before:
+                        os.remove(path)
+                        removed += 1
+                        continue
+                except OSError:
+                    continue
+                if name.endswith(AUDIO_EXTENSION):
+                    found.append((stat.st_mtime, name[:-len(AUDIO_EXTENSION)], stat.st_size))
+        if removed:
+            logger.info(f"🧹 Removed {removed} interrupted writes from the TTS cache")
+        for _, key, size in sorted(found):
+            self._entries[key] = size
+            self._total_bytes += size
+        if found:
+            logger.info(f"✅ TTS cache: {len(found)} clips, {self._total_bytes / 1024 / 1024:.1f}MB")
+
+    def path_for(self, key):
+        return audio_path(self.directory, key)
+
+    def get(self, key):
+        """Path of the cached audio for key, or None"""
+        path = self.path_for(key)
+        with self._lock:
+            if key not in self._entries or not os.path.exists(path):
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return path
+
+    def put(self, key, data):
+        """Store audio bytes for key"""
+        writer = self.writer(key)
+        try:
+            writer.write(data)
+            writer.commit()
+        finally:
+            writer.abort()
+
+    def writer(self, key):
+        """CacheWriter for audio that arrives in chunks"""
+        return CacheWriter(self, key)
+
+    def _commit(self, key, temp_path):
+        """Move a finished temporary file into place and evict down to the size bound"""
+        size = os.path.getsize(temp_path)
+        os.replace(temp_path, self.path_for(key))
+        with self._lock:
+            self._total_bytes += size - self._entries.pop(key, 0)
+            self._entries[key] = size
+            evicted = []
+            while self.max_bytes is not None and self._total_bytes > self.max_bytes and len(self._entries) > 1:
+                old_key, old_size = self._entries.popitem(last=False)
+                self._total_bytes -= old_size
+                evicted.append(old_key)
+        for old_key in evicted:
+            try:
+                os.remove(self.path_for(old_key))
+            except OSError:
+                pass
+        if evicted:
+            logger.info(f"🧹 Evicted {len(evicted)} clips from the TTS cache")
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "clips": len(self._entries),
+            "bytes": self._total_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0
+        }
+
+class CacheWriter:
+    """
+    Writes audio for one key to a temporary file as it arrives
+    commit() moves it into the cache. abort() (a no-op after commit) deletes it, so an
+    interrupted stream never leaves a truncated clip in the cache.
+    """
+
+    def __init__(self, cache, key):
+        self.cache = cache
+        self.key = key
+        directory = os.path.dirname(cache.path_for(key))
+        os.makedirs(directory, exist_ok=True)
+        fd, self.temp_path = tempfile.mkstemp(dir=directory, suffix=TEMP_EXTENSION)
+        self._file = os.fdopen(fd, "wb")
+        self._done = False
+
+    def write(self, chunk):
+        self._file.write(chunk)
+
+    def commit(self):
+        self._file.close()
+        self.cache._commit(self.key, self.temp_path)
+        self._done = True
+
+    def abort(self):
+        if self._done:
+            return
+        self._done = True
+        self._file.close()
+        try:
+            os.remove(self.temp_path)
+        except OSError:
+            pass
+
+def load_manifest(directory):
+    """Manifest of pre-rendered clips in directory ({"clips": {key: info}})"""
+    path = os.path.join(directory, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return {"clips": {}}
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def save_manifest(directory, manifest):
+    """Write the manifest atomically, so an interrupted run leaves the previous one intact"""
+    os.makedirs(directory, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=1)
+    os.replace(temp_path, os.path.join(directory, MANIFEST_NAME))
+
+class PrerenderedAudio:
+    """
+    Clips listed in a pre-render manifest, checked before the cache and the TTS API
+    The manifest is loaded again when its modification time changes, so clips from a
+    pre-render run are served without a restart.
+    """
+
+    def __init__(self, directory=TTS_PRERENDER_DIR):
+        self.directory = directory
+        self.keys = set()
+        self._mtime = -1  # Not loaded yet (None: no manifest)
+        self._lock = threading.Lock()
+        self._reload_if_changed()
+        if self.keys:
+            logger.info(f"✅ {len(self.keys)} pre-rendered TTS clips available")
+
+    def _reload_if_changed(self):
+        try:
+            mtime = os.stat(os.path.join(self.directory, MANIFEST_NAME)).st_mtime_ns
+        except OSError:
+            mtime = None
+        if mtime == self._mtime:
+            return
+        with self._lock:
+            if mtime == self._mtime:
+                return
+            try:
+                self.keys = set(load_manifest(self.directory)["clips"])
+            except Exception as e:
+                logger.error(f"❌ Could not load pre-rendered audio manifest: {e}")
+                self.keys = set()
+            if self._mtime != -1:
+                logger.info(f"🔄 Reloaded pre-rendered audio manifest ({len(self.keys)} clips)")
+            self._mtime = mtime
+
+    def get(self, key):
+        """Path of the pre-rendered audio for key, or None"""
+        self._reload_if_changed()
+        if key not in self.keys:
+            return None
+        path = audio_path(self.directory, key)
+        return path if os.path.exists(path) else None
+
+_cache = None
+_prerendered = None
+_cache_lock = threading.Lock()
+
+def get_tts_cache():
+    """
+    Shared cache, created on first use
+    Creating it walks the cache directory - call from the executor, not the event loop
+    (the API builds it at startup).
+    """
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = TTSAudioCache()
+    return _cache
+
+def set_tts_cache(cache):
+    """Replace the shared cache (tests, or a cache on a mounted disk)"""
+    global _cache
+    _cache = cache
+
+def get_prerendered_audio():
+    """Pre-rendered clips, manifest loaded on first use"""
+    global _prerendered
+    if _prerendered is None:
+        with _cache_lock:
+            if _prerendered is None:
+                _prerendered = PrerenderedAudio()
+    return _prerendered
+
+def set_prerendered_audio(prerendered):
+    """Replace the pre-rendered clips (tests, or clips in another directory)"""
+    global _prerendered
+    _prerendered = prerendered
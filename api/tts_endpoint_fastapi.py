@@ -1,56 +1,179 @@
-from fastapi import HTTPException
-from fastapi.responses import StreamingResponse
+from fastapi import HTTPException, Header
+from fastapi.responses import FileResponse, Response, StreamingResponse
 from pydantic import BaseModel
-import openai
+from starlette.background import BackgroundTask
+from typing import Optional
+import asyncio
 import os
-import io
+import threading
 import logging
+from tts_cache import get_tts_cache, get_prerendered_audio, tts_cache_key, etag_for, etag_matches
+from tts_pipeline import TTSPipeline, PassageStream, split_for_tts
 
 logger = logging.getLogger("TTS_API")
 
+TTS_MODEL = "tts-1"
+# Bytes forwarded to the client per chunk as synthesis streams in
+TTS_CHUNK_SIZE = 16 * 1024
+
 class TTSRequest(BaseModel):
     text: str
     voice: str = "onyx"
     speed: float = 0.8
 
+_client = None
+_client_lock = threading.Lock()
+
+def get_openai_client():
+    """OpenAI client shared by all TTS requests, so connections are reused"""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                import openai
+                _client = openai.OpenAI(api_key=os.environ.get('OPENAI_API_KEY'))
+    return _client
+
+def synthesize(text, voice, speed, model=TTS_MODEL, client=None):
+    """Synthesize speech and return the MP3 bytes"""
+    response = (client or get_openai_client()).audio.speech.create(
+        model=model,
+        voice=voice,
+        input=text,
+        speed=speed
+    )
+    return b"".join(response.iter_bytes())
+
+def synthesize_stream(text, voice, speed, model=TTS_MODEL, client=None):
+    """Synthesize speech, yielding the MP3 bytes as they arrive (closing ends the request)"""
+    with (client or get_openai_client()).audio.speech.with_streaming_response.create(
+        model=model,
+        voice=voice,
+        input=text,
+        speed=speed
+    ) as response:
+        yield from response.iter_bytes(TTS_CHUNK_SIZE)
+
+class SpeechStream:
+    """
+    Audio chunks from the TTS API as they are synthesized
+    The request is sent on construction, so API errors surface before any audio is sent.
+    """
+
+    def __init__(self, text, voice, speed, model=TTS_MODEL):
+        self._manager = get_openai_client().audio.speech.with_streaming_response.create(
+            model=model,
+            voice=voice,
+            input=text,
+            speed=speed
+        )
+        self._response = self._manager.__enter__()
+        self._closed = False
+        self._lock = threading.Lock()
+
+    def __iter__(self):
+        return self._response.iter_bytes(TTS_CHUNK_SIZE)
+
+    def close(self):
+        """Close the upstream response (once, from any thread)"""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+        try:
+            self._manager.__exit__(None, None, None)
+        except Exception as e:
+            logger.warning(f"⚠️ Error closing TTS stream: {e}")
+
+def stream_and_cache(speech, writer=None):
+    """Forward audio chunks to the client while writing them to the cache (if writer)"""
+    try:
+        for chunk in speech:
+            if writer:
+                writer.write(chunk)
+            yield chunk
+        if writer:
+            writer.commit()
+    except Exception as e:
+        logger.error(f"TTS stream interrupted: {str(e)}")
+        raise
+    finally:
+        # Client disconnects and upstream errors leave nothing in the cache
+        if writer:
+            writer.abort()
+        speech.close()
+
+def close_stream(speech, writer=None):
+    """
+    Release the upstream stream and the cache writer after the response
+    Runs even if the response body was never iterated (the client went away first)
+    """
+    if writer:
+        writer.abort()
+    speech.close()
+
+# Long passages are synthesized in sentence chunks with the shared client, each chunk
+# forwarded as it streams in
+tts_pipeline = TTSPipeline(synthesize_stream)
+
+def cached_audio(cache, key):
+    """Path of pre-rendered or cached audio for key, or None"""
+    return get_prerendered_audio().get(key) or cache.get(key)
+
+def audio_headers(key):
+    # Same text, voice and speed always give the same audio, so clients may keep it
+    return {
+        "Content-Disposition": 'inline; filename="chunk.mp3"',
+        "Cache-Control": "public, max-age=86400",
+        "ETag": etag_for(key)
+    }
+
 def add_tts_routes(app):
     """Add TTS generation endpoint to the FastAPI app"""
-    
+
     @app.post("/generate-tts")
-    async def generate_tts(request: TTSRequest):
+    async def generate_tts(request: TTSRequest, if_none_match: Optional[str] = Header(None)):
         try:
             if not request.text:
                 raise HTTPException(status_code=400, detail="No text provided")
-            
-            # Initialize OpenAI client
-            client = openai.OpenAI(api_key=os.environ.get('OPENAI_API_KEY'))
-            
+
+            key = tts_cache_key(request.text, request.voice, request.speed, TTS_MODEL)
+            headers = audio_headers(key)
+
+            # The client already has this audio
+            if etag_matches(if_none_match, key):
+                return Response(status_code=304, headers=headers)
+
+            # Cache lookups touch the disk (and the first one scans it) - keep them off the loop
+            loop = asyncio.get_running_loop()
+            cache = await loop.run_in_executor(None, get_tts_cache)
+            cached_path = await loop.run_in_executor(None, cached_audio, cache, key)
+            if cached_path:
+                logger.info(f"♻️ Serving cached TTS for text: {request.text[:50]}...")
+                return FileResponse(cached_path, media_type="audio/mpeg", headers=headers)
+
             logger.info(f"Generating TTS for text: {request.text[:50]}...")
-            
-            # Generate speech
-            response = client.audio.speech.create(
-                model="tts-1",
-                voice=request.voice,
-                input=request.text,
-                speed=request.speed
-            )
-            
-            # Convert to bytes
-            audio_bytes = io.BytesIO()
-            for chunk in response.iter_bytes():
-                audio_bytes.write(chunk)
-            audio_bytes.seek(0)
-            
-            # Return audio file as streaming response
-            return StreamingResponse(
-                audio_bytes,
-                media_type="audio/mpeg",
-                headers={
-                    "Content-Disposition": 'inline; filename="chunk.mp3"',
-                    "Cache-Control": "public, max-age=3600"
-                }
-            )
-            
+
+            # Start synthesis off the event loop, then stream audio as it arrives
+            chunks = split_for_tts(request.text)
+            if len(chunks) > 1:
+                # Long passages: sentence chunks synthesized concurrently, each cached on its own
+                speech = await loop.run_in_executor(
+                    None, PassageStream, tts_pipeline, chunks, request.voice, request.speed, TTS_MODEL
+                )
+            else:
+                speech = await loop.run_in_executor(None, SpeechStream, request.text, request.voice, request.speed)
+            try:
+                writer = await loop.run_in_executor(None, cache.writer, key)
+            except Exception as e:
+                logger.error(f"❌ Could not cache TTS audio: {e}")
+                writer = None
+
+            return StreamingResponse(stream_and_cache(speech, writer), media_type="audio/mpeg", headers=headers,
+                                     background=BackgroundTask(close_stream, speech, writer))
+
+        except HTTPException:
+            raise
         except Exception as e:
             logger.error(f"TTS generation error: {str(e)}")
-            raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+            raise HTTPException(status_code=500, detail=str(e))
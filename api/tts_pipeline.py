@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+"""
+Sentence-chunked TTS synthesis for long passages
+Text is split at sentence and verse boundaries, chunks are synthesized concurrently
+(a bounded number ahead of playback) and streamed back in order. Each chunk is cached on
+its own, so chunks shared between passages (e.g. the Basmalah) are synthesized once.
+"""
+
+import logging
+import os
+import queue
+import re
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from tts_cache import get_tts_cache, get_prerendered_audio, tts_cache_key
+
+logger = logging.getLogger("TTS_API")
+
+# Longest chunk sent to the TTS API - longer sentences are split at commas or spaces
+TTS_MAX_CHUNK_CHARS = int(os.getenv("TTS_MAX_CHUNK_CHARS", "400"))
+# Chunks synthesized ahead of the one being played, per request
+TTS_CHUNK_CONCURRENCY = int(os.getenv("TTS_CHUNK_CONCURRENCY", "4"))
+# Chunk synthesis requests across all requests
+TTS_MAX_WORKERS = int(os.getenv("TTS_MAX_WORKERS", "8"))
+TTS_CHUNK_ATTEMPTS = 3
+
+# After sentence punctuation (Latin and Arabic) or the end-of-ayah sign, or at line breaks
+SENTENCE_BOUNDARY = re.compile(r'(?<=[.!?؟۔۝])\s+|\s*\n\s*')
+# Clause boundaries used to split sentences that are too long
+CLAUSE_BOUNDARY = re.compile(r'(?<=[,;:،؛])\s+')
+
+def _split_long(sentence, max_chars):
+    """Split a sentence at clause boundaries, then spaces, into pieces of at most max_chars"""
+    pieces = []
+    current = ""
+    for part in CLAUSE_BOUNDARY.split(sentence):
+        for word in ([part] if len(part) <= max_chars else part.split()):
+            candidate = f"{current} {word}" if current else word
+            if len(candidate) <= max_chars:
+                current = candidate
+                continue
+            if current:
+                pieces.append(current)
+            # A single word longer than max_chars is sent as is
+            current = word
+    if current:
+        pieces.append(current)
+    return pieces
+
+def split_for_tts(text, max_chars=TTS_MAX_CHUNK_CHARS):
+    """Chunks of text at sentence/verse boundaries, none longer than max_chars"""
+    chunks = []
+    for sentence in SENTENCE_BOUNDARY.split(text or ""):
+        sentence = sentence.strip()
+        if not sentence:
+            continue
+        if len(sentence) <= max_chars:
+            chunks.append(sentence)
+        else:
+            chunks.extend(_split_long(sentence, max_chars))
+    return chunks
+
+class ChunkAudio:
+    """
+    Audio of one chunk, handed from the thread synthesizing it to the reader piece by piece
+    Iterating yields the pieces as they arrive and re-raises the synthesis error, if any.
+    """
+
+    _END = object()
+
+    def __init__(self):
+        self._pieces = queue.Queue()
+
+    def put(self, piece):
+        self._pieces.put(piece)
+
+    def finish(self, error=None):
+        self._pieces.put(error if error is not None else self._END)
+
+    def __iter__(self):
+        while True:
+            piece = self._pieces.get()
+            if piece is self._END:
+                return
+            if isinstance(piece, Exception):
+                raise piece
+            yield piece
+
+class TTSPipeline:
+    """
+    Synthesizes chunks on a shared thread pool and yields their audio in order
+    synthesize(text, voice, speed, model) -> MP3 bytes, or an iterator of MP3 pieces as
+    they arrive from the TTS API (passed on to the client as they arrive)
+    """
+
+    def __init__(self, synthesize, max_workers=TTS_MAX_WORKERS, concurrency=TTS_CHUNK_CONCURRENCY,
+                 cache=None, attempts=TTS_CHUNK_ATTEMPTS):
+        self.synthesize = synthesize
+        self.concurrency = concurrency
+        self.attempts = attempts
+        self._cache = cache
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="tts")
+
+    @property
+    def cache(self):
+        return self._cache if self._cache is not None else get_tts_cache()
+
+    def chunk_audio(self, text, voice, speed, model, audio=None, stop=None):
+        """
+        Audio for one chunk, pre-rendered, from the cache or synthesized (retried on failure)
+        Pieces are also passed to audio (a ChunkAudio) as they arrive. Synthesis is abandoned,
+        and nothing cached, once stop (a threading.Event) is set.
+        """
+        cache = self.cache
+        key = tts_cache_key(text, voice, speed, model)
+        path = get_prerendered_audio().get(key) or cache.get(key)
+        if path:
+            try:
+                with open(path, "rb") as f:
+                    data = f.read()
+                if audio is not None:
+                    audio.put(data)
+                return data
+            except OSError:
+                pass  # Evicted meanwhile - synthesize again
+
+        for attempt in range(1, self.attempts + 1):
+            pieces = []
+            try:
+                if self._synthesize_into(pieces, text, voice, speed, model, audio, stop):
+                    break
+                return None
+            except Exception as e:
+                # Pieces already sent to the client can't be taken back
+                if attempt == self.attempts or (pieces and audio is not None):
+                    raise
+                logger.warning(f"⚠️ TTS chunk failed (attempt {attempt}), retrying: {e}")
+                time.sleep(0.5 * attempt)
+
+        data = b"".join(pieces)
+        try:
+            cache.put(key, data)
+        except Exception as e:
+            logger.error(f"❌ Could not cache TTS chunk: {e}")
+        return data
+
+    def _synthesize_into(self, pieces, text, voice, speed, model, audio, stop):
+        """Collect the synthesized pieces, passing them on to audio; False if stopped"""
+        result = self.synthesize(text, voice, speed, model)
+        stream = [result] if isinstance(result, bytes) else result
+        try:
+            for piece in stream:
+                if stop is not None and stop.is_set():
+                    return False
+                pieces.append(piece)
+                if audio is not None:
+                    audio.put(piece)
+            return True
+        finally:
+            # Closes the upstream response of a streamed synthesis
+            close = getattr(stream, "close", None)
+            if close is not None:
+                close()
+
+    def _produce(self, text, voice, speed, model, audio, stop):
+        if stop.is_set():
+            audio.finish()
+            return
+        try:
+            self.chunk_audio(text, voice, speed, model, audio, stop)
+        except Exception as e:
+            audio.finish(e)
+        else:
+            audio.finish()
+
+    def stream(self, chunks, voice, speed, model, stop=None):
+        """
+        Yield the audio of each chunk in order, each piece as soon as it is synthesized
+        Up to `concurrency` chunks are in flight at a time; closing the generator or setting
+        stop (e.g. the client disconnected) cancels the chunks that haven't started and
+        abandons those being synthesized
+        """
+        stop = stop or threading.Event()
+        pending = deque()
+        next_chunk = 0
+        try:
+            while (next_chunk < len(chunks) or pending) and not stop.is_set():
+                while next_chunk < len(chunks) and len(pending) < self.concurrency:
+                    audio = ChunkAudio()
+                    future = self._executor.submit(self._produce, chunks[next_chunk], voice, speed, model, audio, stop)
+                    pending.append((future, audio))
+                    next_chunk += 1
+                _, audio = pending.popleft()
+                yield from audio
+        finally:
+            stop.set()
+            for future, _ in pending:
+                future.cancel()
+
+class PassageStream:
+    """
+    Ordered audio for a passage's chunks, iterated like SpeechStream
+    The first piece is synthesized on construction, so errors surface before any audio is sent.
+    close() may be called from another thread while the stream is being iterated.
+    """
+
+    def __init__(self, pipeline, chunks, voice, speed, model):
+        self._stop = threading.Event()
+        self._audio = pipeline.stream(chunks, voice, speed, model, self._stop)
+        self._first = next(self._audio)
+
+    def __iter__(self):
+        yield self._first
+        yield from self._audio
+
+    def close(self):
+        self._stop.set()
+        try:
+            self._audio.close()
+        except ValueError:
+            pass  # Being iterated in another thread - it stops after the current piece
@@ -7,8 +7,8 @@ import os
 import json
 import requests
 import logging
-from typing import Dict, Optional
-import faiss
+from typing import Callable, Dict, Optional
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 
 logger = logging.getLogger("VectorLoader")
@@ -48,6 +48,8 @@ VECTOR_URLS = {
     }
 }
 
+COLLECTION_NAMES = list(VECTOR_URLS.keys())
+
 # Alternative: Use environment variables for URLs
 def get_vector_urls():
     """Get vector URLs from environment variables or defaults"""
@@ -82,6 +84,11 @@ def get_vector_urls():
         }
     }
 
+def read_faiss_index(path: str):
+    """Read a FAISS index, importing faiss on first use to keep API startup fast"""
+    import faiss
+    return faiss.read_index(str(path))
+
 def download_file(url: str, destination: str) -> bool:
     """Download a file from URL to destination"""
     try:
@@ -126,210 +133,216 @@ def download_file(url: str, destination: str) -> bool:
         logger.error(f"Error type: {type(e).__name__}")
         return False
 
-def load_vectors_from_cloud(cache_dir: str = "./vector_cache") -> Dict:
-    """Load vector collections, downloading from cloud if necessary"""
-    vector_collections = {}
-    vector_urls = get_vector_urls()
-    
-    logger.info(f"Loading vectors from cloud with cache directory: {cache_dir}")
-    logger.info(f"Current working directory: {os.getcwd()}")
-    
-    # Create cache directory
-    cache_path = Path(cache_dir)
-    cache_path.mkdir(exist_ok=True, parents=True)
-    logger.info(f"Cache directory created/verified: {cache_path.absolute()}")
+def load_collection_from_cloud(name: str, urls: Dict, cache_path: Path) -> Optional[Dict]:
+    """Load a single collection, downloading it into the cache if necessary"""
+    logger.info(f"\nProcessing {name}...")
+    logger.info(f"  FAISS URL: {urls['faiss']}")
+    logger.info(f"  JSON URL: {urls['json']}")
     
-    for name, urls in vector_urls.items():
-        logger.info(f"\nProcessing {name}...")
-        logger.info(f"  FAISS URL: {urls['faiss']}")
-        logger.info(f"  JSON URL: {urls['json']}")
+    try:
+        # Define local cache paths
+        if name == "ArabicVerses":
+            # Special handling for Arabic verses - use original filename
+            faiss_path = cache_path / "arabic_verses.faiss"
+            json_path = cache_path / "arabic_verses.json"
+        else:
+            faiss_path = cache_path / f"{name}.faiss"
+            json_path = cache_path / f"{name}.json"
         
-        try:
-            # Define local cache paths
-            if name == "ArabicVerses":
-                # Special handling for Arabic verses - use original filename
-                faiss_path = cache_path / "arabic_verses.faiss"
-                json_path = cache_path / "arabic_verses.json"
-            else:
-                faiss_path = cache_path / f"{name}.faiss"
-                json_path = cache_path / f"{name}.json"
-            
-            # Download if not cached
-            if not faiss_path.exists():
-                logger.info(f"  FAISS file not in cache, downloading...")
-                if not download_file(urls["faiss"], str(faiss_path)):
-                    logger.warning(f"Failed to download {name} FAISS index")
-                    # For ArabicVerses, try to load from local embeddings if available
-                    if name == "ArabicVerses":
-                        local_faiss = Path("./arabic_embeddings/arabic_verses.faiss")
-                        local_json = Path("./arabic_embeddings/arabic_verses.json") 
-                        if local_faiss.exists() and local_json.exists():
-                            logger.info(f"  Using local Arabic embeddings as fallback")
-                            faiss_path = local_faiss
-                            json_path = local_json
-                        else:
-                            continue
+        # Download if not cached
+        if not faiss_path.exists():
+            logger.info(f"  FAISS file not in cache, downloading...")
+            if not download_file(urls["faiss"], str(faiss_path)):
+                logger.warning(f"Failed to download {name} FAISS index")
+                # For ArabicVerses, try to load from local embeddings if available
+                if name == "ArabicVerses":
+                    local_faiss = Path("./arabic_embeddings/arabic_verses.faiss")
+                    local_json = Path("./arabic_embeddings/arabic_verses.json") 
+                    if local_faiss.exists() and local_json.exists():
+                        logger.info(f"  Using local Arabic embeddings as fallback")
+                        faiss_path = local_faiss
+                        json_path = local_json
                     else:
-                        continue
-            else:
-                logger.info(f"  FAISS file found in cache: {faiss_path}")
-            
-            if not json_path.exists():
-                logger.info(f"  JSON file not in cache, downloading...")
-                if not download_file(urls["json"], str(json_path)):
-                    logger.warning(f"Failed to download {name} metadata")
-                    # For ArabicVerses, try to load from local embeddings if available
-                    if name == "ArabicVerses":
-                        local_faiss = Path("./arabic_embeddings/arabic_verses.faiss")
-                        local_json = Path("./arabic_embeddings/arabic_verses.json") 
-                        if local_faiss.exists() and local_json.exists():
-                            logger.info(f"  Using local Arabic embeddings as fallback")
-                            faiss_path = local_faiss
-                            json_path = local_json
-                        else:
-                            continue
+                        return None
+                else:
+                    return None
+        else:
+            logger.info(f"  FAISS file found in cache: {faiss_path}")
+        
+        if not json_path.exists():
+            logger.info(f"  JSON file not in cache, downloading...")
+            if not download_file(urls["json"], str(json_path)):
+                logger.warning(f"Failed to download {name} metadata")
+                # For ArabicVerses, try to load from local embeddings if available
+                if name == "ArabicVerses":
+                    local_faiss = Path("./arabic_embeddings/arabic_verses.faiss")
+                    local_json = Path("./arabic_embeddings/arabic_verses.json") 
+                    if local_faiss.exists() and local_json.exists():
+                        logger.info(f"  Using local Arabic embeddings as fallback")
+                        faiss_path = local_faiss
+                        json_path = local_json
                     else:
-                        continue
-            else:
-                logger.info(f"  JSON file found in cache: {json_path}")
+                        return None
+                else:
+                    return None
+        else:
+            logger.info(f"  JSON file found in cache: {json_path}")
+        
+        # Load from cache
+        if faiss_path.exists() and json_path.exists():
+            logger.info(f"  Loading FAISS index...")
+            index = read_faiss_index(str(faiss_path))
+            logger.info(f"  Loading metadata from {json_path}")
+            logger.info(f"  JSON file size: {os.path.getsize(json_path) / (1024*1024):.2f} MB")
             
-            # Load from cache
-            if faiss_path.exists() and json_path.exists():
-                logger.info(f"  Loading FAISS index...")
-                index = faiss.read_index(str(faiss_path))
-                logger.info(f"  Loading metadata from {json_path}")
-                logger.info(f"  JSON file size: {os.path.getsize(json_path) / (1024*1024):.2f} MB")
+            with open(json_path, 'r', encoding='utf-8') as f:
+                # Read raw content first to check
+                content = f.read()
+                logger.info(f"  JSON content length: {len(content)} characters")
                 
-                with open(json_path, 'r', encoding='utf-8') as f:
-                    # Read raw content first to check
-                    content = f.read()
-                    logger.info(f"  JSON content length: {len(content)} characters")
-                    
-                    # Parse JSON
-                    data = json.loads(content)
+                # Parse JSON
+                data = json.loads(content)
+            
+            # Handle different JSON structures
+            if isinstance(data, dict) and "texts" in data:
+                # Handle different collection formats
+                texts = data.get("texts", [])
+                metadata = []
                 
-                # Handle different JSON structures
-                if isinstance(data, dict) and "texts" in data:
-                    # Handle different collection formats
-                    texts = data.get("texts", [])
-                    metadata = []
-                    
-                    if name == "QuranTalkArticles" and "metadata" in data:
-                        # QuranTalkArticles has separate metadata
-                        meta_list = data.get("metadata", [])
-                        for i, text in enumerate(texts):
-                            if i < len(meta_list):
-                                meta = meta_list[i]
-                                metadata.append({
-                                    "content": text,
-                                    "title": meta.get("title", f"Article {i}"),
-                                    "url": meta.get("url", ""),
-                                    "source": "QuranTalk"
-                                })
-                            else:
-                                metadata.append({
-                                    "content": text,
-                                    "title": f"Article {i}",
-                                    "source": "QuranTalk"
-                                })
-                    elif name == "FinalTestament":
-                        # FinalTestament contains verses
-                        for i, text in enumerate(texts):
-                            # Try to extract verse reference from text
+                if name == "QuranTalkArticles" and "metadata" in data:
+                    # QuranTalkArticles has separate metadata
+                    meta_list = data.get("metadata", [])
+                    for i, text in enumerate(texts):
+                        if i < len(meta_list):
+                            meta = meta_list[i]
                             metadata.append({
                                 "content": text,
-                                "text": text,
-                                "verse_ref": f"Verse {i}",
-                                "title": f"Verse {i}"
+                                "title": meta.get("title", f"Article {i}"),
+                                "url": meta.get("url", ""),
+                                "source": "QuranTalk"
                             })
-                    elif name == "Newsletters":
-                        # Newsletters - use the scraped data structure
-                        for i, text in enumerate(texts):
+                        else:
                             metadata.append({
                                 "content": text,
-                                "title": f"Newsletter {i+1}",
-                                "source": "Rashad Khalifa Newsletters",
-                                "id": i
+                                "title": f"Article {i}",
+                                "source": "QuranTalk"
                             })
-                    elif name == "ArabicVerses":
-                        # ArabicVerses - use the verse metadata from the separate metadata array
-                        verse_metadata_list = data.get("metadata", [])
-                        for i, text in enumerate(texts):
-                            if i < len(verse_metadata_list):
-                                verse_meta = verse_metadata_list[i]
-                                metadata.append(verse_meta)
-                            else:
-                                # Fallback if metadata is missing
-                                metadata.append({
-                                    "content": text,
-                                    "arabic": text,
-                                    "title": f"Arabic Verse {i+1}",
-                                    "sura_verse": f"Unknown:{i+1}",
-                                    "verse_index": i
-                                })
-                    elif name == "FootnotesSubtitles":
-                        # FootnotesSubtitles - use the metadata from the separate metadata array
-                        metadata_list = data.get("metadata", [])
-                        for i, text in enumerate(texts):
-                            if i < len(metadata_list):
-                                meta = metadata_list[i]
-                                metadata.append(meta)
-                            else:
-                                # Fallback if metadata is missing
-                                metadata.append({
-                                    "content": text,
-                                    "type": "unknown",
-                                    "title": f"Text {i+1}",
-                                    "id": i
-                                })
-                    else:
-                        # RashadAllMedia or default format
-                        for i, text in enumerate(texts):
+                elif name == "FinalTestament":
+                    # FinalTestament contains verses
+                    for i, text in enumerate(texts):
+                        # Try to extract verse reference from text
+                        metadata.append({
+                            "content": text,
+                            "text": text,
+                            "verse_ref": f"Verse {i}",
+                            "title": f"Verse {i}"
+                        })
+                elif name == "Newsletters":
+                    # Newsletters - use the scraped data structure
+                    for i, text in enumerate(texts):
+                        metadata.append({
+                            "content": text,
+                            "title": f"Newsletter {i+1}",
+                            "source": "Rashad Khalifa Newsletters",
+                            "id": i
+                        })
+                elif name == "ArabicVerses":
+                    # ArabicVerses - use the verse metadata from the separate metadata array
+                    verse_metadata_list = data.get("metadata", [])
+                    for i, text in enumerate(texts):
+                        if i < len(verse_metadata_list):
+                            verse_meta = verse_metadata_list[i]
+                            metadata.append(verse_meta)
+                        else:
+                            # Fallback if metadata is missing
+                            metadata.append({
+                                "content": text,
+                                "arabic": text,
+                                "title": f"Arabic Verse {i+1}",
+                                "sura_verse": f"Unknown:{i+1}",
+                                "verse_index": i
+                            })
+                elif name == "FootnotesSubtitles":
+                    # FootnotesSubtitles - use the metadata from the separate metadata array
+                    metadata_list = data.get("metadata", [])
+                    for i, text in enumerate(texts):
+                        if i < len(metadata_list):
+                            meta = metadata_list[i]
+                            metadata.append(meta)
+                        else:
+                            # Fallback if metadata is missing
                             metadata.append({
                                 "content": text,
-                                "title": f"{name} - Item {i+1}",
+                                "type": "unknown",
+                                "title": f"Text {i+1}",
                                 "id": i
                             })
-                            
-                elif isinstance(data, list):
-                    # Handle newsletter format or regular list
-                    if name == "Newsletters" and len(data) > 0 and isinstance(data[0], dict) and 'title' in data[0]:
-                        # Newsletter format with full metadata
-                        metadata = data
-                    elif name == "ArabicVerses" and len(data) > 0 and isinstance(data[0], dict) and 'sura_verse' in data[0]:
-                        # Arabic verses format with verse metadata
-                        metadata = data
-                    else:
-                        # Regular list format
-                        metadata = data
                 else:
-                    logger.warning(f"  Unexpected JSON structure for {name}: {type(data)}")
-                    metadata = []
-                
-                logger.info(f"  Parsed {len(metadata)} metadata entries")
-                
-                vector_collections[name] = {
-                    "index": index,
-                    "metadata": metadata,
-                    "size": index.ntotal
-                }
-                logger.info(f"✅ Loaded {name}: {index.ntotal} vectors, {len(metadata)} metadata")
+                    # RashadAllMedia or default format
+                    for i, text in enumerate(texts):
+                        metadata.append({
+                            "content": text,
+                            "title": f"{name} - Item {i+1}",
+                            "id": i
+                        })
+                        
+            elif isinstance(data, list):
+                # Handle newsletter format or regular list
+                if name == "Newsletters" and len(data) > 0 and isinstance(data[0], dict) and 'title' in data[0]:
+                    # Newsletter format with full metadata
+                    metadata = data
+                elif name == "ArabicVerses" and len(data) > 0 and isinstance(data[0], dict) and 'sura_verse' in data[0]:
+                    # Arabic verses format with verse metadata
+                    metadata = data
+                else:
+                    # Regular list format
+                    metadata = data
             else:
-                logger.error(f"  Files not found after download attempt")
+                logger.warning(f"  Unexpected JSON structure for {name}: {type(data)}")
+                metadata = []
             
-        except Exception as e:
-            logger.error(f"Error loading {name}: {e}")
-            logger.error(f"Error type: {type(e).__name__}")
-            import traceback
-            logger.error(traceback.format_exc())
+            logger.info(f"  Parsed {len(metadata)} metadata entries")
+            
+            logger.info(f"✅ Loaded {name}: {index.ntotal} vectors, {len(metadata)} metadata")
+            return {
+                "index": index,
+                "metadata": metadata,
+                "size": index.ntotal
+            }
+        else:
+            logger.error(f"  Files not found after download attempt")
+        
+    except Exception as e:
+        logger.error(f"Error loading {name}: {e}")
+        logger.error(f"Error type: {type(e).__name__}")
+        import traceback
+        logger.error(traceback.format_exc())
     
-    logger.info(f"\nTotal collections loaded: {len(vector_collections)}")
-    return vector_collections
+    return None
 
-def load_vectors_from_local(base_dir: str = ".") -> Dict:
-    """Load vector collections from local files (fallback)"""
+def load_vectors_from_cloud(cache_dir: str = "./vector_cache") -> Dict:
+    """Load vector collections, downloading from cloud if necessary"""
     vector_collections = {}
+    vector_urls = get_vector_urls()
+    
+    logger.info(f"Loading vectors from cloud with cache directory: {cache_dir}")
+    logger.info(f"Current working directory: {os.getcwd()}")
+    
+    # Create cache directory
+    cache_path = Path(cache_dir)
+    cache_path.mkdir(exist_ok=True, parents=True)
+    logger.info(f"Cache directory created/verified: {cache_path.absolute()}")
     
+    for name, urls in vector_urls.items():
+        collection = load_collection_from_cloud(name, urls, cache_path)
+        if collection:
+            vector_collections[name] = collection
+    
+    logger.info(f"\nTotal collections loaded: {len(vector_collections)}")
+    return vector_collections
+
+def get_local_vector_paths(base_dir: str = ".") -> Dict:
+    """Get local file paths for each collection"""
     local_paths = {
         "RashadAllMedia": {
             "faiss": os.path.join(base_dir, "data/RashadAllMedia.faiss"),
@@ -369,36 +382,102 @@ def load_vectors_from_local(base_dir: str = ".") -> Dict:
             # Use vector_cache if files exist there
             local_paths[name] = paths
     
-    for name, paths in local_paths.items():
-        try:
-            if os.path.exists(paths["faiss"]) and os.path.exists(paths["json"]):
-                logger.info(f"Loading {name} from local files...")
-                index = faiss.read_index(paths["faiss"])
-                with open(paths["json"], 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                
-                # Handle different JSON structures
-                if isinstance(data, dict) and "metadata" in data:
-                    # ArabicVerses format with separate metadata
-                    metadata = data.get("metadata", [])
-                    logger.info(f"  Using metadata array with {len(metadata)} entries")
-                elif isinstance(data, list):
-                    # Direct list format
-                    metadata = data
-                    logger.info(f"  Using direct list with {len(metadata)} entries")
-                else:
-                    logger.warning(f"  Unexpected JSON structure for {name}: {type(data)}")
-                    metadata = []
-                
-                vector_collections[name] = {
-                    "index": index,
-                    "metadata": metadata,
-                    "size": index.ntotal
-                }
-                logger.info(f"✅ Loaded {name} from local: {index.ntotal} vectors, {len(metadata)} metadata")
-        except Exception as e:
-            logger.error(f"Error loading local {name}: {e}")
+    return local_paths
+
+def load_collection_from_local(name: str, paths: Dict) -> Optional[Dict]:
+    """Load a single collection from local files"""
+    try:
+        if os.path.exists(paths["faiss"]) and os.path.exists(paths["json"]):
+            logger.info(f"Loading {name} from local files...")
+            index = read_faiss_index(paths["faiss"])
+            with open(paths["json"], 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            
+            # Handle different JSON structures
+            if isinstance(data, dict) and "metadata" in data:
+                # ArabicVerses format with separate metadata
+                metadata = data.get("metadata", [])
+                logger.info(f"  Using metadata array with {len(metadata)} entries")
+            elif isinstance(data, list):
+                # Direct list format
+                metadata = data
+                logger.info(f"  Using direct list with {len(metadata)} entries")
+            else:
+                logger.warning(f"  Unexpected JSON structure for {name}: {type(data)}")
+                metadata = []
+            
+            logger.info(f"✅ Loaded {name} from local: {index.ntotal} vectors, {len(metadata)} metadata")
+            return {
+                "index": index,
+                "metadata": metadata,
+                "size": index.ntotal
+            }
+    except Exception as e:
+        logger.error(f"Error loading local {name}: {e}")
+    
+    return None
+
+def load_vectors_from_local(base_dir: str = ".") -> Dict:
+    """Load vector collections from local files (fallback)"""
+    vector_collections = {}
+    
+    for name, paths in get_local_vector_paths(base_dir).items():
+        collection = load_collection_from_local(name, paths)
+        if collection:
+            vector_collections[name] = collection
+    
+    return vector_collections
+
+def load_vectors_parallel(on_loaded: Optional[Callable[[str, Dict], None]] = None,
+                          use_cloud: bool = True,
+                          cache_dir: str = "./vector_cache",
+                          base_dir: str = ".",
+                          max_workers: Optional[int] = None) -> Dict:
+    """
+    Load all collections concurrently, one worker per collection.
+    Each collection is tried in cloud storage first (if enabled), then local files.
+    on_loaded is called from the worker thread as soon as a collection is ready,
+    so callers can make it searchable before the slower collections finish
+    (it is called with None for collections that could not be loaded).
+    """
+    vector_urls = get_vector_urls() if use_cloud else {}
+    local_paths = get_local_vector_paths(base_dir)
+    names = list(vector_urls) + [name for name in local_paths if name not in vector_urls]
+    
+    cache_path = Path(cache_dir)
+    if use_cloud:
+        cache_path.mkdir(exist_ok=True, parents=True)
+    
+    def load_one(name: str) -> Optional[Dict]:
+        collection = None
+        if name in vector_urls:
+            collection = load_collection_from_cloud(name, vector_urls[name], cache_path)
+        if not collection and name in local_paths:
+            collection = load_collection_from_local(name, local_paths[name])
+        return collection
+    
+    vector_collections = {}
+    with ThreadPoolExecutor(max_workers=max_workers or len(names) or 1, thread_name_prefix="vector-loader") as executor:
+        futures = {executor.submit(load_one, name): name for name in names}
+        for future in as_completed(futures):
+            name = futures[future]
+            try:
+                collection = future.result()
+            except Exception as e:
+                logger.error(f"Error loading {name}: {e}")
+                collection = None
+            
+            if not collection:
+                logger.warning(f"⚠️ Could not load {name} from any source")
+                if on_loaded:
+                    on_loaded(name, None)
+                continue
+            
+            vector_collections[name] = collection
+            if on_loaded:
+                on_loaded(name, collection)
     
+    logger.info(f"Total collections loaded: {len(vector_collections)}")
     return vector_collections
 
 # Cloud storage options:
@@ -445,7 +524,7 @@ def load_from_s3(bucket: str, cache_dir: str = "./vector_cache") -> Dict:
                 s3.download_file(bucket, files["json"], str(json_path))
             
             # Load from cache
-            index = faiss.read_index(str(faiss_path))
+            index = read_faiss_index(str(faiss_path))
             with open(json_path, 'r', encoding='utf-8') as f:
                 metadata = json.load(f)
             
@@ -481,7 +560,7 @@ def load_from_huggingface(repo_id: str = "your-username/quran-vectors", cache_di
             json_path = hf_hub_download(repo_id, files[1], cache_dir=cache_dir)
             
             # Load files
-            index = faiss.read_index(faiss_path)
+            index = read_faiss_index(faiss_path)
             with open(json_path, 'r', encoding='utf-8') as f:
                 metadata = json.load(f)
             
@@ -9,41 +9,68 @@ from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from typing import List, Dict, Optional
 import numpy as np
-import faiss
 import json
+import asyncio
+import hashlib
+from functools import partial
 import os
-import openai
-from openai import OpenAI
 import logging
-from vector_loader import load_vectors_from_cloud, load_vectors_from_local
+from vector_loader import load_vectors_parallel, COLLECTION_NAMES
 from youtube_mapper import youtube_mapper
 from verses_loader import load_verses_data
 from subtitle_ranges import get_cached_verse_range, get_subtitle_for_range
 from arabic_utils import enhance_arabic_search_query, is_arabic_text, get_phonetic_variations
 from tts_endpoint_fastapi import add_tts_routes
-from payment_endpoints import router as payment_router
+from tts_cache import get_tts_cache
+from payment_endpoints import router as payment_router, warm_up_payment_dependencies, webhook_queue
 from root_search_api import search_verses_by_root, RootSearchRequest, RootSearchResponse
+from verse_index import SELECTIVE_MAX_CANDIDATES, build_verse_indexes, lookup_verses, selective_matches
 from enhanced_debate_endpoint import create_enhanced_debate_endpoint
+from debate_streaming import stream_debate_response, stream_cached_response
+from debater_rules import get_system_prompt
+import conversation_context
+from conversation_context import build_chat_messages, load_tokenizer
+from conversation_store import resolve_conversation, record_turn
+import semantic_cache
+from transcription import (
+    TRANSCRIBE_MAX_UPLOAD_BYTES,
+    UploadSizeLimitMiddleware,
+    prepare_upload,
+    transcribe_file,
+    transcription_cache,
+    transcription_cache_key,
+    upload_size,
+    upload_too_large
+)
 
 # Setup logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("VectorSearchAPI")
 
-# Load Quran verse mapping and verses data
+# Quran verse mapping and verses data are loaded in parallel on startup
 QURAN_VERSE_MAPPING = None
 QURAN_VERSES_DATA = None
-try:
-    mapping_path = os.path.join(os.path.dirname(__file__), 'quran_verse_mapping.json')
-    if os.path.exists(mapping_path):
-        with open(mapping_path, 'r', encoding='utf-8') as f:
-            mapping_data = json.load(f)
-            QURAN_VERSE_MAPPING = mapping_data['verse_mapping']
-            logger.info(f"Loaded Quran verse mapping with {len(QURAN_VERSE_MAPPING)} verses")
-except Exception as e:
-    logger.warning(f"Could not load Quran verse mapping: {e}")
 
-# Load verses data using the dedicated loader
-QURAN_VERSES_DATA = load_verses_data()
+# Local Arabic/transliteration matches at or above this score replace the ArabicVerses embedding
+# search, when they are selective (see verse_index.selective_matches)
+LOCAL_MATCH_MIN_SCORE = 0.8
+# Local scores are trigram overlap, up to 1.0, while embedding similarities (1 / (1 + distance))
+# stay below 1 - scaled so an exact local match ranks like a close embedding match
+LOCAL_MATCH_SCORE_WEIGHT = 0.75
+
+def load_quran_verse_mapping():
+    """Load the FinalTestament index -> verse reference mapping"""
+    try:
+        mapping_path = os.path.join(os.path.dirname(__file__), 'quran_verse_mapping.json')
+        if os.path.exists(mapping_path):
+            with open(mapping_path, 'r', encoding='utf-8') as f:
+                mapping_data = json.load(f)
+                verse_mapping = mapping_data['verse_mapping']
+                logger.info(f"Loaded Quran verse mapping with {len(verse_mapping)} verses")
+                return verse_mapping
+    except Exception as e:
+        logger.warning(f"Could not load Quran verse mapping: {e}")
+    return None
 
 # Initialize FastAPI
 app = FastAPI(
@@ -52,6 +79,9 @@ app = FastAPI(
     version="1.0.0"
 )
 
+# Reject oversized voice uploads before they are read (added first so CORS headers still apply)
+app.add_middleware(UploadSizeLimitMiddleware, paths=["/transcribe-audio"])
+
 # Add CORS middleware - MUST be before any route definitions
 allowed_origins = os.getenv("ALLOWED_ORIGINS", "*").split(",") if os.getenv("ALLOWED_ORIGINS") != "*" else ["*"]
 # Always allow capacitor URLs for iOS app
@@ -76,9 +106,12 @@ app.include_router(payment_router)
 
 # Global variables
 VECTOR_COLLECTIONS = {}
+COLLECTIONS_LOADING = set()  # Collections whose background load has not finished yet
 COMBINED_INDEX = None
 COMBINED_METADATA = []
 client = None
+collections_loader_task = None
+background_tasks = []  # Startup work running in the executor
 
 # Request/Response models
 class SearchRequest(BaseModel):
@@ -142,6 +175,7 @@ class SearchResponse(BaseModel):
     results: List[SearchResult]
     query: str
     total_results: int
+    skipped_collections: List[str] = []  # Requested collections that are still loading
 
 class VerseRangeResponse(BaseModel):
     verses: List[VerseResult]
@@ -157,39 +191,43 @@ class VerseRangeForSubtitleResponse(BaseModel):
     subtitle_text: Optional[str] = None
     message: str
 
+def publish_collection(name: str, collection: Optional[Dict]):
+    """Make a collection searchable as soon as its loader finishes"""
+    if collection:
+        VECTOR_COLLECTIONS[name] = collection
+        logger.info(f"✅ {name} is now searchable ({collection['size']} vectors)")
+    COLLECTIONS_LOADING.discard(name)
+
 def load_vector_collections():
     """Load all vector collections from disk or cloud"""
-    global VECTOR_COLLECTIONS, COMBINED_INDEX, COMBINED_METADATA
-    
     # Try loading from cloud first
     use_cloud = os.getenv("USE_CLOUD_VECTORS", "true").lower() == "true"
     
-    VECTOR_COLLECTIONS = {}
-    
-    if use_cloud:
-        logger.info("Attempting to load vectors from cloud storage...")
-        cloud_collections = load_vectors_from_cloud()
-        if cloud_collections:
-            VECTOR_COLLECTIONS.update(cloud_collections)
+    # Mutate in place - the enhanced debate endpoint holds a reference to this dict
+    VECTOR_COLLECTIONS.clear()
+    COLLECTIONS_LOADING.update(COLLECTION_NAMES)
     
-    # Try to load missing collections from local files
-    logger.info("Checking for missing collections in local files...")
-    local_collections = load_vectors_from_local()
-    if local_collections:
-        for name, collection in local_collections.items():
-            if name not in VECTOR_COLLECTIONS:
-                logger.info(f"Adding {name} from local files")
-                VECTOR_COLLECTIONS[name] = collection
+    logger.info(f"Loading vector collections in parallel (cloud: {use_cloud})...")
+    try:
+        load_vectors_parallel(on_loaded=publish_collection, use_cloud=use_cloud)
+    finally:
+        COLLECTIONS_LOADING.clear()
     
     if not VECTOR_COLLECTIONS:
         logger.error("❌ Failed to load any vector collections")
         return
     
-    # Create combined index
+    build_combined_index()
+    logger.info(f"🚀 All vector collections loaded: {list(VECTOR_COLLECTIONS.keys())}")
+
+def build_combined_index():
+    """Build the combined index across all loaded collections"""
+    global COMBINED_INDEX, COMBINED_METADATA
+    
     all_embeddings = []
-    COMBINED_METADATA = []
+    combined_metadata = []
     
-    for name, collection in VECTOR_COLLECTIONS.items():
+    for name, collection in list(VECTOR_COLLECTIONS.items()):
         try:
             index = collection["index"]
             metadata = collection["metadata"]
@@ -214,7 +252,7 @@ def load_vector_collections():
                             "id": i
                         }
                     
-                    COMBINED_METADATA.append({
+                    combined_metadata.append({
                         "collection": name,
                         "original_index": i,
                         "metadata": meta
@@ -237,9 +275,13 @@ def load_vector_collections():
     
     # Create combined index
     if all_embeddings:
+        import faiss
+        
         dimension = len(all_embeddings[0])
-        COMBINED_INDEX = faiss.IndexFlatL2(dimension)
-        COMBINED_INDEX.add(np.array(all_embeddings).astype('float32'))
+        combined_index = faiss.IndexFlatL2(dimension)
+        combined_index.add(np.array(all_embeddings).astype('float32'))
+        COMBINED_METADATA = combined_metadata
+        COMBINED_INDEX = combined_index
         logger.info(f"✅ Created combined index with {COMBINED_INDEX.ntotal} vectors")
     else:
         logger.error("❌ No embeddings to create combined index")
@@ -283,45 +325,86 @@ def create_embedding(text: str, force_english: bool = False, collection_name: st
         logger.error(f"Error creating embedding: {e}")
         raise HTTPException(status_code=500, detail=f"Error creating embedding: {str(e)}")
 
+def create_openai_client():
+    """Create the OpenAI client (imports the SDK on first use)"""
+    api_key = os.getenv("OPENAI_API_KEY")
+    if not api_key:
+        logger.warning("⚠️ OPENAI_API_KEY not found in environment variables")
+        return None
+    
+    from openai import OpenAI
+    
+    try:
+        # Try to initialize without proxy settings
+        openai_client = OpenAI(
+            api_key=api_key,
+            timeout=30.0,
+            max_retries=3
+        )
+        logger.info("✅ OpenAI client initialized")
+        return openai_client
+    except Exception as e:
+        logger.error(f"❌ Failed to initialize OpenAI client: {e}")
+        # Try simpler initialization
+        try:
+            import openai
+            openai.api_key = api_key
+            openai_client = OpenAI(api_key=api_key)
+            logger.info("✅ OpenAI client initialized (fallback method)")
+            return openai_client
+        except Exception as e2:
+            logger.error(f"❌ Failed to initialize OpenAI client (fallback): {e2}")
+    return None
+
+def log_background_failure(name):
+    """Done callback that logs the exception of a failed background future"""
+    def callback(future):
+        if future.cancelled():
+            return
+        error = future.exception()
+        if error is not None:
+            logger.error(f"❌ Background {name} failed: {type(error).__name__}: {error}", exc_info=error)
+    return callback
+
+def run_in_background(loop, name, function, *args):
+    """Run function in the executor without waiting, logging it if it fails"""
+    future = loop.run_in_executor(None, function, *args)
+    future.add_done_callback(log_background_failure(name))
+    background_tasks.append(future)
+    return future
+
 @app.on_event("startup")
 async def startup_event():
     """Initialize the API on startup"""
-    global client
+    global client, collections_loader_task, QURAN_VERSE_MAPPING, QURAN_VERSES_DATA
     
     logger.info("Starting Vector Search API...")
     
-    # Initialize OpenAI client
-    api_key = os.getenv("OPENAI_API_KEY")
-    if not api_key:
-        logger.warning("⚠️ OPENAI_API_KEY not found in environment variables")
-    else:
-        try:
-            # Try to initialize without proxy settings
-            client = OpenAI(
-                api_key=api_key,
-                timeout=30.0,
-                max_retries=3
-            )
-            logger.info("✅ OpenAI client initialized")
-        except Exception as e:
-            logger.error(f"❌ Failed to initialize OpenAI client: {e}")
-            # Try simpler initialization
-            try:
-                import openai
-                openai.api_key = api_key
-                client = OpenAI(api_key=api_key)
-                logger.info("✅ OpenAI client initialized (fallback method)")
-            except Exception as e2:
-                logger.error(f"❌ Failed to initialize OpenAI client (fallback): {e2}")
+    # Data files and the OpenAI SDK load in parallel rather than one after another
+    loop = asyncio.get_running_loop()
+    client, QURAN_VERSE_MAPPING, QURAN_VERSES_DATA = await asyncio.gather(
+        loop.run_in_executor(None, create_openai_client),
+        loop.run_in_executor(None, load_quran_verse_mapping),
+        loop.run_in_executor(None, load_verses_data)
+    )
+    
+    # Warm up payment dependencies, the tokenizer and the TTS cache index off the request path
+    run_in_background(loop, "payment warm-up", warm_up_payment_dependencies)
+    run_in_background(loop, "tokenizer load", load_tokenizer)
+    run_in_background(loop, "TTS cache scan", get_tts_cache)
     
-    # Load vector collections
-    load_vector_collections()
+    # Build the verse indexes in the background so the first Arabic or transliterated search is instant
+    if QURAN_VERSES_DATA:
+        run_in_background(loop, "verse index build", build_verse_indexes, QURAN_VERSES_DATA)
     
-    # Add enhanced debate endpoint
+    # Add enhanced debate endpoint - it sees collections as they finish loading
     create_enhanced_debate_endpoint(app, VECTOR_COLLECTIONS, QURAN_VERSES_DATA, client)
     
-    logger.info(f"🚀 Vector Search API ready! Loaded collections: {list(VECTOR_COLLECTIONS.keys())}")
-    logger.info(f"Combined index total vectors: {COMBINED_INDEX.ntotal if COMBINED_INDEX else 0}")
+    # Load vector collections in the background so verse lookups are served immediately
+    COLLECTIONS_LOADING.update(COLLECTION_NAMES)
+    collections_loader_task = run_in_background(loop, "vector collection load", load_vector_collections)
+    
+    logger.info(f"🚀 Vector Search API ready! Loading collections in background: {sorted(COLLECTIONS_LOADING)}")
 
 @app.get("/")
 async def root():
@@ -330,6 +413,7 @@ async def root():
         "name": "Quran Vector Search API",
         "version": "1.0.0",
         "collections": list(VECTOR_COLLECTIONS.keys()),
+        "collections_loading": sorted(COLLECTIONS_LOADING),
         "total_vectors": COMBINED_INDEX.ntotal if COMBINED_INDEX else 0,
         "endpoints": {
             "search": "/search",
@@ -343,10 +427,24 @@ async def health_check():
     return {
         "status": "healthy",
         "collections_loaded": len(VECTOR_COLLECTIONS),
+        "collections_loading": sorted(COLLECTIONS_LOADING),
         "total_vectors": COMBINED_INDEX.ntotal if COMBINED_INDEX else 0,
         "openai_configured": client is not None
     }
 
+@app.get("/metrics")
+async def metrics():
+    """Hit/miss counters of the in-process caches, and the webhook queue"""
+    summary_cache = conversation_context.context_builder.summary_cache
+    answer_cache = semantic_cache.debate_answer_cache
+    return {
+        "transcription_cache": transcription_cache.stats(),
+        "tts_cache": (await asyncio.get_running_loop().run_in_executor(None, get_tts_cache)).stats(),
+        "conversation_summary_cache": summary_cache.stats(),
+        "debate_answer_cache": answer_cache.stats() if answer_cache else None,
+        "webhook_queue": webhook_queue.stats()
+    }
+
 @app.get("/debug")
 async def debug_info():
     """Debug endpoint to check vector loading"""
@@ -391,9 +489,10 @@ async def debug_info():
         "collections_status": {
             name: {
                 "loaded": name in VECTOR_COLLECTIONS,
+                "loading": name in COLLECTIONS_LOADING,
                 "vectors": VECTOR_COLLECTIONS[name]["size"] if name in VECTOR_COLLECTIONS else 0
             }
-            for name in ["RashadAllMedia", "FinalTestament", "QuranTalkArticles", "Newsletters", "ArabicVerses", "FootnotesSubtitles", "Appendices"]
+            for name in COLLECTION_NAMES
         }
     }
 
@@ -581,6 +680,25 @@ async def search_options():
     """Handle preflight requests for /search endpoint"""
     return {"message": "OK"}
 
+def format_arabic_verse_result(verse, similarity):
+    """Search result for an Arabic verse, from collection metadata or the verses data"""
+    sura_verse = verse.get("sura_verse", "")
+    arabic_text = verse.get("arabic", "")
+    english_text = verse.get("english", "")
+    
+    title = f"[{sura_verse}] {arabic_text[:50]}{'...' if len(arabic_text) > 50 else ''}"
+    content = f"Arabic: {arabic_text}\nEnglish: {english_text}"
+    
+    return SearchResult(
+        collection="ArabicVerses",
+        title=title,
+        content=content,
+        similarity_score=similarity,
+        source="Quran Arabic Verses",
+        source_url=None,
+        youtube_link=None
+    )
+
 @app.post("/search", response_model=SearchResponse)
 async def vector_search(request: SearchRequest):
     """Perform vector similarity search across selected collections individually"""
@@ -608,7 +726,7 @@ async def vector_search(request: SearchRequest):
         selected_collections = [k for k, v in collection_filter.items() if v]
         
         # If FinalTestament is selected, also search FootnotesSubtitles
-        if request.include_final_testament and "FootnotesSubtitles" in VECTOR_COLLECTIONS:
+        if request.include_final_testament and ("FootnotesSubtitles" in VECTOR_COLLECTIONS or "FootnotesSubtitles" in COLLECTIONS_LOADING):
             selected_collections.append("FootnotesSubtitles")
         logger.info(f"Query: '{request.query}', Selected collections: {selected_collections}")
         
@@ -616,11 +734,31 @@ async def vector_search(request: SearchRequest):
             return SearchResponse(results=[], query=request.query, total_results=0)
         
         all_results = []
+        skipped_collections = []
+        
+        # Arabic and transliterated verse queries resolve locally - no embedding call when confident
+        if "ArabicVerses" in selected_collections and QURAN_VERSES_DATA:
+            # In a worker thread: if the startup build hasn't finished, the lookup waits for the index
+            # One more than the candidates allowed, to tell common words from specific queries
+            limit = max(request.num_results, SELECTIVE_MAX_CANDIDATES + 1)
+            matches = await asyncio.get_running_loop().run_in_executor(
+                None, lookup_verses, QURAN_VERSES_DATA, request.query, limit
+            )
+            local_matches = selective_matches(request.query, matches, LOCAL_MATCH_MIN_SCORE)[:request.num_results]
+            if local_matches:
+                logger.info(f"Resolved ArabicVerses locally: {[m['verse'].get('sura_verse') for m in local_matches]}")
+                all_results.extend(format_arabic_verse_result(m["verse"], m["score"] * LOCAL_MATCH_SCORE_WEIGHT)
+                                   for m in local_matches)
+                selected_collections.remove("ArabicVerses")
         
         # Search each selected collection individually
         for collection_name in selected_collections:
             if collection_name not in VECTOR_COLLECTIONS:
-                logger.warning(f"Collection {collection_name} not found in loaded collections")
+                if collection_name in COLLECTIONS_LOADING:
+                    logger.info(f"Collection {collection_name} is still loading, skipping")
+                    skipped_collections.append(collection_name)
+                else:
+                    logger.warning(f"Collection {collection_name} not found in loaded collections")
                 continue
                 
             collection_data = VECTOR_COLLECTIONS[collection_name]
@@ -673,23 +811,7 @@ async def vector_search(request: SearchRequest):
                     ))
                     
                 elif collection_name == "ArabicVerses":
-                    sura_verse = metadata.get("sura_verse", "")
-                    arabic_text = metadata.get("arabic", "")
-                    english_text = metadata.get("english", "")
-                    
-                    title = f"[{sura_verse}] {arabic_text[:50]}{'...' if len(arabic_text) > 50 else ''}"
-                    content = f"Arabic: {arabic_text}\nEnglish: {english_text}"
-                    source = "Quran Arabic Verses"
-                    
-                    all_results.append(SearchResult(
-                        collection=collection_name,
-                        title=title,
-                        content=content,
-                        similarity_score=similarity,
-                        source=source,
-                        source_url=None,
-                        youtube_link=None
-                    ))
+                    all_results.append(format_arabic_verse_result(metadata, similarity))
                     
                 elif collection_name == "Newsletters":
                     title = metadata.get("title", "Newsletter")
@@ -804,7 +926,8 @@ async def vector_search(request: SearchRequest):
         return SearchResponse(
             results=final_results,
             query=request.query,
-            total_results=len(final_results)
+            total_results=len(final_results),
+            skipped_collections=skipped_collections
         )
         
     except Exception as e:
@@ -826,67 +949,42 @@ async def transcribe_audio(audio: UploadFile = File(...), language: Optional[str
         
         logger.info(f"Received audio file: {audio.filename}, content_type: {audio.content_type}, size: {audio.size}")
         
-        # Read audio file
-        audio_data = await audio.read()
-        if len(audio_data) == 0:
+        # The upload is already spooled (in memory, or on disk when large) - send it as is
+        loop = asyncio.get_running_loop()
+        audio_size = await loop.run_in_executor(None, upload_size, audio.file)
+        if audio_size == 0:
             raise HTTPException(status_code=400, detail="Empty audio file")
+        if audio_size > TRANSCRIBE_MAX_UPLOAD_BYTES:
+            raise upload_too_large()
         
-        logger.info(f"Audio data size: {len(audio_data)} bytes")
+        # Trim silence and downsample when the format can be decoded
+        upload, filename, content_type = await loop.run_in_executor(
+            None, prepare_upload, audio.file, audio.filename, audio.content_type
+        )
+        # Whisper's limit applies to what is actually sent
+        sent_size = await loop.run_in_executor(None, upload_size, upload)
+        if sent_size > TRANSCRIBE_MAX_UPLOAD_BYTES:
+            raise upload_too_large()
         
-        # Save temporarily (Whisper API requires a file)
-        import tempfile
-        import os
+        # Retried queries re-upload the same audio
+        cache_key = await loop.run_in_executor(None, transcription_cache_key, upload, language)
+        cached_text = transcription_cache.get(cache_key)
+        if cached_text is not None:
+            logger.info(f"⚡ Transcription cache hit: {cached_text}")
+            return {"transcription": cached_text}
         
-        # Use appropriate file extension based on content type
-        file_extension = '.webm'
-        if audio.content_type:
-            if 'mp4' in audio.content_type or 'mp4a' in audio.content_type:
-                file_extension = '.mp4'
-            elif 'wav' in audio.content_type:
-                file_extension = '.wav'
-            elif 'mpeg' in audio.content_type or 'mp3' in audio.content_type:
-                file_extension = '.mp3'
+        logger.info(f"Calling OpenAI Whisper API with {sent_size} bytes ({audio_size} uploaded)...")
         
-        with tempfile.NamedTemporaryFile(delete=False, suffix=file_extension) as temp_file:
-            temp_file.write(audio_data)
-            temp_file_path = temp_file.name
+        # If no language specified, let Whisper auto-detect
+        # Otherwise use the specified language (ar for Arabic, en for English)
+        transcription_text = await loop.run_in_executor(
+            None, transcribe_file, client, upload, filename, content_type, language
+        )
+        transcription_cache.set(cache_key, transcription_text)
         
-        logger.info(f"Saved audio to temporary file: {temp_file_path}")
+        logger.info(f"Transcription result: {transcription_text}")
         
-        try:
-            # Use OpenAI Whisper API
-            with open(temp_file_path, 'rb') as audio_file:
-                logger.info("Calling OpenAI Whisper API...")
-                
-                # If no language specified, let Whisper auto-detect
-                # Otherwise use the specified language (ar for Arabic, en for English)
-                if language:
-                    transcript = client.audio.transcriptions.create(
-                        model="whisper-1",
-                        file=audio_file,
-                        language=language,
-                        response_format="text"
-                    )
-                else:
-                    # Auto-detect language
-                    transcript = client.audio.transcriptions.create(
-                        model="whisper-1",
-                        file=audio_file,
-                        response_format="text"
-                    )
-            
-            logger.info(f"Transcription result: {transcript}")
-            
-            # Handle both string and object responses
-            transcription_text = transcript if isinstance(transcript, str) else transcript.text if hasattr(transcript, 'text') else str(transcript)
-            
-            return {"transcription": transcription_text}
-            
-        finally:
-            # Clean up temp file
-            if os.path.exists(temp_file_path):
-                os.remove(temp_file_path)
-                logger.info(f"Cleaned up temporary file: {temp_file_path}")
+        return {"transcription": transcription_text}
                 
     except HTTPException:
         raise
@@ -900,65 +998,12 @@ class DebateRequest(BaseModel):
     message: Optional[str] = None
     isNewTopic: bool = False
     conversationHistory: List[Dict[str, str]] = []
+    conversationId: Optional[str] = None  # Server-side history - send only the new message
+    stream: bool = False  # Stream the reply as server-sent events
 
 class DebateResponse(BaseModel):
     response: str
-
-# In-memory conversation storage (in production, use Redis or database)
-conversation_memory = {}
-
-# Helper functions for debater rules
-def load_debater_rules():
-    """Load rules from debater rules.json"""
-    try:
-        rules_path = os.path.join(os.path.dirname(__file__), '..', 'data', 'debater', 'rules.json')
-        if os.path.exists(rules_path):
-            with open(rules_path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                return [rule for rule in data.get('rules', []) if rule.get('active', True)]
-    except Exception as e:
-        logger.warning(f"Could not load debater rules: {e}")
-    return []
-
-def get_debater_personality():
-    """Get submitter personality traits"""
-    return """You ARE a submitter who follows Submission as clarified by the messenger of the covenant Rashad Khalifa.
-
-CRITICAL FORMATTING:
-- Use HTML: <br><br> between paragraphs, <br> for line breaks within lists
-- Bold with <strong>text</strong>
-- Lists: <br>• Point one<br>• Point two
-- Verses: [2:255] format (auto-linked)
-
-CRITICAL PERSONALITY:
-- NEVER say "as a submitter" or "according to Rashad" - you ARE a submitter
-- NEVER use "Islam/Muslim" - only "Submission/Submitter" 
-- Present beliefs as facts, not opinions
-- Be direct and concise"""
-
-def format_debater_rules(rules):
-    """Format rules for system prompt"""
-    if not rules:
-        return "No specific rules loaded."
-    
-    formatted_rules = []
-    # Prioritize key rules
-    priority_rules = [
-        rule for rule in rules 
-        if rule.get('id') in [3, 14, 15, 19, 43, 69, 70] and rule.get('active', True)
-    ]
-    other_rules = [
-        rule for rule in rules 
-        if rule.get('id') not in [3, 14, 15, 19, 43, 69, 70] and rule.get('active', True)
-    ][:10]  # Limit other rules
-    
-    for rule in priority_rules + other_rules:
-        category = rule.get('category', 'general')
-        content = rule.get('content', '').strip()
-        if content and len(content) > 10:
-            formatted_rules.append(f"[{category.upper()}] {content}")
-    
-    return "\n".join(formatted_rules)
+    conversationId: Optional[str] = None
 
 @app.options("/debate")
 async def debate_options():
@@ -972,53 +1017,61 @@ async def debate_endpoint(request: DebateRequest):
         if not client:
             raise HTTPException(status_code=500, detail="OpenAI client not configured")
         
-        logger.info(f"Debate request: topic={request.topic}, message={request.message[:50]}..., isNewTopic={request.isNewTopic}")
+        logger.info(f"Debate request: topic={request.topic}, message={(request.message or '')[:50]}..., isNewTopic={request.isNewTopic}")
         
-        # Load debater rules and personality
-        debater_rules = load_debater_rules()
-        debater_personality = get_debater_personality()
+        # System prompt with rules and personality - compiled once per rules.json version
+        system_content = get_system_prompt("debate")
         
-        # Build system prompt with rules and personality
-        system_content = f"""{debater_personality}
-
-KEY RULES TO FOLLOW:
-{format_debater_rules(debater_rules)}
-
-CRITICAL INSTRUCTIONS:
-- Maximum 250 words per response
-- Use HTML formatting for clarity
-- Never explain you're following Rashad's teachings - just state facts
-- Include specific verse references [x:y] and video links from rules"""
+        # Current message
+        current_message = None
+        if request.isNewTopic and request.topic:
+            current_message = f"Let's debate about: {request.topic}"
+        elif request.message:
+            current_message = request.message
         
-        # Build conversation messages
-        messages = [
-            {
-                "role": "system",
-                "content": system_content
-            }
-        ]
+        # Stored history for this conversation, or the client-sent history for a new one
+        loop = asyncio.get_running_loop()
+        conversation_id, conversation = await loop.run_in_executor(
+            None, resolve_conversation, request.conversationId, request.conversationHistory
+        )
         
-        # Add conversation history
-        for msg in request.conversationHistory:
-            messages.append({
-                "role": msg.get("role", "user"),
-                "content": msg.get("content", "")
-            })
+        def save_turn(ai_response):
+            record_turn(conversation_id, conversation, current_message, ai_response)
+            return []
         
-        # Add current message
-        if request.isNewTopic and request.topic:
-            messages.append({
-                "role": "user",
-                "content": f"Let's debate about: {request.topic}"
-            })
-        elif request.message:
-            messages.append({
-                "role": "user", 
-                "content": request.message
-            })
+        # Openings of a new debate don't depend on history, so similar topics can share one
+        answer_cache = semantic_cache.debate_answer_cache
+        use_answer_cache = answer_cache is not None and request.isNewTopic and request.topic and not conversation["history"]
+        topic_embedding = None
+        if use_answer_cache:
+            prompt_key = hashlib.sha256(system_content.encode("utf-8")).hexdigest()
+            cached = answer_cache.lookup_exact(request.topic, prompt_key)
+            if cached is None:
+                try:
+                    topic_embedding = await loop.run_in_executor(None, lambda: create_embedding(request.topic, force_english=True))
+                    match = answer_cache.lookup(request.topic, topic_embedding, prompt_key)
+                    if match:
+                        cached, cached_topic, similarity = match
+                        logger.info(f"♻️ Reusing debate opening for '{cached_topic}' (similarity {similarity:.3f})")
+                except HTTPException as e:
+                    logger.warning(f"⚠️ Skipping answer cache, topic embedding failed: {e.detail}")
+            
+            if cached is not None:
+                await loop.run_in_executor(None, save_turn, cached)
+                if request.stream:
+                    return stream_cached_response(cached, done_extra={"conversationId": conversation_id})
+                return DebateResponse(response=cached, conversationId=conversation_id)
+        
+        def finish_turn(ai_response):
+            if topic_embedding is not None:
+                answer_cache.add(request.topic, topic_embedding, ai_response, prompt_key)
+            return save_turn(ai_response)
+        
+        # Conversation messages within the history token budget - older turns are summarized
+        messages = build_chat_messages(system_content, conversation["history"], current_message, conversation["data"])
         
         # Generate AI response with shorter length
-        response = client.chat.completions.create(
+        completion_args = dict(
             model="gpt-4-turbo-preview",  # Use stable model name
             messages=messages,
             max_tokens=400,  # Reduced from 1000 to keep responses shorter
@@ -1027,9 +1080,17 @@ CRITICAL INSTRUCTIONS:
             frequency_penalty=0.3
         )
         
+        if request.stream:
+            return stream_debate_response(
+                client, completion_args, after=finish_turn, done_extra={"conversationId": conversation_id}
+            )
+        
+        response = client.chat.completions.create(**completion_args)
+        
         ai_response = response.choices[0].message.content
+        await loop.run_in_executor(None, finish_turn, ai_response)
         
-        return DebateResponse(response=ai_response)
+        return DebateResponse(response=ai_response, conversationId=conversation_id)
         
     except Exception as e:
         logger.error(f"Error in debate endpoint: {e}")
@@ -1049,11 +1110,10 @@ async def search_verses(request: RootSearchRequest):
         raise HTTPException(status_code=503, detail="Verses data not loaded")
     
     try:
-        result = search_verses_by_root(
-            verses_data=QURAN_VERSES_DATA,
-            query=request.query,
-            search_type=request.search_type,
-            limit=request.limit
+        # Index lookups may wait for the startup index build - keep them off the event loop
+        result = await asyncio.get_running_loop().run_in_executor(
+            None, partial(search_verses_by_root, verses_data=QURAN_VERSES_DATA, query=request.query,
+                          search_type=request.search_type, limit=request.limit)
         )
         
         return RootSearchResponse(**result)
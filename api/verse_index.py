@@ -0,0 +1,308 @@
+#!/usr/bin/env python3
+"""
+In-memory indexes over the verses data
+Built once per loaded corpus so verse lookups are index lookups instead of full scans
+"""
+
+import threading
+import logging
+import heapq
+from collections import Counter
+from ngram_index import NGramIndex
+from arabic_utils import (
+    normalize_arabic_text, enhance_arabic_search_query, is_arabic_text,
+    fold_transliteration, root_to_latin
+)
+
+logger = logging.getLogger(__name__)
+
+# Normalize corpus text with the uncached function - thousands of verses would
+# otherwise evict every user query from the normalize_arabic_text cache
+_normalize_corpus_text = getattr(normalize_arabic_text, "__wrapped__", normalize_arabic_text)
+_fold_corpus_text = getattr(fold_transliteration, "__wrapped__", fold_transliteration)
+
+# Shortest folded transliteration query worth looking up (shorter ones match almost everything)
+MIN_TRANSLITERATION_LENGTH = 4
+# Local matches stand in for semantic search only when they single out a few verses: at most
+# this many confident matches, from transliterated queries of at least this many folded
+# letters or Arabic queries of at least this many words (common words such as "allah",
+# "huwa" or "الله" fully match a large share of verses)
+SELECTIVE_MAX_CANDIDATES = 3
+SELECTIVE_MIN_TRANSLITERATION_LENGTH = 10
+SELECTIVE_MIN_ARABIC_WORDS = 2
+
+class VerseIndex:
+    """Verse reference ("2:255") -> verse lookup"""
+
+    def __init__(self, verses_data):
+        self.verses = verses_data
+        self.by_reference = {}
+        for verse in verses_data:
+            # Keep the first occurrence, matching a front-to-back scan
+            self.by_reference.setdefault(verse.get("sura_verse"), verse)
+
+    def get(self, verse_ref):
+        """Verse for a reference, or None"""
+        return self.by_reference.get(verse_ref)
+
+class ArabicVerseIndex:
+    """
+    Pre-normalized Arabic column plus a trigram index over it
+    Supports exact phrase, prefix (as-you-type) and fuzzy diacritic-insensitive matching
+    """
+
+    def __init__(self, verses_data):
+        self.verses = verses_data
+        # Normalized Arabic text, aligned with verses_data by position
+        self.normalized_arabic = [_normalize_corpus_text(verse.get("arabic") or "") for verse in verses_data]
+        self.ngrams = NGramIndex(n=3)
+        for text in self.normalized_arabic:
+            self.ngrams.add(text)
+
+    def normalize_query(self, query):
+        """Normalize an Arabic (or known transliterated) query the same way as the verse column"""
+        enhanced = enhance_arabic_search_query(query.strip())
+        if not is_arabic_text(enhanced):
+            return ""
+        return normalize_arabic_text(enhanced)
+
+    def _phrase_matches(self, normalized_query, pad_end, limit):
+        grams = self.ngrams.grams(normalized_query, pad_end=pad_end)
+        needle = f" {normalized_query} " if pad_end else f" {normalized_query}"
+        matches = []
+        for doc_id in self.ngrams.candidates(grams):
+            if needle in f" {self.normalized_arabic[doc_id]} ":
+                matches.append(doc_id)
+                if len(matches) >= limit:
+                    break
+        return matches
+
+    def exact(self, query, limit=20):
+        """Verses containing the query as whole words, ignoring diacritics and letter variants"""
+        normalized = self.normalize_query(query)
+        if not normalized:
+            return []
+        return [self.verses[i] for i in self._phrase_matches(normalized, True, limit)]
+
+    def prefix(self, query, limit=20):
+        """Verses containing the query where the last word may be incomplete (as-you-type)"""
+        normalized = self.normalize_query(query)
+        if not normalized:
+            return []
+        return [self.verses[i] for i in self._phrase_matches(normalized, False, limit)]
+
+    def fuzzy(self, query, limit=20, min_score=0.6):
+        """Verses sharing most of the query's trigrams - tolerates typos and missing letters"""
+        normalized = self.normalize_query(query)
+        if not normalized:
+            return []
+        return [
+            (self.verses[doc_id], score)
+            for doc_id, score in self.ngrams.search(normalized, limit=limit, min_score=min_score)
+        ]
+
+    def search(self, query, limit=20, min_score=0.6):
+        """
+        Exact matches first, then prefix matches, then fuzzy matches until limit is reached
+        Returns: list of {"verse", "match_type", "score"}
+        """
+        normalized = self.normalize_query(query)
+        if not normalized:
+            return []
+
+        results = []
+        seen = set()
+
+        def collect(doc_ids, match_type, scores=None):
+            for doc_id in doc_ids:
+                if doc_id in seen or len(results) >= limit:
+                    continue
+                seen.add(doc_id)
+                results.append({
+                    "verse": self.verses[doc_id],
+                    "match_type": match_type,
+                    "score": scores[doc_id] if scores else 1.0
+                })
+
+        collect(self._phrase_matches(normalized, True, limit), "exact")
+        if len(results) < limit:
+            collect(self._phrase_matches(normalized, False, limit + len(seen)), "prefix")
+        if len(results) < limit:
+            fuzzy = self.ngrams.search(normalized, limit=limit + len(seen), min_score=min_score)
+            scores = dict(fuzzy)
+            collect([doc_id for doc_id, _ in fuzzy], "fuzzy", scores)
+        return results
+
+class TransliterationIndex:
+    """
+    Trigram index over the folded Latin transliteration of each verse
+    Resolves transliterated queries with arbitrary spelling and spacing to candidate verses
+    """
+
+    def __init__(self, verses_data):
+        self.verses = verses_data
+        # Folded transliteration, aligned with verses_data by position
+        self.folded_transliteration = [_fold_corpus_text(verse.get("transliteration") or "") for verse in verses_data]
+        self.ngrams = NGramIndex(n=3)
+        for text in self.folded_transliteration:
+            self.ngrams.add(text)
+
+    def search(self, query, limit=20, min_score=0.6):
+        """
+        Verses whose transliteration contains most of the query's trigrams
+        Word boundaries are ignored because users split and join words freely ("huwallahu")
+        Returns: list of {"verse", "match_type", "score"}
+        """
+        folded = fold_transliteration(query)
+        if len(folded) < MIN_TRANSLITERATION_LENGTH:
+            return []
+
+        matches = self.ngrams.search(folded, limit=limit, min_score=min_score, pad_start=False, pad_end=False)
+        return [
+            {"verse": self.verses[doc_id], "match_type": "transliteration", "score": score}
+            for doc_id, score in matches
+        ]
+
+class RootIndex:
+    """
+    Root -> verses, frequency and meanings, parsed once from each verse's roots and meanings
+    Roots are matched as whole tokens, by Arabic letters ("س ل م", "سلم") or Latin key ("SLM")
+    """
+
+    def __init__(self, verses_data):
+        self.verses = verses_data
+        self.positions = {}  # compact Arabic root -> ascending verse positions
+        self.meanings = {}  # compact Arabic root -> Counter of meanings
+        self.latin_roots = {}  # Latin key -> compact Arabic roots sharing it
+
+        for position, verse in enumerate(verses_data):
+            roots = (verse.get("roots") or "").split(",")
+            meanings = (verse.get("meanings") or "").split(",")
+            for i, root in enumerate(roots):
+                key = self.root_key(root)
+                if not key:
+                    continue
+
+                positions = self.positions.setdefault(key, [])
+                if not positions or positions[-1] != position:
+                    positions.append(position)
+
+                # Meanings are aligned with roots by position
+                meaning = meanings[i].strip() if i < len(meanings) else ""
+                if ":" in meaning:
+                    meaning = meaning.split(":")[1].strip()
+                if meaning and meaning != "-":
+                    self.meanings.setdefault(key, Counter())[meaning] += 1
+
+        for key in self.positions:
+            latin = root_to_latin(key) if is_arabic_text(key) else key
+            if latin:
+                self.latin_roots.setdefault(latin, set()).add(key)
+
+    @staticmethod
+    def root_key(root):
+        """Compact form of a root token: Arabic letters without spaces, or upper-case Latin"""
+        root = root.strip()
+        if not root or root == "-":
+            return ""
+        if is_arabic_text(root):
+            return _normalize_corpus_text(root).replace(" ", "")
+        return root.replace(" ", "").upper()
+
+    def lookup(self, term, max_meanings=3):
+        """
+        Verses, frequency and most common meanings of a root
+        Returns: {"roots", "verses", "frequency", "meanings"} or None if the root never occurs,
+        or if the term is a Latin key shared by several Arabic roots (HMD: حمد praise and
+        همد lifeless) - distinct roots are never reported as one
+        """
+        key = self.root_key(term)
+        roots = {key} if key in self.positions else self.latin_roots.get(key, set())
+        if len(roots) != 1:
+            if roots:
+                logger.debug(f"Ambiguous root key {key}: {sorted(roots)}")
+            return None
+
+        positions = []
+        for position in heapq.merge(*(self.positions[root] for root in roots)):
+            if not positions or positions[-1] != position:
+                positions.append(position)
+
+        meanings = Counter()
+        for root in roots:
+            meanings.update(self.meanings.get(root, {}))
+
+        return {
+            "roots": sorted(roots),
+            "verses": [self.verses[position].get("sura_verse") for position in positions],
+            "frequency": len(positions),
+            "meanings": [meaning for meaning, _ in meanings.most_common(max_meanings)]
+        }
+
+_indexes = {}
+_index_lock = threading.Lock()
+
+def _get_index(index_class, verses_data):
+    """Index of the given class for the corpus, built on first use and rebuilt only for a different verses list"""
+    index = _indexes.get(index_class)
+    if index is not None and index.verses is verses_data:
+        return index
+
+    with _index_lock:
+        index = _indexes.get(index_class)
+        if index is None or index.verses is not verses_data:
+            index = index_class(verses_data)
+            _indexes[index_class] = index
+            logger.info(f"✅ Built {index_class.__name__} for {len(verses_data)} verses")
+        return index
+
+def get_verse_index(verses_data):
+    """Verse reference index for the given corpus"""
+    return _get_index(VerseIndex, verses_data)
+
+def get_arabic_verse_index(verses_data):
+    """Arabic verse index for the given corpus"""
+    return _get_index(ArabicVerseIndex, verses_data)
+
+def get_transliteration_index(verses_data):
+    """Transliteration index for the given corpus"""
+    return _get_index(TransliterationIndex, verses_data)
+
+def get_root_index(verses_data):
+    """Root index for the given corpus"""
+    return _get_index(RootIndex, verses_data)
+
+def build_verse_indexes(verses_data):
+    """Build every verse index up front so the first search doesn't pay for it"""
+    get_verse_index(verses_data)
+    get_arabic_verse_index(verses_data)
+    get_transliteration_index(verses_data)
+    get_root_index(verses_data)
+
+def selective_matches(query, matches, min_score, max_candidates=SELECTIVE_MAX_CANDIDATES,
+                      min_transliteration_length=SELECTIVE_MIN_TRANSLITERATION_LENGTH,
+                      min_arabic_words=SELECTIVE_MIN_ARABIC_WORDS):
+    """
+    The matches of lookup_verses scoring at least min_score, if they identify the verse
+    Returns [] when the query is too short or too common to do so - search semantically then.
+    Pass lookup_verses a limit above max_candidates so common queries are recognized.
+    """
+    confident = [match for match in matches if match["score"] >= min_score]
+    if not confident or len(confident) > max_candidates:
+        return []
+    if is_arabic_text(query):
+        if len(query.split()) < min_arabic_words:
+            return []
+    elif len(fold_transliteration(query)) < min_transliteration_length:
+        return []
+    return confident
+
+def lookup_verses(verses_data, query, limit=20, min_score=0.6):
+    """
+    Resolve a query to verses locally, without embeddings
+    Arabic queries go to the Arabic index, everything else to the transliteration index
+    Returns: list of {"verse", "match_type", "score"}
+    """
+    if is_arabic_text(query):
+        return get_arabic_verse_index(verses_data).search(query, limit=limit, min_score=min_score)
+    return get_transliteration_index(verses_data).search(query, limit=limit, min_score=min_score)
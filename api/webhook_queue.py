@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+Background processing of verified webhook events
+The webhook route verifies the signature and records the event in the database (see
+SubscriptionStore.record_webhook_event) with status "queued" before answering Stripe, so
+an acknowledged event survives restarts. A worker task then applies queued events one
+at a time, retrying failures with exponential backoff, and marks them "applied", or
+"failed" once the attempts run out. Failed events stay in the table as dead letters.
+
+Events are de-duplicated by ID against the table: Stripe's redeliveries of an event that
+is queued or applied are acknowledged without being applied again. A redelivered failed
+event (e.g. resent from the Stripe dashboard) is queued again, and so is a redelivered
+event recorded as queued that isn't in this process's queue - e.g. when the insert
+committed but its response was lost, so it was never queued here. Events still queued
+when the process stopped are picked up again by recover() at startup.
+"""
+
+import asyncio
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+WEBHOOK_MAX_ATTEMPTS = int(os.getenv("WEBHOOK_MAX_ATTEMPTS", "5"))
+WEBHOOK_RETRY_BACKOFF_SECONDS = float(os.getenv("WEBHOOK_RETRY_BACKOFF_SECONDS", "1"))
+WEBHOOK_RETRY_MAX_BACKOFF_SECONDS = 60.0
+
+QUEUED = "queued"
+APPLIED = "applied"
+FAILED = "failed"
+
+class WebhookQueue:
+    """
+    Applies events with handler(event) (async) in a background task
+    get_store() returns the SubscriptionStore the events are recorded in (None when the
+    database isn't configured - events are then acknowledged and ignored). The worker
+    starts with the first event, on the running event loop.
+    """
+
+    def __init__(self, handler, get_store, max_attempts=WEBHOOK_MAX_ATTEMPTS, backoff=WEBHOOK_RETRY_BACKOFF_SECONDS,
+                 max_backoff=WEBHOOK_RETRY_MAX_BACKOFF_SECONDS):
+        self.handler = handler
+        self.get_store = get_store
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.applied = 0
+        self.duplicates = 0
+        self.retries = 0
+        self.failed = 0
+        self.recovered = 0
+        self._pending_ids = set()  # Events in the in-process queue
+        self._queue = None
+        self._worker = None
+        self._loop = None
+
+    def _ensure_worker(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # Queues and tasks belong to one loop - carry anything still pending over
+            pending = []
+            while self._queue is not None and not self._queue.empty():
+                pending.append(self._queue.get_nowait())
+            self._queue = asyncio.Queue()
+            for event in pending:
+                self._queue.put_nowait(event)
+            self._loop = loop
+            self._worker = None
+        if self._worker is None or self._worker.done():
+            self._worker = loop.create_task(self._run())
+
+    def _put(self, event):
+        self._ensure_worker()
+        self._pending_ids.add(event["id"])
+        self._queue.put_nowait(event)
+
+    async def enqueue(self, event):
+        """
+        Record a verified event and queue it (call from the event loop)
+        Returns False if an event with the same ID is already queued or applied. Raises
+        if the event can't be recorded - don't acknowledge it then, so Stripe retries.
+        """
+        event_id = event["id"]
+        store = self.get_store()
+        if store is None:
+            logger.warning(f"⚠️ Database not configured - ignoring webhook event {event_id}")
+            return False
+        if not await store.record_webhook_event(event, QUEUED):
+            # Seen before - only a failed event, or a queued one this process never took up, is queued again
+            requeued = await store.update_webhook_event(event_id, {"status": QUEUED, "attempts": 0, "last_error": None},
+                                                        status=FAILED)
+            if requeued:
+                logger.info(f"♻️ Webhook event {event_id} failed before, queued again")
+            elif not await self._recorded_as_queued(store, event_id) or event_id in self._pending_ids:
+                self.duplicates += 1
+                logger.info(f"🔁 Webhook event {event_id} already received, skipping")
+                return False
+            else:
+                logger.info(f"📥 Webhook event {event_id} recorded but not queued, queuing it")
+        self._put(event)
+        logger.info(f"📥 Queued webhook event {event_id} ({event['type']})")
+        return True
+
+    async def _recorded_as_queued(self, store, event_id):
+        row = await store.get_webhook_event(event_id)
+        return row is not None and row["status"] == QUEUED
+
+    async def recover(self):
+        """Queue the recorded events that were never applied (call at startup)"""
+        store = await asyncio.get_running_loop().run_in_executor(None, self.get_store)
+        if store is None:
+            return 0
+        rows = await store.find_webhook_events(QUEUED)
+        events = [row["payload"] for row in rows if row["id"] not in self._pending_ids]
+        for event in events:
+            self._put(event)
+        self.recovered += len(events)
+        if events:
+            logger.info(f"📥 Queued {len(events)} webhook events left unapplied by the last run")
+        return len(events)
+
+    async def _run(self):
+        while True:
+            event = await self._queue.get()
+            try:
+                await self._apply(event)
+            finally:
+                self._pending_ids.discard(event["id"])
+                self._queue.task_done()
+
+    async def _apply(self, event):
+        event_id = event["id"]
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                await self.handler(event)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                if attempt == self.max_attempts:
+                    self.failed += 1
+                    logger.error(f"❌ Webhook event {event_id} ({event['type']}) failed after {attempt} attempts: {e}")
+                    await self._set_status(event_id, {"status": FAILED, "attempts": attempt, "last_error": str(e)[:500]})
+                    return
+                self.retries += 1
+                delay = min(self.backoff * 2 ** (attempt - 1), self.max_backoff)
+                logger.warning(f"⚠️ Webhook event {event_id} attempt {attempt} failed, retrying in {delay:.1f}s: {e}")
+                await asyncio.sleep(delay)
+            else:
+                self.applied += 1
+                logger.info(f"✅ Applied webhook event {event_id} ({event['type']})")
+                await self._set_status(event_id, {"status": APPLIED, "attempts": attempt, "last_error": None})
+                return
+
+    async def _set_status(self, event_id, values):
+        try:
+            await self.get_store().update_webhook_event(event_id, values)
+        except Exception as e:
+            # Still recorded as queued - it is applied again after a restart
+            logger.error(f"❌ Could not record the status of webhook event {event_id}: {e}")
+
+    async def join(self):
+        """Wait until every queued event has been applied or has failed"""
+        if self._queue is not None:
+            await self._queue.join()
+
+    async def stop(self, timeout=10.0):
+        """Give queued events up to timeout seconds to finish, then stop the worker"""
+        if self._worker is None or self._loop is not asyncio.get_running_loop():
+            return
+        try:
+            await asyncio.wait_for(self.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"⚠️ Stopping with {self._queue.qsize()} webhook events unapplied - "
+                           f"they are queued again at the next startup")
+        self._worker.cancel()
+        try:
+            await self._worker
+        except asyncio.CancelledError:
+            pass
+        self._worker = None
+
+    def stats(self):
+        return {
+            "pending": self._queue.qsize() if self._queue is not None else 0,
+            "applied": self.applied,
+            "duplicates": self.duplicates,
+            "retries": self.retries,
+            "failed": self.failed,
+            "recovered": self.recovered
+        }
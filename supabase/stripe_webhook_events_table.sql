@@ -0,0 +1,18 @@
+-- Stripe webhook events, recorded before the webhook is acknowledged
+-- status: queued (not applied yet), applied, or failed (dead letter after every attempt failed)
+CREATE TABLE IF NOT EXISTS stripe_webhook_events (
+    id TEXT PRIMARY KEY,
+    type TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'queued',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    last_error TEXT,
+    payload JSONB NOT NULL,
+    received_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+-- Unapplied events are loaded at startup
+CREATE INDEX idx_stripe_webhook_events_status ON stripe_webhook_events(status, received_at);
+
+-- Only the API's service key reads and writes events
+ALTER TABLE stripe_webhook_events ENABLE ROW LEVEL SECURITY;